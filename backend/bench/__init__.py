@@ -0,0 +1,4 @@
+"""Manual benchmarks and dev tools (need a running Ollama / SearXNG where noted).
+
+Run from the project root, e.g. `python -m backend.bench.prompt_cache`.
+"""
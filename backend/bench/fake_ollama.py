@@ -0,0 +1,117 @@
+"""Fake Ollama server(s) for local routing/failover/load tests without a GPU.
+
+Implements just enough of the API for this app: /api/chat (streaming and
+non-streaming, incl. planner JSON and native tool calls), /api/tags,
+/api/ps and /api/show. Several servers can run in one process:
+
+    python -m backend.bench.fake_ollama --ports 11501,11502 --token-delay 0.05
+    OLLAMA_URLS=http://127.0.0.1:11501,http://127.0.0.1:11502 uvicorn backend.main:app
+
+Kill one of them (or start it with --die-after N) to watch the failover.
+tests/test_ollama_backends.py runs build_app() in-process (httpx.ASGITransport)
+for the automated routing/failover tests.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+_ANSWER = "Das ist eine Testantwort vom Fake-Ollama."
+_TIMINGS = {
+    "total_duration": 50_000_000,
+    "load_duration": 1_000_000,
+    "prompt_eval_count": 42,
+    "prompt_eval_duration": 10_000_000,
+    "eval_count": 9,
+    "eval_duration": 30_000_000,
+}
+
+
+def _last_user_text(body: dict) -> str:
+    users = [m for m in body.get("messages") or [] if m.get("role") == "user"]
+    return (users[-1].get("content") or "") if users else ""
+
+
+def build_app(name: str, *, token_delay: float, die_after: int | None) -> Starlette:
+    state = {"requests": 0, "loaded": set()}
+
+    async def chat(request: Request):
+        body = await request.json()
+        state["requests"] += 1
+        if die_after is not None and state["requests"] > die_after:
+            os._exit(1)  # simulate a crashed backend (connection reset)
+        model = body.get("model") or "llama3.1:8b"
+        state["loaded"].add(model)
+        text = _last_user_text(body)
+
+        if not body.get("stream", True):
+            if body.get("format") is not None:
+                tool = "get_weather" if "wetter" in text.lower() else None
+                content = json.dumps({"action": "tool_call", "tool": tool, "args": {}} if tool else {"action": "respond"})
+            else:
+                content = _ANSWER
+            await asyncio.sleep(token_delay * 5)
+            return JSONResponse({"model": model, "message": {"role": "assistant", "content": content}, "done": True, **_TIMINGS})
+
+        async def gen():
+            if body.get("tools") and "wetter" in text.lower():
+                call = {"function": {"name": "get_weather", "arguments": {}}}
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": "", "tool_calls": [call]}, "done": False}) + "\n"
+            else:
+                for word in f"[{name}] {_ANSWER}".split(" "):
+                    await asyncio.sleep(token_delay)
+                    yield json.dumps({"model": model, "message": {"role": "assistant", "content": word + " "}, "done": False}) + "\n"
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True, **_TIMINGS}) + "\n"
+
+        return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+    async def tags(request: Request):
+        return JSONResponse({"models": [{"name": "llama3.1:8b"}]})
+
+    async def ps(request: Request):
+        return JSONResponse({"models": [{"name": m} for m in sorted(state["loaded"])]})
+
+    async def show(request: Request):
+        return JSONResponse({"model_info": {"general.architecture": "llama", "llama.context_length": 131072}})
+
+    return Starlette(
+        routes=[
+            Route("/api/chat", chat, methods=["POST"]),
+            Route("/api/tags", tags),
+            Route("/api/ps", ps),
+            Route("/api/show", show, methods=["POST"]),
+        ]
+    )
+
+
+async def _serve(ports: list[int], *, token_delay: float, die_after: int | None) -> None:
+    servers = [
+        uvicorn.Server(
+            uvicorn.Config(build_app(f"fake:{p}", token_delay=token_delay, die_after=die_after), port=p, log_level="warning")
+        )
+        for p in ports
+    ]
+    await asyncio.gather(*(s.serve() for s in servers))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Ollama server(s)")
+    parser.add_argument("--ports", default="11501", help="comma-separated ports")
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--die-after", type=int, default=None, help="exit after N chat requests")
+    args = parser.parse_args()
+    ports = [int(p) for p in args.ports.split(",") if p.strip()]
+    asyncio.run(_serve(ports, token_delay=args.token_delay, die_after=args.die_after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Intent classifier report: how far the local classifier can replace the LLM planner.
+
+Reads the planner decision log (LOG_DIR/planner_decisions.jsonl, written in
+LLM_LOCAL_INTENT=shadow/on mode with LLM_INTENT_LOG=true), evaluates rules + char-n-gram model with
+k-fold cross-validation against the LLM labels and prints the confusion
+matrix, coverage (share decided locally), accuracy and classify latency.
+
+    python -m backend.bench.intent_report --folds 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from collections import Counter
+
+from backend.core.config import settings
+from backend.services.intent import UNSURE, CharNgramNB, IntentClassifier, classifier, format_confusion, load_examples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=settings.LLM_LOCAL_INTENT_THRESHOLD)
+    args = parser.parse_args()
+
+    texts, labels = load_examples(classifier.log_path)
+    if not texts:
+        print(f"No logged decisions in {classifier.log_path}")
+        return
+    print(f"{len(texts)} logged decisions: {dict(Counter(labels))}")
+
+    confusion: Counter = Counter()
+    timings: list[float] = []
+    folds = max(2, min(args.folds, len(texts)))
+    for k in range(folds):
+        train = [i for i in range(len(texts)) if i % folds != k]
+        local = IntentClassifier()
+        local.model = CharNgramNB().fit([texts[i] for i in train], [labels[i] for i in train])
+        for i in range(k, len(texts), folds):
+            t0 = time.perf_counter()
+            guess = local.classify(texts[i])
+            timings.append((time.perf_counter() - t0) * 1e6)
+            predicted = guess.label if guess.confidence >= args.threshold else UNSURE
+            confusion[(labels[i], predicted)] += 1
+
+    total = sum(confusion.values())
+    decided = sum(n for (_, p), n in confusion.items() if p != UNSURE)
+    correct = sum(n for (l, p), n in confusion.items() if p == l)
+    timings.sort()
+    print()
+    print("Confusion matrix (rows = LLM planner, cols = local):")
+    print(format_confusion(confusion))
+    print()
+    print(f"coverage:  {decided}/{total} = {decided / total:.1%} decided locally (threshold {args.threshold})")
+    print(f"accuracy:  {correct}/{decided} = {correct / max(1, decided):.1%} of local decisions match the LLM")
+    print(f"latency:   p50={timings[len(timings) // 2]:.0f} µs  p99={timings[int(len(timings) * 0.99)]:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
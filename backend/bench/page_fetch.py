@@ -0,0 +1,87 @@
+"""Page fetch stage against a local static HTTP server (no internet needed).
+
+Writes a long sample page (navigation, script, a holiday table buried in
+filler text), serves it with http.server on a random port and runs
+fetch_passages three times: cold, disk-cache hit, and expired cache
+(revalidated with If-Modified-Since -> 304). Prints time, bytes and the
+passages that would reach the LLM. The page cache lives in a temp dir.
+
+    python -m backend.bench.page_fetch --filler 400 --budget 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from backend.core.config import settings
+from backend.services import metrics
+from backend.services.tools import page_fetch
+from backend.services.tools.http_client import close_client
+
+_PAGE = """<!doctype html><html><head><title>Schulferien Rheinland-Pfalz</title>
+<script>var menu = "Sommerferien Sommerferien";</script></head><body>
+<nav>Startseite Bundesländer Kalender Sommerferien Winterferien</nav>
+<main><h1>Schulferien Rheinland-Pfalz 2026</h1>{filler_a}
+<table><tr><th>Ferien</th><th>Zeitraum</th></tr>
+<tr><td>Osterferien</td><td>30.03. - 10.04.2026</td></tr>
+<tr><td>Sommerferien</td><td>06.07. - 14.08.2026</td></tr>
+<tr><td>Herbstferien</td><td>12.10. - 23.10.2026</td></tr></table>{filler_b}</main>
+<footer>Impressum Datenschutz</footer></body></html>"""
+_FILLER = "<p>Absatz {i}: Allgemeiner Text über Schulentwicklung, Lehrpläne und Bildungspolitik im Land.</p>"
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+async def _run(url: str, question: str, budget: int) -> None:
+    for label in ("cold", "disk cache", "revalidated (304)"):
+        if label.startswith("revalidated"):
+            settings.SEARCH_PAGE_CACHE_TTL_SECONDS = 0.0
+        t0 = time.perf_counter()
+        passages = await page_fetch.fetch_passages([{"url": url}], question, token_budget=budget)
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"{label:>18}: {ms:7.1f} ms  passages={sum(len(p) for p in passages.values())}")
+    print(json.dumps(passages, ensure_ascii=False, indent=1))
+    print(json.dumps(metrics.snapshot(), indent=1))
+    await close_client()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filler", type=int, default=400, help="filler paragraphs around the table")
+    parser.add_argument("--budget", type=int, default=settings.SEARCH_PASSAGE_TOKEN_BUDGET)
+    parser.add_argument("--question", default="Wann sind die Sommerferien in Rheinland-Pfalz 2026?")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        half = args.filler // 2
+        page = _PAGE.format(
+            filler_a="".join(_FILLER.format(i=i) for i in range(half)),
+            filler_b="".join(_FILLER.format(i=i) for i in range(half, args.filler)),
+        )
+        (root / "page.html").write_text(page, encoding="utf-8")
+        print(f"page: {len(page.encode()):,} bytes, max fetch {settings.SEARCH_FETCH_MAX_BYTES:,} bytes")
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=tmp))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        settings.SEARCH_FETCH_ALLOW_PRIVATE = True
+        page_fetch.page_cache = page_fetch.PageCache(root / "page_cache")
+        try:
+            asyncio.run(_run(f"http://127.0.0.1:{server.server_port}/page.html", args.question, args.budget))
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Prompt-cache benchmark: legacy vs prefix-stable prompt layout.
+
+Replays a synthetic conversation against the configured Ollama (planner
+call + answer call per turn, like /stream) and reports Ollama's
+prompt_eval_count / prompt_eval_duration for both layouts. With the
+prefix-stable layout only the new tail should be evaluated each turn.
+
+    python -m backend.bench.prompt_cache --turns 8
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import httpx
+
+from backend.core.config import settings
+from backend.services.ollama_runtime import runtime
+from backend.services.prompt_builder import STATIC_SYSTEM_PROMPT, assemble, volatile_facts
+from backend.services.tool_orchestrator import _planner_messages, _PLANNER_SYSTEM_PROMPT
+
+_QUESTIONS = [
+    "Hallo! Wie geht's?",
+    "Kannst du mir erklären, was ein KV-Cache bei Sprachmodellen ist?",
+    "Und warum ist die Reihenfolge im Prompt dafür wichtig?",
+    "Gib mir bitte drei Tipps für ein schnelles Abendessen.",
+    "Welche davon ist vegetarisch?",
+    "Wie lange dauert die Zubereitung ungefähr?",
+    "Danke! Was ist der Unterschied zwischen Backpulver und Natron?",
+    "Kann ich das eine durch das andere ersetzen?",
+]
+_ANSWER = "Gerne, hier ist eine kurze Antwort. " * 12
+
+
+def _legacy_messages(history: list[dict], now: datetime, row) -> tuple[list[dict], list[dict]]:
+    # Pre-prompt_builder layout: time at the very start, planner with its own
+    # system prompt over a different slice of the history.
+    answer = [{"role": "system", "content": f"You are a helpful AI assistant. {volatile_facts(row, now)}"}] + history
+    planner = [{"role": "system", "content": STATIC_SYSTEM_PROMPT + _PLANNER_SYSTEM_PROMPT}] + answer[-8:]
+    return planner, answer
+
+
+def _stable_messages(history: list[dict], now: datetime, row) -> tuple[list[dict], list[dict]]:
+    answer = assemble(history, facts=volatile_facts(row, now))
+    return _planner_messages(answer), answer
+
+
+def _call(client: httpx.Client, messages: list[dict]) -> tuple[int, float]:
+    payload = {"messages": messages, "stream": False, **runtime.request_fields(temperature=0.0, num_predict=8)}
+    r = client.post("/api/chat", json=payload)
+    r.raise_for_status()
+    data = r.json()
+    return int(data.get("prompt_eval_count") or 0), (data.get("prompt_eval_duration") or 0) / 1e6
+
+
+def run_layout(name: str, build, turns: int) -> dict:
+    row = SimpleNamespace(default_location_name="Mainz")
+    base = datetime(2026, 1, 6, 21, 0)
+    history: list[dict] = []
+    total_count, total_ms = 0, 0.0
+    with httpx.Client(base_url=settings.OLLAMA_URL.rstrip("/"), timeout=300) as client:
+        for turn in range(turns):
+            history.append({"role": "user", "content": _QUESTIONS[turn % len(_QUESTIONS)]})
+            planner, answer = build(history, base + timedelta(minutes=turn), row)
+            pc, pms = _call(client, planner)
+            ac, ams = _call(client, answer)
+            total_count += pc + ac
+            total_ms += pms + ams
+            print(f"{name:8} turn={turn + 1:2} planner eval={pc:5} ({pms:7.1f} ms)  answer eval={ac:5} ({ams:7.1f} ms)")
+            history.append({"role": "assistant", "content": _ANSWER})
+    return {"prompt_eval_count": total_count, "prompt_eval_ms": round(total_ms, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=8)
+    args = parser.parse_args()
+
+    before = run_layout("legacy", _legacy_messages, args.turns)
+    after = run_layout("stable", _stable_messages, args.turns)
+    print()
+    print(f"before: {before}")
+    print(f"after:  {after}")
+
+
+if __name__ == "__main__":
+    main()
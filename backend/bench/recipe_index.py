@@ -0,0 +1,110 @@
+"""Recipe extraction + local index against a local static HTTP server.
+
+Serves a few recipe pages with schema.org JSON-LD (http.server, random port),
+extracts and indexes them like recipe_search does after a web search, then
+times index lookups for repeated and similar queries against the
+fetch + extract path. Index and page cache live in a temp dir.
+
+    python -m backend.bench.recipe_index --pages 20 --lookups 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+from backend.bench.page_fetch import _QuietHandler
+from backend.core.config import settings
+from backend.services import recipe_index as recipe_index_module
+from backend.services.recipe_index import RecipeIndex, compact, extract_recipes
+from backend.services.tools import page_fetch
+from backend.services.tools.http_client import close_client
+
+_DISHES = [
+    ("Vegetarische Lasagne", ["12 Lasagneplatten", "500 g Spinat", "250 g Ricotta", "400 g passierte Tomaten"], "vegetarisch, italienisch"),
+    ("Käsespätzle", ["500 g Spätzle", "200 g Bergkäse", "3 Zwiebeln", "30 g Butter"], "schwäbisch"),
+    ("Rinderrouladen", ["4 Rinderrouladen", "4 Scheiben Speck", "2 Gewürzgurken", "Senf"], "klassisch"),
+    ("Linsensuppe", ["250 g Tellerlinsen", "2 Karotten", "1 Kartoffel", "Essig"], "vegan, eintopf"),
+]
+_PAGE = """<!doctype html><html><head><title>{name}</title>
+<script type="application/ld+json">{ld}</script></head>
+<body><nav>Rezepte Kochen Backen</nav><main><h1>{name}</h1><p>Ein Rezept mit vielen Werbeblöcken.</p></main></body></html>"""
+
+
+def _json_ld(name: str, ingredients: list[str], keywords: str) -> str:
+    return json.dumps(
+        {
+            "@context": "https://schema.org",
+            "@graph": [
+                {"@type": "WebSite", "name": "Kochseite"},
+                {
+                    "@type": ["Recipe"],
+                    "name": name,
+                    "recipeIngredient": ingredients,
+                    "recipeInstructions": [{"@type": "HowToStep", "text": f"Schritt {i + 1} für {name}."} for i in range(6)],
+                    "prepTime": "PT25M",
+                    "cookTime": "PT1H",
+                    "totalTime": "PT1H25M",
+                    "recipeYield": ["4", "4 Portionen"],
+                    "keywords": keywords,
+                },
+            ],
+        },
+        ensure_ascii=False,
+    )
+
+
+async def _run(base: str, pages: int, lookups: int, index: RecipeIndex) -> None:
+    urls = [f"{base}/recipe{i}.html" for i in range(pages)]
+    t0 = time.perf_counter()
+    fetched = await page_fetch.fetch_pages(urls)
+    records = [r for url, page in fetched.items() for r in extract_recipes(page.get("json_ld") or [], url)]
+    index.add(records)
+    cold_ms = (time.perf_counter() - t0) * 1000
+    print(f"fetch + extract + index: {len(fetched)} pages -> {len(records)} recipes in {cold_ms:.1f} ms")
+    await close_client()
+
+    for query in ("vegetarische Lasagne", "Lasagne mit Spinat", "Rezept Kaesespaetzle", "vegane Linsensuppe", "Sushi"):
+        t1 = time.perf_counter()
+        for _ in range(lookups):
+            hits = index.search(query, settings.RECIPE_MAX_RESULTS)
+        us = (time.perf_counter() - t1) / lookups * 1e6
+        print(f"  {query!r:>26}: {len(hits)} hits, {us:7.1f} us/lookup  {[h['name'] for h in hits[:2]]}")
+    if records:
+        print(json.dumps(compact(records[0], settings.RECIPE_MAX_STEPS), ensure_ascii=False))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for i in range(args.pages):
+            name, ingredients, keywords = _DISHES[i % len(_DISHES)]
+            name = name if i < len(_DISHES) else f"{name} Nr. {i}"
+            page = _PAGE.format(name=name, ld=_json_ld(name, ingredients, keywords))
+            (root / f"recipe{i}.html").write_text(page, encoding="utf-8")
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=tmp))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        settings.SEARCH_FETCH_ALLOW_PRIVATE = True
+        page_fetch.page_cache = page_fetch.PageCache(root / "page_cache")
+        index = recipe_index_module.recipe_index = RecipeIndex(root / "recipes.sqlite")
+        try:
+            asyncio.run(_run(f"http://127.0.0.1:{server.server_port}", args.pages, args.lookups, index))
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""SSE framing benchmark: one frame per token vs coalesced, pre-serialized frames.
+
+Simulates N concurrent streams whose tokens arrive at a fixed rate (no
+Ollama needed) and reads them like /stream does. Reports frames (= writes
+to the proxy), frames/s and process CPU per 1,000 tokens for both paths.
+
+    python -m backend.bench.sse_frames --streams 20 --tokens 400 --rate 80
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from backend.services.sse import frame, sse_frames
+from backend.services.stream_runs import StreamRun
+
+_WORDS = "Das ist eine etwas längere Testantwort mit Umlauten, Zahlen wie 42 und \"Zitaten\".".split(" ")
+
+
+async def _produce(run: StreamRun, tokens: int, rate: float) -> None:
+    run.emit("meta", {"ok": True, "message": "stream_started", "run_id": run.run_id})
+    for i in range(tokens):
+        run.emit("token", {"token": _WORDS[i % len(_WORDS)] + " "})
+        await asyncio.sleep(1 / rate)
+    run.emit("done", {"ok": True, "assistant_message_id": 1})
+    run.finish()
+
+
+async def _legacy_frames(run: StreamRun):
+    # Pre-coalescer behaviour: every event is its own json.dumps'd frame and write.
+    async for batch in run.events(0):
+        for seq, event, data in batch:
+            yield frame(data, event=event, event_id=f"{run.run_id}.{seq}")
+
+
+async def _consume(frames) -> tuple[int, int]:
+    count = size = 0
+    async for chunk in frames:
+        count += 1
+        size += len(chunk)
+    return count, size
+
+
+async def run_path(name: str, streams: int, tokens: int, rate: float, coalesced: bool) -> dict:
+    runs = [StreamRun(i, i) for i in range(streams)]
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    producers = [asyncio.create_task(_produce(r, tokens, rate)) for r in runs]
+    readers = [_consume(sse_frames(r) if coalesced else _legacy_frames(r)) for r in runs]
+    results = await asyncio.gather(*readers)
+    await asyncio.gather(*producers)
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - t0
+    frames = sum(c for c, _ in results)
+    total_tokens = streams * tokens
+    out = {
+        "frames": frames,
+        "frames_per_s": round(frames / wall, 1),
+        "kib": round(sum(s for _, s in results) / 1024, 1),
+        "cpu_ms_per_1k_tokens": round(cpu * 1000 / total_tokens * 1000, 2),
+        "wall_s": round(wall, 2),
+    }
+    print(f"{name:10} {out}")
+    return out
+
+
+async def _main(args) -> None:
+    # CPU includes the simulated producers, which are identical for both paths.
+    await run_path("per-token", args.streams, args.tokens, args.rate, coalesced=False)
+    await run_path("coalesced", args.streams, args.tokens, args.rate, coalesced=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=400, help="tokens per stream")
+    parser.add_argument("--rate", type=float, default=80.0, help="tokens/s per stream")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""TOOL_RESULT_JSON size per tool type: raw payload vs compact encoding.
+
+Builds representative run_tool payloads (weather from an Open-Meteo-shaped
+response, search hits with page passages, recipe records, a multi-tool
+plan) and prints estimated prompt tokens (context_packer.estimate_tokens,
+the same estimate the history packer uses) for the raw JSON, the compact
+shape, and the compact shape under --budget. No network or Ollama needed.
+
+    python -m backend.bench.tool_payloads --budget 1200
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+
+from backend.services.context_packer import estimate_tokens
+from backend.services.tools.compact import compact_payload, dumps
+from backend.services.tools.get_weather import _current, _days
+
+_rng = random.Random(7)
+_DATES = ["2026-10-18", "2026-10-19", "2026-10-20"]
+_TEXT = (
+    "Die Sommerferien in Rheinland-Pfalz beginnen 2026 am 6. Juli und enden am 14. August. Alle Termine der "
+    "Schulferien, Feiertage und beweglichen Ferientage im Überblick, mit Hinweisen zu Brückentagen und Reisezeiten."
+)
+
+
+def _raw_forecast() -> dict:
+    return {
+        "current": {"time": "2026-10-18T14:00", "temperature_2m": _rng.uniform(5, 20), "wind_speed_10m": _rng.uniform(0, 40), "precipitation": 0.0},
+        "daily": {
+            "time": _DATES,
+            "temperature_2m_max": [_rng.uniform(10, 20) for _ in _DATES],
+            "temperature_2m_min": [_rng.uniform(0, 10) for _ in _DATES],
+            "precipitation_sum": [_rng.choice([0.0, _rng.uniform(0, 8)]) for _ in _DATES],
+            "wind_speed_10m_max": [_rng.uniform(5, 50) for _ in _DATES],
+        },
+    }
+
+
+def _ok(tool: str, args: dict, result: dict) -> dict:
+    return {"ok": True, "tool": tool, "args": args, "result": result}
+
+
+def _weather_single() -> dict:
+    raw = _raw_forecast()
+    return _ok("get_weather", {"location": "Berlin", "locations": None}, {
+        "location": {"name": "Berlin, Land Berlin, Deutschland", "latitude": 52.52437, "longitude": 13.41053},
+        "timezone": "Europe/Berlin",
+        "units": "metric",
+        "current": _current(raw),
+        "forecast": _days(raw),
+    })
+
+
+def _weather_many(names: list[str]) -> dict:
+    raws = [_raw_forecast() for _ in names]
+    currents = [_current(r) for r in raws]
+    days = [_days(r) for r in raws]
+    return _ok("get_weather", {"location": None, "locations": names}, {
+        "timezone": "Europe/Berlin",
+        "units": "metric",
+        "locations": [f"{n}, Deutschland" for n in names],
+        "current_time": currents[0]["time"],
+        "current": {col: [c[col] for c in currents] for col in ("temperature", "wind_speed", "precipitation")},
+        "dates": _DATES,
+        "daily": {col: [[d[col] for d in loc] for loc in days] for col in ("temp_max", "temp_min", "precipitation_sum", "wind_max")},
+    })
+
+
+def _search(n: int, passages: bool) -> dict:
+    results = []
+    for i in range(n):
+        item = {"title": f"Schulferien Rheinland-Pfalz 2026 – Quelle {i + 1}", "url": f"https://www.ferien-beispiel{i}.de/rheinland-pfalz/2026", "snippet": _TEXT[: 120 + 40 * i]}
+        if passages and i < 2:
+            item["passages"] = [_TEXT + " " + _TEXT]
+        results.append(item)
+    return _ok("web_search", {"query": "Schulferien Rheinland-Pfalz 2026", "max_results": 5}, {
+        "query": "Schulferien Rheinland-Pfalz 2026", "engine": "searxng", "results": results,
+    })
+
+
+def _recipes() -> dict:
+    recipes = [
+        {
+            "name": f"Vegetarische Lasagne {i + 1}",
+            "url": f"https://www.rezepte-beispiel.de/lasagne-{i}",
+            "servings": "4",
+            "total_min": 85,
+            "prep_min": 25,
+            "cook_min": 60,
+            "ingredients": ["12 Lasagneplatten", "500 g Blattspinat", "250 g Ricotta", "400 g passierte Tomaten", "1 Zwiebel", "2 Knoblauchzehen", "100 g Parmesan", "Salz, Pfeffer, Muskat"],
+            "steps": [f"Schritt {s + 1}: " + _TEXT[:150] for s in range(8)],
+        }
+        for i in range(3)
+    ]
+    res = _search(2, passages=False)["result"]
+    return _ok("recipe_search", {"query": "vegetarische Lasagne"}, {**res, "recipes": recipes, "original_query": "vegetarische Lasagne", "tool": "recipe_search"})
+
+
+def _datetime() -> dict:
+    return _ok("get_datetime", {}, {
+        "iso_datetime": "2026-10-18T14:05:33.123456+02:00", "local_datetime": "18.10.2026 14:05", "weekday": "Sonntag",
+        "date": "2026-10-18", "time": "14:05:33", "timezone": "Europe/Berlin", "locale": "de-DE",
+    })
+
+
+def _multi() -> dict:
+    calls = [_weather_many(["Berlin", "München"]), _search(5, passages=True)]
+    return {"ok": True, "tool": "multi", "partial": False, "calls": calls}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=int, default=1200, help="token budget for the last column")
+    args = parser.parse_args()
+
+    cases = {
+        "get_datetime": _datetime(),
+        "get_weather (1 Ort)": _weather_single(),
+        "get_weather (5 Orte)": _weather_many(["Berlin", "München", "Hamburg", "Köln", "Mainz"]),
+        "web_search (5 Treffer)": _search(5, passages=False),
+        "web_search + passages": _search(5, passages=True),
+        "recipe_search": _recipes(),
+        "multi (wetter + suche)": _multi(),
+    }
+    print(f"{'tool':<24}{'raw':>8}{'compact':>9}{'budget':>8}{'saved':>8}")
+    for name, payload in cases.items():
+        raw = estimate_tokens(dumps(payload))
+        compact = estimate_tokens(dumps(compact_payload(payload, token_budget=0)))
+        budgeted = estimate_tokens(dumps(compact_payload(payload, token_budget=args.budget)))
+        print(f"{name:<24}{raw:>8}{compact:>9}{budgeted:>8}{1 - budgeted / raw:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,10 @@ class Settings(BaseSettings):
     LOG_DIR: str = str(Path(PROJECT_ROOT) / "logs")
 
     DB_FILENAME: str = "app.db"
+    # Offline gazetteer (python -m backend.services.gazetteer <geonames dump>), in DB_DIR
+    GAZETTEER_FILENAME: str = "gazetteer.sqlite"
+    # Local recipe index (schema.org Recipe from result pages, SQLite FTS5), in DB_DIR
+    RECIPE_INDEX_FILENAME: str = "recipes.sqlite"
 
     # Security
     JWT_SECRET: str = "CHANGE_ME"
@@ -33,25 +37,136 @@ class Settings(BaseSettings):
 
     # Ollama
     OLLAMA_URL: str = "http://localhost:11435"
+    # Optional: several Ollama machines, comma-separated (overrides OLLAMA_URL)
+    OLLAMA_URLS: str = ""
+    OLLAMA_HEALTH_INTERVAL_SECONDS: float = 15.0
     OLLAMA_MODEL: str = "llama3.1:8b"
+    # Async client pool (shared keep-alive connections for all streams)
+    OLLAMA_MAX_CONNECTIONS: int = 256
+    OLLAMA_READ_TIMEOUT_SECONDS: float = 300.0
+    OLLAMA_POOL_TIMEOUT_SECONDS: float = 30.0
+    # Admission control: generations in flight per Ollama backend (match OLLAMA_NUM_PARALLEL)
+    OLLAMA_MAX_INFLIGHT: int = 2
+    # Runtime options: one num_ctx for ALL calls (a change forces a model reload),
+    # explicit keep_alive, warm-up on startup and a periodic keep-warm ping (0 = off).
+    OLLAMA_NUM_CTX: int = 8192
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_WARMUP_ON_STARTUP: bool = True
+    OLLAMA_KEEP_WARM_INTERVAL_SECONDS: float = 600.0
 
     # LLM behavior
     LLM_MAX_CONTEXT_MESSAGES: int = 30
+    # Token-budgeted packing (budget derived from OLLAMA_NUM_CTX): at most this many
+    # unsummarized messages are loaded; evicted turns go into a rolling summary.
+    LLM_PACK_MAX_MESSAGES: int = 200
+    LLM_SUMMARY_ENABLED: bool = True
+    LLM_SUMMARY_MAX_TOKENS: int = 400
+    # Orchestrator mode for /stream:
+    # - "planner": planner call first, then tool + final answer (Stage 1.5)
+    # - "speculative": start the direct answer while the planner runs; discard it on tool_call
+    # - "native": one streamed call with Ollama native tool calling (no planner round trip)
+    LLM_ORCHESTRATOR_MODE: str = "planner"
+    # Local intent classifier in front of the planner (rules + char-n-gram model):
+    # "off", "shadow" (compare + log only) or "on" (skip the LLM planner when confident).
+    LLM_LOCAL_INTENT: str = "shadow"
+    LLM_LOCAL_INTENT_THRESHOLD: float = 0.9
+    # Opt-in: append planner decisions incl. the raw user message to
+    # LOG_DIR/planner_decisions.jsonl (training data). Rotated at the size
+    # limit, one old file (.1) is kept.
+    LLM_INTENT_LOG: bool = False
+    LLM_INTENT_LOG_MAX_BYTES: int = 5 * 1024 * 1024
+    # LRU cache of planner decisions (normalized question -> decision; TTL per tool). 0 = off.
+    PLANNER_CACHE_SIZE: int = 512
+    # Resumable streams: events kept per generation for Last-Event-ID resume,
+    # and how long a finished generation stays attachable.
+    STREAM_RING_SIZE: int = 2048
+    STREAM_RETENTION_SECONDS: float = 120.0
+    # A generation nobody listens to any more is cancelled after this grace time
+    # (long enough for an EventSource reconnect); readers poll for disconnects.
+    STREAM_DETACH_GRACE_SECONDS: float = 10.0
+    STREAM_DISCONNECT_POLL_SECONDS: float = 1.0
+    # SSE framing: tokens arriving within this window (or up to this many chars) go
+    # out as one frame; heartbeat comments while nothing is sent (0 = off).
+    STREAM_COALESCE_MS: int = 30
+    STREAM_COALESCE_MAX_CHARS: int = 4096
+    STREAM_HEARTBEAT_SECONDS: float = 10.0
 
     # Optional: Web Search (SearXNG)
     # If not set, web_search/recipe_search tools must return a clear error (no fallback scraping).
     SEARXNG_URL: str | None = None
+    # "fanout": query variants in parallel, merged + BM25 re-ranked under SEARCH_RESULT_CHAR_BUDGET;
+    # "single": one query, first 1-3 hits in SearXNG order.
+    SEARCH_MODE: str = "fanout"
+    SEARCH_RESULT_CHAR_BUDGET: int = 2400
+    # Optional page fetch for the top N results (0 = off): best passages for the question go to the LLM.
+    SEARCH_FETCH_PAGES: int = 0
+    SEARCH_FETCH_CONCURRENCY: int = 3
+    SEARCH_FETCH_MAX_BYTES: int = 512_000
+    SEARCH_FETCH_TIMEOUT_SECONDS: float = 4.0
+    SEARCH_PASSAGE_TOKEN_BUDGET: int = 600
+    SEARCH_PAGE_CACHE_TTL_SECONDS: float = 86400.0
+    # Allow result URLs on private/loopback addresses (only for tests with a local server).
+    SEARCH_FETCH_ALLOW_PRIVATE: bool = False
+    # recipe_search: answered from the local recipe index if at least RECIPE_INDEX_MIN_MATCHES
+    # recipes match; otherwise SearXNG + JSON-LD extraction from the top RECIPE_FETCH_PAGES pages.
+    RECIPE_INDEX_ENABLED: bool = True
+    RECIPE_INDEX_MIN_MATCHES: int = 1
+    RECIPE_FETCH_PAGES: int = 3
+    RECIPE_MAX_RESULTS: int = 3
+    RECIPE_MAX_STEPS: int = 12
+
+    # Shared HTTP client for tools (keep-alive; HTTP/2 if the h2 package is installed)
+    TOOLS_HTTP2: bool = True
+    TOOLS_HTTP_MAX_CONNECTIONS: int = 32
+
+    # Multi-tool plans: independent calls run concurrently; calls still running
+    # after the budget are dropped and the answer uses the partial results.
+    TOOLS_MAX_PARALLEL_CALLS: int = 4
+    TOOLS_LATENCY_BUDGET_SECONDS: float = 15.0
+    # Simple get_datetime/get_weather questions are answered from a template
+    # (no final LLM pass); the LLM stays the fallback.
+    TOOLS_DIRECT_ANSWERS: bool = True
+    # TOOL_RESULT_JSON for the final pass: per-tool compact shapes (columns, rounding)
+    # and a token budget (must fit PHASE_RESERVES["answer"] together with the answer; 0 = no budget).
+    TOOLS_RESULT_COMPACT: bool = True
+    TOOLS_RESULT_TOKEN_BUDGET: int = 1200
 
     # Tool timeouts (seconds)
     WEATHER_TIMEOUT_SECONDS: float = 12.0
     SEARCH_TIMEOUT_SECONDS: float = 12.0
 
+    # Tool result cache (memory LRU + SQLite table tool_cache)
+    TOOL_CACHE_MEMORY_ENTRIES: int = 512
+    WEATHER_GEOCODE_TTL_SECONDS: float = 30 * 86400
+    WEATHER_FORECAST_TTL_SECONDS: float = 1800.0
+    # Older forecasts are still served (and refreshed in the background) up to TTL + this.
+    WEATHER_FORECAST_STALE_SECONDS: float = 6 * 3600
+    # Keeps the default location's forecast warm (0 = off).
+    WEATHER_REFRESH_INTERVAL_SECONDS: float = 600.0
+    # SearXNG results, TTL per query class (news / recipes / everything else)
+    SEARCH_CACHE_TTL_NEWS_SECONDS: float = 600.0
+    SEARCH_CACHE_TTL_RECIPE_SECONDS: float = 7 * 86400
+    SEARCH_CACHE_TTL_SECONDS: float = 6 * 3600
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
+    @property
+    def ollama_backend_urls(self) -> list[str]:
+        urls = [u.strip() for u in (self.OLLAMA_URLS or "").split(",") if u.strip()]
+        return urls or [self.OLLAMA_URL]
+
     @property
     def SQLALCHEMY_DATABASE_URL(self) -> str:
         db_path = Path(self.DB_DIR) / self.DB_FILENAME
         return f"sqlite:///{db_path.as_posix()}"
 
+    @property
+    def GAZETTEER_PATH(self) -> Path:
+        return Path(self.DB_DIR) / self.GAZETTEER_FILENAME
+
+    @property
+    def RECIPE_INDEX_PATH(self) -> Path:
+        return Path(self.DB_DIR) / self.RECIPE_INDEX_FILENAME
+
 
 settings = Settings()
\ No newline at end of file
@@ -1,3 +1,4 @@
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 
 from backend.core.config import settings
@@ -12,6 +13,32 @@ LOG = get_logger(__name__)
 
 def init_db() -> None:
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+
+def _add_missing_columns() -> None:
+    """Tiny migration step: create_all() does not add new columns to existing tables.
+
+    Only nullable columns are added (no defaults/backfill needed).
+    """
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing or not col.nullable:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col_type}'))
+                LOG.info("DB migration: added column %s.%s", table.name, col.name)
+            # Indexes on existing tables are not created by create_all() either.
+            existing_indexes = {i["name"] for i in insp.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    LOG.info("DB migration: created index %s", index.name)
 
 
 def ensure_admin_settings() -> None:
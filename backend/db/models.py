@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import String, Integer, DateTime, ForeignKey, Text, UniqueConstraint, Float
+from sqlalchemy import String, Integer, DateTime, ForeignKey, Text, UniqueConstraint, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from backend.db.database import Base
@@ -34,6 +34,11 @@ class Conversation(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
 
+    # Rolling summary of older turns that no longer fit the context budget.
+    # summary_upto_id = id of the last message folded into the summary.
+    summary: Mapped[str | None] = mapped_column(Text, nullable=True)
+    summary_upto_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     user: Mapped["User"] = relationship("User", back_populates="conversations")
     messages: Mapped[list["Message"]] = relationship(
         "Message",
@@ -45,6 +50,10 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Idempotency key of POST /send; NULLs do not collide in SQLite.
+        Index("ix_messages_conversation_client_id", "conversation_id", "client_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     conversation_id: Mapped[int] = mapped_column(
@@ -54,6 +63,10 @@ class Message(Base):
 
     role: Mapped[str] = mapped_column(String(20), nullable=False)  # user/assistant/system
     content: Mapped[str] = mapped_column(Text, nullable=False)
+    # Cached token estimate of `content` (see services/context_packer.py).
+    token_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Client-generated idempotency key (dedupes retried sends).
+    client_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
 
@@ -79,4 +92,15 @@ class AdminSettings(Base):
     default_lat: Mapped[float | None] = mapped_column(Float, nullable=True)
     default_lon: Mapped[float | None] = mapped_column(Float, nullable=True)
 
-    units: Mapped[str] = mapped_column(String(16), nullable=False, default="metric")
\ No newline at end of file
+    units: Mapped[str] = mapped_column(String(16), nullable=False, default="metric")
+
+
+class ToolCacheEntry(Base):
+    """Persistent tier of the tool result caches (services/tools/cache.py)."""
+
+    __tablename__ = "tool_cache"
+
+    namespace: Mapped[str] = mapped_column(String(32), primary_key=True)
+    key: Mapped[str] = mapped_column(String(500), primary_key=True)
+    value: Mapped[str] = mapped_column(Text, nullable=False)  # JSON
+    fetched_at: Mapped[float] = mapped_column(Float, nullable=False)  # unix time
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from pathlib import Path
 from fastapi import FastAPI, Request
@@ -15,6 +16,11 @@ from backend.routers.me import router as me_router
 from backend.routers.admin import router as admin_router
 from backend.routers.conversations import router as conversations_router
 from backend.routers.settings import router as settings_router
+from backend.services.intent import classifier
+from backend.services.ollama import close_async_client, keep_warm_loop
+from backend.services.ollama_backends import pool
+from backend.services.tools.get_weather import refresh_loop as weather_refresh_loop
+from backend.services.tools.http_client import close_client as close_tool_client
 
 LOG = get_logger(__name__)
 
@@ -66,8 +72,26 @@ def create_app() -> FastAPI:
         init_db()
         ensure_admin_settings()
         ensure_admin_user()
+        if settings.LLM_LOCAL_INTENT != "off":
+            classifier.train()
         LOG.info("Startup complete. DB=%s", settings.SQLALCHEMY_DATABASE_URL)
 
+    @app.on_event("startup")
+    async def _start_ollama_runtime():
+        # Runs in the background: startup must not hang if Ollama is down.
+        app.state.background_tasks = [asyncio.create_task(pool.health_loop())]
+        if settings.OLLAMA_WARMUP_ON_STARTUP:
+            app.state.background_tasks.append(asyncio.create_task(keep_warm_loop()))
+        if settings.WEATHER_REFRESH_INTERVAL_SECONDS > 0:
+            app.state.background_tasks.append(asyncio.create_task(weather_refresh_loop()))
+
+    @app.on_event("shutdown")
+    async def _shutdown():
+        for task in getattr(app.state, "background_tasks", []):
+            task.cancel()
+        await close_async_client()
+        await close_tool_client()
+
     # SPA routes: serve index.html for known frontend routes and any non-/api path (so refresh works)
     @app.get("/login")
     def spa_login():
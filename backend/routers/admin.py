@@ -7,6 +7,17 @@ from backend.db.models import User
 from backend.db.settings_crud import get_admin_settings, update_admin_settings, to_public_dict
 from backend.routers.conversations import get_current_user
 from backend.schemas.settings import AdminSettingsOut, AdminSettingsUpdateIn
+from backend.services import metrics
+from backend.services.gazetteer import gazetteer
+from backend.services.intent import classifier
+from backend.services.ollama_backends import pool
+from backend.services.ollama_runtime import runtime
+from backend.services.planner_cache import planner_cache
+from backend.services.recipe_index import recipe_index
+from backend.services.scheduler import scheduler
+from backend.services.stream_runs import runs
+from backend.services.tools.get_weather import forecast_cache, geocode_cache
+from backend.services.tools.web_search import search_cache
 
 router = APIRouter(tags=["admin"])
 
@@ -67,4 +78,26 @@ def get_settings(db: Session = Depends(get_db), admin=Depends(require_admin)):
 @router.put("/admin/settings", response_model=AdminSettingsOut)
 def put_settings(payload: AdminSettingsUpdateIn, db: Session = Depends(get_db), admin=Depends(require_admin)):
     row = update_admin_settings(db, payload.model_dump(exclude_none=True))
-    return AdminSettingsOut(**to_public_dict(row))
\ No newline at end of file
+    # Cached weather decisions may carry the old default location.
+    planner_cache.invalidate_tool("get_weather")
+    return AdminSettingsOut(**to_public_dict(row))
+
+
+@router.get("/admin/metrics")
+def get_metrics(admin=Depends(require_admin)):
+    return {
+        "ok": True,
+        **metrics.snapshot(),
+        "ollama": {**runtime.status(), "backends": pool.status()},
+        "scheduler": scheduler.stats(),
+        "stream_runs": runs.stats(),
+        "intent": classifier.status(),
+        "planner_cache": planner_cache.stats(),
+        "tool_cache": {
+            "geocode": geocode_cache.stats(),
+            "forecast": forecast_cache.stats(),
+            "search": search_cache.stats(),
+        },
+        "gazetteer": gazetteer.stats(),
+        "recipe_index": recipe_index.stats(),
+    }
@@ -1,9 +1,10 @@
-import json
+import asyncio
 from datetime import datetime
-from typing import Generator, Optional
+from typing import AsyncGenerator, Callable, Optional
 
 from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from backend.core.config import settings
@@ -11,15 +12,20 @@ from backend.core.logging_setup import get_logger
 from backend.core.security import decode_access_token
 from backend.db.database import get_db
 from backend.db.models import User, Conversation, Message
-from backend.db.settings_crud import get_admin_settings  # <--- NEW IMPORT
+from backend.db.settings_crud import get_admin_settings
 from backend.schemas.conversations import (
     ConversationCreateIn,
     ConversationRenameIn,
     MessageCreateIn,
+    MessageSendIn,
 )
-from backend.services.ollama import stream_chat_completion
-from backend.services.tool_orchestrator import plan_action, run_planned_tool, build_final_messages
-from backend.services.tools.context import ToolContext
+from backend.services.chat_pipeline import generate_turn
+from backend.services import metrics
+from backend.services.context_packer import estimate_tokens, history_budget, message_tokens, pack_history
+from backend.services.history_cache import CachedMessage, history_cache
+from backend.services.prompt_builder import assemble, volatile_facts
+from backend.services.sse import sse_frames
+from backend.services.stream_runs import StreamRun, runs
 
 LOG = get_logger(__name__)
 router = APIRouter(tags=["conversations"])
@@ -155,6 +161,7 @@ def create_message(
         user_id=user.id,
         role="user",
         content=payload.content,
+        token_count=estimate_tokens(payload.content),
         created_at=datetime.utcnow(),
     )
     db.add(msg)
@@ -163,137 +170,239 @@ def create_message(
     return {"ok": True, "message": {"id": msg.id}}
 
 
-def _sse(data: dict, event: Optional[str] = None) -> str:
-    s = ""
-    if event:
-        s += f"event: {event}\n"
-    s += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-    return s
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
 
 
-@router.get("/conversations/{conversation_id}/stream")
-def stream_assistant(conversation_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-    if not conv:
-        return JSONResponse(status_code=404, content={"detail": "Conversation not found"})
-    if not _require_owner_or_admin(conv, user):
-        return JSONResponse(status_code=403, content={"detail": "Forbidden"})
-
+def _parse_last_event_id(value: Optional[str]) -> tuple[Optional[str], int]:
+    """`Last-Event-ID` is "<run_id>.<seq>"; anything else means "from the start"."""
+    if not value:
+        return None, 0
+    run_id, _, seq = value.strip().partition(".")
+    try:
+        return run_id, max(0, int(seq))
+    except ValueError:
+        return None, 0
+
+
+def _stream_run(request: Request, get_run: Callable[[], StreamRun], after: int) -> StreamingResponse:
+    async def event_generator() -> AsyncGenerator[str, None]:
+        # The generation runs in its own task; this connection only reads
+        # from it. When the last reader is gone for longer than the reconnect
+        # grace time, the run (and its Ollama stream) is cancelled.
+        run = get_run()
+        runs.attach(run)
+        try:
+            async for chunk in sse_frames(run, after, is_disconnected=request.is_disconnected):
+                yield chunk
+        finally:
+            runs.detach(run)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+def _attach_existing(request: Request, conversation_id: int) -> Optional[Response]:
+    """Reconnect (Last-Event-ID) or second tab: attach to the running generation
+    instead of starting another one. None if there is nothing to attach to."""
+    resume_run_id, after = _parse_last_event_id(request.headers.get("last-event-id"))
+    run = runs.get(conversation_id)
+    if run is None or (run.done and run.run_id != resume_run_id):
+        return None
+    if run.run_id != resume_run_id:
+        after = 0
+    if run.done and after >= run.last_seq:
+        return Response(status_code=204)  # nothing missed; 204 stops EventSource reconnects
+    return _stream_run(request, lambda: run, after)
+
+
+def _load_candidates(db: Session, conv: Conversation) -> list[CachedMessage]:
+    """Packing candidates (chronological): everything after the rolling summary."""
+    cached = history_cache.get(conv.id, conv.updated_at, conv.summary_upto_id)
+    if cached is not None:
+        return cached
+    return _query_candidates(db, conv)
+
+
+def _query_candidates(db: Session, conv: Conversation) -> list[CachedMessage]:
+    stamp = conv.updated_at
     msgs = (
         db.query(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at.desc())
-        .limit(settings.LLM_MAX_CONTEXT_MESSAGES)
+        .filter(Message.conversation_id == conv.id, Message.id > (conv.summary_upto_id or 0))
+        .order_by(Message.id.desc())
+        .limit(settings.LLM_PACK_MAX_MESSAGES)
         .all()
     )
-    msgs = list(reversed(msgs))
-
-    if not msgs or msgs[-1].role != "user":
+    candidates: list[CachedMessage] = []
+    for m in reversed(msgs):
+        message_tokens(m)  # fills Message.token_count
+        candidates.append(CachedMessage(m.id, m.role, m.content, m.token_count))
+    conv_id = conv.id
+    if db.dirty:
+        db.commit()  # persist freshly computed Message.token_count values
+    history_cache.put(conv_id, stamp, candidates)
+    return candidates
+
+
+def _start_turn(
+    request: Request, db: Session, conv: Conversation, user: User, candidates: list[CachedMessage]
+) -> Response:
+    if not candidates or candidates[-1].role != "user":
         return JSONResponse(
             status_code=400,
             content={"detail": "Last message must be a user message. Send a user message first."},
         )
+    conversation_id = conv.id
+    summary = conv.summary
+
+    # The answer phase has the tighter budget, and the planner has to share
+    # its prefix, so both use the answer budget.
+    packed = pack_history(
+        [m for m in candidates if m.role in ("user", "assistant", "system")],
+        budget=history_budget("answer"),
+        summary=summary,
+        max_messages=settings.LLM_MAX_CONTEXT_MESSAGES,
+    )
+    if packed.evicted:
+        LOG.info(
+            "Context packed conversation_id=%s kept=%s evicted=%s tokens=%s/%s",
+            conversation_id, len(packed.messages), len(packed.evicted), packed.used_tokens, packed.budget,
+        )
 
-    llm_messages = []
-    
-    # --- START SYSTEM CONTEXT INJECTION ---
-    # 1. Load Admin Settings to get Location
+    # Static system prompt first, volatile facts (time, location) at the tail.
     settings_row = get_admin_settings(db)
-    
-    # 2. Format Date and Location
-    current_time = datetime.now().strftime("%A, %d. %B %Y %H:%M")
-    location_name = settings_row.default_location_name or "Unknown Location"
-    
-    # 3. Build the System Prompt
-    system_context = (
-        f"Current time: {current_time}. "
-        f"Current location: {location_name}. "
-        "If the user asks for weather without a city, use the current location."
-    )
-    
-    # 4. Insert as the very first message
-    llm_messages.append({
-        "role": "system", 
-        "content": f"You are a helpful AI assistant. {system_context}"
-    })
-    # --- END SYSTEM CONTEXT INJECTION ---
-
-    for m in msgs:
-        if m.role not in ("user", "assistant", "system"):
-            continue
-        llm_messages.append({"role": m.role, "content": m.content})
-
-    # Stage 1.5: Planner + optional tool execution
-    ctx = ToolContext(db=db, user=user)
-    decision = plan_action(llm_messages)
-    outcome = run_planned_tool(decision, ctx)
-    final_llm_messages, tool_payload = build_final_messages(llm_messages, outcome)
-    used_tool = (tool_payload or {}).get("tool") if tool_payload else None
-
-    def event_generator() -> Generator[str, None, None]:
-        assistant_text_parts: list[str] = []
-        try:
-            yield _sse({"ok": True, "message": "stream_started"}, event="meta")
-
-            for token in stream_chat_completion(final_llm_messages):
-                assistant_text_parts.append(token)
-                yield _sse({"token": token}, event="token")
-
-            full = "".join(assistant_text_parts).strip()
-            if not full:
-                full = "(Empty response)"
-
-            # Enforce sources for search-based tools even if the model forgets.
-            if used_tool in ("web_search", "recipe_search"):
-                if "http" not in full and "Quellen" not in full:
-                    try:
-                        results = ((tool_payload or {}).get("result") or {}).get("results") or []
-                        if results:
-                            extra_lines = ["\n\nQuellen:"]
-                            for r in results[:5]:
-                                title = (r.get("title") or "").strip()
-                                url = (r.get("url") or "").strip()
-                                if title or url:
-                                    extra_lines.append(f"- {title} — {url}")
-                            extra = "\n".join(extra_lines)
-                            full += extra
-                            yield _sse({"token": extra}, event="token")
-                    except Exception:
-                        pass
-
-            m = Message(
+    llm_messages = assemble(packed.messages, facts=volatile_facts(settings_row), summary=summary)
+    user_id = user.id
+
+    def start_run() -> StreamRun:
+        return runs.get_or_start(
+            conversation_id,
+            user_id,
+            lambda run: generate_turn(
+                run,
                 conversation_id=conversation_id,
-                user_id=None,
-                role="assistant",
-                content=full,
-                created_at=datetime.utcnow(),
-            )
-            db.add(m)
-            conv.updated_at = datetime.utcnow()
-            db.commit()
-
-            yield _sse({"ok": True, "assistant_message_id": m.id}, event="done")
-        except GeneratorExit:
-            partial = "".join(assistant_text_parts).strip()
-            if partial:
-                m = Message(
-                    conversation_id=conversation_id,
-                    user_id=None,
-                    role="assistant",
-                    content=partial,
-                    created_at=datetime.utcnow(),
-                )
-                db.add(m)
-                conv.updated_at = datetime.utcnow()
-                db.commit()
-            return
-        except Exception as e:
-            LOG.exception("Streaming failed: %s", e)
-            yield _sse({"ok": False, "detail": "LLM streaming failed"}, event="error")
-
-    headers = {
-        "Cache-Control": "no-cache",
-        "Connection": "keep-alive",
-        "X-Accel-Buffering": "no",
-    }
-    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=headers)
\ No newline at end of file
+                user_id=user_id,
+                llm_messages=llm_messages,
+                evicted=packed.evicted,
+                summary=summary,
+            ),
+        )
+
+    return _stream_run(request, start_run, 0)
+
+
+@router.get("/conversations/{conversation_id}/stream")
+def stream_assistant(
+    conversation_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if not conv:
+        return JSONResponse(status_code=404, content={"detail": "Conversation not found"})
+    if not _require_owner_or_admin(conv, user):
+        return JSONResponse(status_code=403, content={"detail": "Forbidden"})
+
+    attached = _attach_existing(request, conversation_id)
+    if attached is not None:
+        return attached
+    return _start_turn(request, db, conv, user, _load_candidates(db, conv))
+
+
+@router.post("/conversations/{conversation_id}/send")
+def send_and_stream(
+    conversation_id: int,
+    payload: MessageSendIn,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Stores the user message and streams the answer in one request.
+
+    With a `client_id` (or `Idempotency-Key` header) a retried send does not
+    post the message twice: it resumes the running answer (Last-Event-ID
+    honoured) or answers the stored message if that never happened.
+    """
+    conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if not conv:
+        return JSONResponse(status_code=404, content={"detail": "Conversation not found"})
+    if not _require_owner_or_admin(conv, user):
+        return JSONResponse(status_code=403, content={"detail": "Forbidden"})
+
+    client_id = payload.client_id or request.headers.get("idempotency-key") or None
+    if client_id:
+        existing = (
+            db.query(Message.id)
+            .filter(Message.conversation_id == conversation_id, Message.client_id == client_id)
+            .first()
+        )
+        if existing is not None:
+            return _resend(request, db, conv, user, existing.id)
+
+    # A second tab (or API client) while an answer is still generating: the new
+    # message would be stored, but get_or_start would attach to the old run
+    # and never answer it.
+    if runs.active(conversation_id) is not None:
+        metrics.incr("send.busy")
+        return JSONResponse(status_code=409, content={"detail": "An answer is still being generated"})
+
+    # Read before the insert bumps updated_at: the cached history is then
+    # extended with the new message instead of being loaded again.
+    cached = history_cache.get(conversation_id, conv.updated_at, conv.summary_upto_id)
+    now = datetime.utcnow()
+    msg = Message(
+        conversation_id=conversation_id,
+        user_id=user.id,
+        role="user",
+        content=payload.content,
+        token_count=estimate_tokens(payload.content),
+        client_id=client_id,
+        created_at=now,
+    )
+    db.add(msg)
+    conv.updated_at = now
+    try:
+        db.flush()
+    except IntegrityError:
+        # Same key raced in from a double click; the other request owns it.
+        db.rollback()
+        existing_id = db.query(Message.id).filter(
+            Message.conversation_id == conversation_id, Message.client_id == client_id
+        ).scalar()
+        return _resend(request, db, conv, user, existing_id)
+    new = CachedMessage(msg.id, "user", payload.content, msg.token_count)
+    db.commit()
+
+    if cached is not None:
+        candidates = cached + [new]
+        history_cache.put(conversation_id, now, candidates)
+    else:
+        candidates = _query_candidates(db, conv)
+    return _start_turn(request, db, conv, user, candidates)
+
+
+def _resend(request: Request, db: Session, conv: Conversation, user: User, message_id: int) -> Response:
+    metrics.incr("send.duplicates")
+    attached = _attach_existing(request, conv.id)
+    if attached is not None:
+        return attached
+    candidates = _load_candidates(db, conv)
+    if candidates and candidates[-1].id == message_id:
+        return _start_turn(request, db, conv, user, candidates)  # stored, but never answered
+    return JSONResponse(status_code=409, content={"detail": "Message was already answered"})
+
+
+@router.post("/conversations/{conversation_id}/cancel")
+async def cancel_stream(conversation_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    # Sync DB lookup in a worker thread, not on the event loop.
+    conv = await asyncio.to_thread(lambda: db.query(Conversation).filter(Conversation.id == conversation_id).first())
+    if not conv:
+        return JSONResponse(status_code=404, content={"detail": "Conversation not found"})
+    if not _require_owner_or_admin(conv, user):
+        return JSONResponse(status_code=403, content={"detail": "Forbidden"})
+
+    # async endpoint: cancelling the run task has to happen on the event loop.
+    return {"ok": True, "cancelled": runs.cancel(conversation_id, reason="client")}
@@ -11,4 +11,11 @@ class ConversationRenameIn(BaseModel):
 
 class MessageCreateIn(BaseModel):
     role: str = Field(default="user")
-    content: str = Field(min_length=1, max_length=20000)
\ No newline at end of file
+    content: str = Field(min_length=1, max_length=20000)
+
+
+class MessageSendIn(BaseModel):
+    content: str = Field(min_length=1, max_length=20000)
+    # Idempotency key (e.g. crypto.randomUUID()); a retry with the same key
+    # resumes the answer instead of posting the message twice.
+    client_id: str | None = Field(default=None, min_length=1, max_length=64)
@@ -1,18 +1,24 @@
 from __future__ import annotations
 
-import httpx
+import asyncio
+
+from backend.services.gazetteer import gazetteer
 from backend.services.tools.context import ToolContext
 from backend.services.tools.errors import ToolError
+from backend.services.tools.http_client import get_client, request_timeout
+
+# Offline-Gazetteer zuerst (kein Netz nötig), sonst Open-Meteo fürs Geocoding
+async def _geocode(address: str) -> tuple[float, float, str]:
+    place = gazetteer.lookup(address)
+    if place is not None:
+        return place.lat, place.lon, place.display
 
-# Wir nutzen Open-Meteo fürs Geocoding (haben wir schon, ist stabil)
-def _geocode(address: str) -> tuple[float, float, str]:
     url = "https://geocoding-api.open-meteo.com/v1/search"
     params = {"name": address, "count": 1, "language": "de", "format": "json"}
-    
-    with httpx.Client(timeout=5.0) as client:
-        r = client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json()
+
+    r = await get_client().get(url, params=params, timeout=request_timeout(5.0))
+    r.raise_for_status()
+    data = r.json()
     
     results = data.get("results") or []
     if not results:
@@ -21,7 +27,7 @@ def _geocode(address: str) -> tuple[float, float, str]:
     top = results[0]
     return float(top["latitude"]), float(top["longitude"]), top["name"]
 
-def run(args: dict, ctx: ToolContext) -> dict:
+async def run(args: dict, ctx: ToolContext) -> dict:
     start = args.get("start")
     end = args.get("end")
     mode = args.get("mode", "driving") # driving, cycling, walking
@@ -31,8 +37,7 @@ def run(args: dict, ctx: ToolContext) -> dict:
 
     # 1. Geocoding
     try:
-        lat1, lon1, name1 = _geocode(start)
-        lat2, lon2, name2 = _geocode(end)
+        (lat1, lon1, name1), (lat2, lon2, name2) = await asyncio.gather(_geocode(start), _geocode(end))
     except Exception as e:
         raise ToolError(f"Konnte Adressen nicht finden: {e}")
 
@@ -61,10 +66,9 @@ def run(args: dict, ctx: ToolContext) -> dict:
     url = f"http://router.project-osrm.org/route/v1/{final_profile}/{lon1},{lat1};{lon2},{lat2}"
     
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(url, params={"overview": "false"})
-            r.raise_for_status()
-            data = r.json()
+        r = await get_client().get(url, params={"overview": "false"}, timeout=request_timeout(10.0))
+        r.raise_for_status()
+        data = r.json()
     except Exception as e:
         raise ToolError("Routing-Server nicht erreichbar.")
 
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import aclosing
+from datetime import datetime
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.db.database import SessionLocal
+from backend.db.models import Conversation, Message, User
+from backend.db.settings_crud import get_admin_settings
+from backend.services import metrics
+from backend.services.context_packer import estimate_tokens, schedule_summary
+from backend.services.history_cache import CachedMessage, history_cache
+from backend.services.ollama import astream_chat_completion
+from backend.services.scheduler import INTERACTIVE, scheduler
+from backend.services.stream_runs import StreamRun
+from backend.services.tool_orchestrator import (
+    aplan_action,
+    build_final_messages,
+    native_plan,
+    payload_tools,
+    render_direct_answer,
+    run_planned_tool,
+    speculative_plan,
+)
+from backend.services.tools.context import ToolContext
+
+LOG = get_logger(__name__)
+
+_SEARCH_TOOLS = ("web_search", "recipe_search")
+
+
+def _save_assistant_message(db, conversation_id: int, content: str) -> int:
+    m = Message(
+        conversation_id=conversation_id,
+        user_id=None,
+        role="assistant",
+        content=content,
+        token_count=estimate_tokens(content),
+        created_at=datetime.utcnow(),
+    )
+    db.add(m)
+    db.flush()
+    message_id = m.id
+    conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if conv is not None:
+        prev_stamp = conv.updated_at
+        conv.updated_at = datetime.utcnow()
+        history_cache.append(
+            conversation_id, prev_stamp, conv.updated_at, CachedMessage(message_id, "assistant", content, m.token_count)
+        )
+    db.commit()
+    return message_id
+
+
+def _record_cancel(run: StreamRun) -> None:
+    """Counts a cancelled turn and estimates the answer tokens Ollama did not have to generate."""
+    reason = run.cancel_reason or "shutdown"
+    metrics.incr(f"stream.cancelled.{reason}")
+    metrics.incr("stream.cancelled.tokens_generated", run.answer_tokens)
+    expected = metrics.average("ollama.stream.eval_count")
+    if expected is not None:
+        saved = max(0, round(expected) - run.answer_tokens)
+        metrics.incr("stream.cancelled.tokens_saved_est", saved)
+    else:
+        saved = None
+    LOG.info(
+        "Stream cancelled conversation_id=%s reason=%s tokens_generated=%s tokens_saved_est=%s",
+        run.conversation_id, reason, run.answer_tokens, saved,
+    )
+
+
+def _sources_footer(tool_payload: dict | None) -> str:
+    payloads = (tool_payload or {}).get("calls") or [tool_payload or {}]
+    results = []
+    for p in payloads:
+        if p.get("tool") in _SEARCH_TOOLS:
+            result = p.get("result") or {}
+            results.extend({"title": r.get("name"), "url": r.get("url")} for r in result.get("recipes") or [])
+            results.extend(result.get("results") or [])
+    if not results:
+        return ""
+    extra_lines = ["\n\nQuellen:"]
+    for r in results[:5]:
+        title = (r.get("title") or "").strip()
+        url = (r.get("url") or "").strip()
+        if title or url:
+            extra_lines.append(f"- {title} — {url}")
+    return "\n".join(extra_lines)
+
+
+async def _direct_answer(db, outcome) -> str | None:
+    """Template answer for a simple tool question (see render_direct_answer), with metrics."""
+    if not outcome.decision.simple:
+        return None
+    t0 = time.perf_counter()
+    row = await asyncio.to_thread(get_admin_settings, db)
+    text = render_direct_answer(outcome, row.locale or "de-DE")
+    if text is None:
+        metrics.incr("direct_answer.fallback")
+        return None
+    metrics.incr("direct_answer.used")
+    metrics.observe("direct_answer.ms", round((time.perf_counter() - t0) * 1000, 2))
+    # GPU time the skipped final pass would have cost: mean of the real ones.
+    avg = metrics.average("final_pass.ms")
+    if avg is not None:
+        metrics.incr("direct_answer.gpu_ms_saved_est", round(avg, 1))
+    return text
+
+
+async def generate_turn(
+    run: StreamRun,
+    *,
+    conversation_id: int,
+    user_id: int,
+    llm_messages: list[dict],
+    evicted: list[dict],
+    summary: str | None,
+) -> None:
+    """One assistant turn (admission, planner/tool, streaming, persistence).
+
+    Runs as a background task owned by the StreamRun, so it does not depend
+    on any client connection. It has its own DB session for the same reason.
+    """
+    assistant_text_parts: list[str] = []
+    # The final save runs in a worker thread that keeps going when the task is
+    # cancelled meanwhile; a cancel then must not save the partial text again.
+    save: asyncio.Future | None = None
+    # Admission: at most OLLAMA_MAX_INFLIGHT turns per healthy backend talk to
+    # Ollama at once, the rest wait here (round-robin per user) and see their
+    # position. The per-backend cap itself is enforced by pool.lease().
+    ticket = scheduler.enqueue(user_id, INTERACTIVE)
+    db = SessionLocal()
+    try:
+        run.emit("meta", {"ok": True, "message": "stream_started", "run_id": run.run_id})
+
+        async for position in ticket.wait():
+            run.emit("queue", {"position": position})
+
+        if evicted:
+            schedule_summary(conversation_id, summary, evicted)
+
+        user = db.query(User).filter(User.id == user_id).first()
+        question = next((m.get("content") for m in reversed(llm_messages) if m.get("role") == "user"), None)
+        ctx = ToolContext(db=db, user=user, question=question)
+
+        decision = None
+        mode = settings.LLM_ORCHESTRATOR_MODE
+        direct = mode in ("speculative", "native")
+        if direct:
+            # The direct answer streams while the tool decision is made; on
+            # tool_call the client is told to drop what it already rendered.
+            turn = native_plan(llm_messages) if mode == "native" else speculative_plan(llm_messages, user_id=user_id)
+            async with aclosing(turn) as events:
+                async for kind, value in events:
+                    if kind == "decision":
+                        decision = value
+                        if decision.action == "tool_call" and assistant_text_parts:
+                            assistant_text_parts.clear()
+                            run.emit("reset", {"reason": "tool_call"})
+                    else:
+                        assistant_text_parts.append(value)
+                        run.emit("token", {"token": value})
+        else:
+            decision = await aplan_action(llm_messages, user_id=user_id)
+
+        # Stage 1.5: optional tool execution (async; legacy sync tools run in threads).
+        tool_payload = None
+        if decision.action == "tool_call":
+            # No generation runs while the tools do (search + page fetch can take
+            # seconds): give the slot back and queue again for the final pass.
+            ticket.release()
+            outcome = await run_planned_tool(decision, ctx)
+            direct_answer = await _direct_answer(db, outcome)
+            if direct_answer is not None:
+                tool_payload = outcome.tool_payload
+                assistant_text_parts.append(direct_answer)
+                run.emit("token", {"token": direct_answer})
+            else:
+                ticket = scheduler.enqueue(user_id, INTERACTIVE)
+                async for position in ticket.wait():
+                    run.emit("queue", {"position": position})
+                final_llm_messages, tool_payload = build_final_messages(llm_messages, outcome)
+                t_final = time.perf_counter()
+                async for token in astream_chat_completion(final_llm_messages):
+                    if not assistant_text_parts:
+                        metrics.observe("final_pass.first_token_ms", round((time.perf_counter() - t_final) * 1000, 1))
+                    assistant_text_parts.append(token)
+                    run.emit("token", {"token": token})
+                metrics.observe("final_pass.ms", round((time.perf_counter() - t_final) * 1000, 1))
+        elif not direct:
+            async for token in astream_chat_completion(llm_messages):
+                assistant_text_parts.append(token)
+                run.emit("token", {"token": token})
+        used_tools = payload_tools(tool_payload)
+
+        full = "".join(assistant_text_parts).strip()
+        if not full:
+            full = "(Empty response)"
+
+        # Enforce sources for search-based tools even if the model forgets.
+        if any(t in _SEARCH_TOOLS for t in used_tools):
+            if "http" not in full and "Quellen" not in full:
+                try:
+                    extra = _sources_footer(tool_payload)
+                    if extra:
+                        full += extra
+                        run.emit("token", {"token": extra})
+                except Exception:
+                    pass
+
+        save = asyncio.ensure_future(asyncio.to_thread(_save_assistant_message, db, conversation_id, full))
+        message_id = await asyncio.shield(save)
+
+        run.emit("done", {"ok": True, "assistant_message_id": message_id})
+    except asyncio.CancelledError:
+        # Cancel endpoint, abandoned run or shutdown. The cancellation is raised
+        # inside the Ollama stream, whose context managers close the upstream
+        # response right away, so Ollama stops generating and the slot is free.
+        _record_cancel(run)
+        partial = "".join(assistant_text_parts).strip()
+        if save is None and partial:
+            save = asyncio.ensure_future(asyncio.to_thread(_save_assistant_message, db, conversation_id, partial))
+        message_id = None
+        if save is not None:
+            try:
+                message_id = await asyncio.shield(save)
+            except Exception:
+                LOG.exception("Saving the cancelled answer failed conversation_id=%s", conversation_id)
+        run.emit("done", {"ok": True, "assistant_message_id": message_id, "cancelled": True})
+        raise
+    except Exception as e:
+        LOG.exception("Streaming failed: %s", e)
+        run.emit("error", {"ok": False, "detail": "LLM streaming failed"})
+    finally:
+        ticket.release()
+        if save is not None and not save.done():
+            # Cancelled again while saving: the thread still uses the session.
+            save.add_done_callback(lambda _: db.close())
+        else:
+            db.close()
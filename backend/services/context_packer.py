@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Protocol
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.db.database import SessionLocal
+from backend.db.models import Conversation
+from backend.services import metrics
+from backend.services.ollama import achat_completion
+from backend.services.ollama_runtime import runtime
+from backend.services.prompt_builder import STATIC_SYSTEM_PROMPT
+from backend.services.scheduler import BACKGROUND, SYSTEM_USER_ID, scheduler
+
+LOG = get_logger(__name__)
+
+# Ollama truncates from the FRONT when a prompt exceeds num_ctx (losing the
+# system prompt first). So we pack the history ourselves:
+#   - token estimate per message, cached in Message.token_count
+#   - newest-first until the phase budget is full
+#   - evicted turns are folded into Conversation.summary in the background
+
+# Rough per-message overhead of the chat template (role header + separators).
+_MESSAGE_OVERHEAD = 4
+# Word pieces: most tokenizers split long words, so count ~1 token per 6 chars.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Output + tail reserve per phase (tokens). The answer phase also has to fit
+# TOOL_RESULT_JSON, the planner only its instruction and a short JSON reply.
+PHASE_RESERVES: dict[str, int] = {
+    "planner": 512,
+    "answer": 2048,
+}
+
+# After an eviction the history is packed down to this fraction of the budget,
+# so the kept prefix stays stable for several turns (KV cache) instead of
+# shifting by one message every turn.
+_LOW_WATERMARK = 0.6
+
+_SUMMARY_PROMPT = (
+    "Fasse den bisherigen Gesprächsverlauf knapp zusammen (max. 10 Stichpunkte). "
+    "Behalte Fakten, Namen, Zahlen, Entscheidungen und offene Fragen. "
+    "Antworte nur mit der Zusammenfassung."
+)
+
+_summary_tasks: dict[int, asyncio.Task] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return sum(1 + len(w) // 6 for w in _TOKEN_RE.findall(text))
+
+
+class HistoryMessage(Protocol):
+    """What packing reads: a Message row or a history_cache.CachedMessage."""
+
+    id: int
+    role: str
+    content: str
+    token_count: int | None
+
+
+def message_tokens(m: HistoryMessage) -> int:
+    """Token estimate of a stored message; fills the Message.token_count cache."""
+    if m.token_count is None:
+        m.token_count = estimate_tokens(m.content)
+    return m.token_count + _MESSAGE_OVERHEAD
+
+
+def history_budget(phase: str = "answer") -> int:
+    """Tokens available for summary + history in the given phase."""
+    fixed = estimate_tokens(STATIC_SYSTEM_PROMPT) + 2 * _MESSAGE_OVERHEAD + 64  # + facts tail
+    return max(256, runtime.num_ctx() - PHASE_RESERVES.get(phase, PHASE_RESERVES["answer"]) - fixed)
+
+
+def _truncate_middle(text: str, max_tokens: int) -> str:
+    """Keeps head and tail of an oversized message (question usually at the end)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Approximate via characters; estimate_tokens() is char-based anyway.
+    ratio = max_tokens / max(1, estimate_tokens(text))
+    keep = int(len(text) * ratio) - 20
+    head = keep // 3
+    tail = keep - head
+    return f"{text[:head]}\n[…]\n{text[-tail:]}"
+
+
+@dataclass
+class PackedHistory:
+    messages: list[dict]
+    # Plain dicts (id, role, content): they outlive the request's DB session.
+    evicted: list[dict]
+    used_tokens: int
+    budget: int
+
+
+def pack_history(
+    msgs: list[HistoryMessage],
+    *,
+    budget: int,
+    summary: str | None = None,
+    max_messages: int | None = None,
+) -> PackedHistory:
+    """Fills `budget` newest-first. `msgs` are in chronological order.
+
+    The newest message is always kept (truncated in the middle if needed).
+    If anything has to be evicted (token budget or `max_messages`), packing
+    stops at the low watermark so the next turns can append without
+    evicting again.
+    """
+    used = estimate_tokens(summary) + _MESSAGE_OVERHEAD if summary else 0
+    costs = [message_tokens(m) for m in msgs]
+    max_messages = max_messages or len(msgs)
+
+    if used + sum(costs) <= budget and len(msgs) <= max_messages:
+        return PackedHistory(
+            messages=[{"role": m.role, "content": m.content} for m in msgs],
+            evicted=[],
+            used_tokens=used + sum(costs),
+            budget=budget,
+        )
+
+    target = int(budget * _LOW_WATERMARK)
+    target_count = max(1, int(max_messages * _LOW_WATERMARK))
+    kept: list[dict] = []
+    start = len(msgs)
+    for i in range(len(msgs) - 1, -1, -1):
+        m = msgs[i]
+        if not kept:
+            content = m.content
+            if used + costs[i] > budget:
+                content = _truncate_middle(content, max(64, budget - used - _MESSAGE_OVERHEAD))
+            kept.append({"role": m.role, "content": content})
+            used += min(costs[i], budget - used)
+            start = i
+            continue
+        if used + costs[i] > target or len(kept) >= target_count:
+            break
+        kept.append({"role": m.role, "content": m.content})
+        used += costs[i]
+        start = i
+
+    kept.reverse()
+    metrics.incr("context.evictions")
+    evicted = [{"id": m.id, "role": m.role, "content": m.content} for m in msgs[:start]]
+    return PackedHistory(messages=kept, evicted=evicted, used_tokens=used, budget=budget)
+
+
+def schedule_summary(conversation_id: int, previous_summary: str | None, evicted: list[dict]) -> None:
+    """Folds evicted messages into the rolling summary (background task, one per conversation)."""
+    if not settings.LLM_SUMMARY_ENABLED or not evicted:
+        return
+    running = _summary_tasks.get(conversation_id)
+    if running is not None and not running.done():
+        return
+    upto_id = evicted[-1]["id"]
+    transcript = [{"role": m["role"], "content": m["content"]} for m in evicted if m["role"] in ("user", "assistant")]
+    task = asyncio.create_task(_summarize(conversation_id, previous_summary, transcript, upto_id))
+    _summary_tasks[conversation_id] = task
+    task.add_done_callback(lambda t: _summary_tasks.pop(conversation_id, None))
+
+
+async def _summarize(conversation_id: int, previous_summary: str | None, transcript: list[dict], upto_id: int) -> None:
+    messages: list[dict] = [{"role": "system", "content": _SUMMARY_PROMPT}]
+    if previous_summary:
+        messages.append({"role": "system", "content": f"Bisherige Zusammenfassung:\n{previous_summary}"})
+    messages.extend(transcript)
+    messages.append({"role": "user", "content": "Bitte fasse jetzt zusammen."})
+
+    ticket = scheduler.enqueue(SYSTEM_USER_ID, BACKGROUND)
+    try:
+        async for _ in ticket.wait():
+            pass
+        summary = (await achat_completion(messages, temperature=0.2, max_tokens=settings.LLM_SUMMARY_MAX_TOKENS)).strip()
+    finally:
+        ticket.release()
+    if not summary:
+        LOG.warning("Summary generation returned nothing conversation_id=%s", conversation_id)
+        return
+
+    def persist() -> None:
+        db = SessionLocal()
+        try:
+            conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+            if conv is None:
+                return
+            if conv.summary_upto_id is not None and conv.summary_upto_id >= upto_id:
+                return
+            conv.summary = summary
+            conv.summary_upto_id = upto_id
+            db.commit()
+        finally:
+            db.close()
+
+    await asyncio.to_thread(persist)
+    metrics.incr("context.summaries")
+    LOG.info("Conversation summary updated conversation_id=%s upto_id=%s tokens=%s", conversation_id, upto_id, estimate_tokens(summary))
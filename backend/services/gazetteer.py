@@ -0,0 +1,276 @@
+"""Offline gazetteer: place name -> coordinates without a network round trip.
+
+Built from a GeoNames dump (e.g. cities15000.zip / cities500.zip from
+https://download.geonames.org/export/dump/) into a small SQLite file:
+
+    python -m backend.services.gazetteer cities15000.zip --admin1 admin1CodesASCII.txt
+
+Names are folded (lowercase, no diacritics, "-" -> " "), and every name is
+also indexed in its German transliteration, so "München", "Munchen" and
+"Muenchen" all match. Among equal names the largest population wins.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+
+LOG = get_logger(__name__)
+
+_SEPARATORS_RE = re.compile(r"[\s\-_/]+")
+_DROP_RE = re.compile(r"[.'’`()]")
+_GERMAN_TRANSLIT = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+# Alternate names worth indexing: Latin script, no codes/URLs.
+_LATIN_NAME_RE = re.compile(r"^[A-Za-zÀ-ɏ' .\-]{2,60}$")
+_LOOKUP_CACHE_SIZE = 1024
+
+
+def fold(name: str) -> str:
+    """Lookup key: lowercase, diacritics stripped, separators collapsed."""
+    t = unicodedata.normalize("NFKD", name.lower().replace("ß", "ss"))
+    t = "".join(c for c in t if not unicodedata.combining(c))
+    return " ".join(_SEPARATORS_RE.sub(" ", _DROP_RE.sub("", t)).split())
+
+
+def index_keys(name: str) -> set[str]:
+    keys = {fold(name), fold(name.lower().translate(_GERMAN_TRANSLIT))}
+    keys.discard("")
+    return keys
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    admin1: str
+    country: str
+    lat: float
+    lon: float
+    population: int
+
+    @property
+    def display(self) -> str:
+        # Same shape as the Open-Meteo geocoder result ("name, admin1, country").
+        return ", ".join(p for p in (self.name, self.admin1, self.country) if p)
+
+
+class Gazetteer:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._mtime: float | None = None
+        self._lock = threading.Lock()
+        # lookup() results of the index file with mtime `_cache_mtime` (LRU).
+        self._cache: OrderedDict[tuple[str, str | None], Place | None] = OrderedDict()
+        self._cache_mtime: float | None = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def _connection(self) -> sqlite3.Connection | None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return None
+        if self._conn is None or mtime != self._mtime:
+            # (Re)open after an import replaced the file.
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._mtime = mtime
+        return self._conn
+
+    @property
+    def available(self) -> bool:
+        with self._lock:
+            return self._connection() is not None
+
+    def lookup(self, name: str) -> Place | None:
+        """Best match for a place name ("München", "Paris, FR"); None if unknown or no index."""
+        base, _, rest = name.partition(",")
+        country = rest.strip().upper() if len(rest.strip()) == 2 else None
+        key = fold(base)
+        if not key:
+            return None
+        with self._lock:
+            if self._connection() is None:
+                return None
+            if self._cache_mtime != self._mtime:
+                self._cache.clear()
+                self._cache_mtime = self._mtime
+            place = self._cached_lookup(key, country)
+        metrics.incr("gazetteer.hits" if place else "gazetteer.misses")
+        return place
+
+    def _cached_lookup(self, key: str, country: str | None) -> Place | None:
+        """Caller holds the lock and has checked the index file's mtime."""
+        ck = (key, country)
+        if ck in self._cache:
+            self._cache.move_to_end(ck)
+            self._cache_hits += 1
+            return self._cache[ck]
+        self._cache_misses += 1
+        place = self._query(key, country)
+        self._cache[ck] = place
+        if len(self._cache) > _LOOKUP_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return place
+
+    def _query(self, key: str, country: str | None) -> Place | None:
+        sql = (
+            "SELECT p.name, p.admin1, p.country, p.lat, p.lon, p.population FROM names n "
+            "JOIN places p ON p.id = n.place_id WHERE n.key = ?"
+        )
+        params: tuple = (key,)
+        if country:
+            sql += " AND p.country = ?"
+            params += (country,)
+        row = self._conn.execute(sql + " ORDER BY n.population DESC LIMIT 1", params).fetchone()
+        return Place(*row) if row else None
+
+    def prefix(self, text: str, limit: int = 10) -> list[Place]:
+        """Places whose (folded) name starts with `text`, largest first."""
+        key = fold(text)
+        if not key:
+            return []
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return []
+            rows = conn.execute(
+                "SELECT p.name, p.admin1, p.country, p.lat, p.lon, p.population FROM names n "
+                "JOIN places p ON p.id = n.place_id WHERE n.key >= ? AND n.key < ? "
+                "GROUP BY p.id ORDER BY p.population DESC LIMIT ?",
+                (key, key + "\uffff", limit),
+            ).fetchall()
+        return [Place(*r) for r in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return {"available": False, "path": str(self.path)}
+            meta = dict(conn.execute("SELECT k, v FROM meta").fetchall())
+            return {"available": True, "path": str(self.path), **meta, "lookup_cache": self._cache_stats()}
+
+    def _cache_stats(self) -> dict:
+        return {
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "maxsize": _LOOKUP_CACHE_SIZE,
+            "currsize": len(self._cache),
+        }
+
+
+def _read_lines(src: Path) -> io.TextIOBase:
+    if src.suffix == ".zip":
+        zf = zipfile.ZipFile(src)
+        member = next(n for n in zf.namelist() if n.endswith(".txt") and not n.startswith("readme"))
+        return io.TextIOWrapper(zf.open(member), encoding="utf-8")
+    return src.open(encoding="utf-8")
+
+
+def _load_admin1(path: Path | None) -> dict[str, str]:
+    names: dict[str, str] = {}
+    if path is None:
+        return names
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) >= 2:
+                names[cols[0]] = cols[1]  # "DE.02" -> "Bavaria"
+    return names
+
+
+def build(src: Path, dst: Path, *, admin1: Path | None = None, min_population: int = 0) -> int:
+    """Imports a GeoNames dump (txt or zip) into `dst`. Returns the number of places."""
+    admin1_names = _load_admin1(admin1)
+    tmp = dst.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(tmp)
+    conn.executescript(
+        """
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE places (
+            id INTEGER PRIMARY KEY, name TEXT NOT NULL, admin1 TEXT NOT NULL, country TEXT NOT NULL,
+            lat REAL NOT NULL, lon REAL NOT NULL, population INTEGER NOT NULL
+        );
+        CREATE TABLE names (
+            key TEXT NOT NULL, population INTEGER NOT NULL, place_id INTEGER NOT NULL,
+            PRIMARY KEY (key, population, place_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE meta (k TEXT PRIMARY KEY, v TEXT NOT NULL);
+        """
+    )
+    places = 0
+    keys = 0
+    with _read_lines(src) as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            # geonameid, name, asciiname, alternatenames, lat, lon, feature class, ..., country (8), admin1 (10), population (14)
+            if len(cols) < 15 or cols[6] != "P":
+                continue
+            population = int(cols[14] or 0)
+            if population < min_population:
+                continue
+            place_id = int(cols[0])
+            country = cols[8]
+            conn.execute(
+                "INSERT INTO places VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (place_id, cols[1], admin1_names.get(f"{country}.{cols[10]}", ""), country, float(cols[4]), float(cols[5]), population),
+            )
+            names = {cols[1], cols[2]} | {n for n in cols[3].split(",") if _LATIN_NAME_RE.match(n)}
+            rows = {(k, population, place_id) for n in names for k in index_keys(n)}
+            conn.executemany("INSERT OR IGNORE INTO names VALUES (?, ?, ?)", rows)
+            places += 1
+            keys += len(rows)
+    conn.executemany(
+        "INSERT INTO meta VALUES (?, ?)",
+        [("source", src.name), ("imported_at", time.strftime("%Y-%m-%d %H:%M:%S")), ("places", str(places)), ("keys", str(keys))],
+    )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp, dst)
+    return places
+
+
+gazetteer = Gazetteer(settings.GAZETTEER_PATH)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import a GeoNames dump into the offline gazetteer.")
+    parser.add_argument("source", type=Path, help="GeoNames dump, e.g. cities15000.zip or DE.txt")
+    parser.add_argument("--admin1", type=Path, default=None, help="admin1CodesASCII.txt (state names)")
+    parser.add_argument("--min-population", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=settings.GAZETTEER_PATH)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    n = build(args.source, args.out, admin1=args.admin1, min_population=args.min_population)
+    size_mb = args.out.stat().st_size / 1e6
+    print(f"{n} places -> {args.out} ({size_mb:.1f} MB) in {time.perf_counter() - t0:.1f}s")
+
+    g = Gazetteer(args.out)
+    for probe in ("München", "Muenchen", "Berlin", "Köln"):
+        t1 = time.perf_counter()
+        place = g.lookup(probe)
+        print(f"  {probe!r}: {place.display if place else '-'} ({(time.perf_counter() - t1) * 1e6:.0f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from backend.core.config import settings
+from backend.services import metrics
+
+# Recent packing candidates per conversation, so a new turn does not have to
+# reload the history it just packed. An entry is only valid for the
+# Conversation.updated_at it was stored with: every message write bumps that
+# timestamp, so writes that bypass the cache simply turn it into a miss.
+
+
+@dataclass
+class CachedMessage:
+    # Satisfies context_packer.HistoryMessage (the Message fields pack_history() uses).
+    id: int
+    role: str
+    content: str
+    token_count: int | None = None
+
+
+@dataclass
+class _Entry:
+    stamp: datetime
+    messages: list[CachedMessage]
+
+
+class HistoryCache:
+    def __init__(self, max_conversations: int = 256) -> None:
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._max = max_conversations
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: int, stamp: datetime, summary_upto_id: int | None) -> list[CachedMessage] | None:
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or entry.stamp != stamp:
+                metrics.incr("history_cache.misses")
+                return None
+            self._entries.move_to_end(conversation_id)
+            metrics.incr("history_cache.hits")
+            upto = summary_upto_id or 0
+            return [m for m in entry.messages if m.id > upto]
+
+    def put(self, conversation_id: int, stamp: datetime, messages: list[CachedMessage]) -> None:
+        with self._lock:
+            self._entries[conversation_id] = _Entry(stamp, messages[-settings.LLM_PACK_MAX_MESSAGES :])
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self._max:
+                self._entries.popitem(last=False)
+
+    def append(self, conversation_id: int, prev_stamp: datetime, stamp: datetime, message: CachedMessage) -> None:
+        """Adds a message written at `stamp` if the entry was current up to `prev_stamp`."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            if entry.stamp != prev_stamp:
+                del self._entries[conversation_id]
+                return
+            entry.messages = (entry.messages + [message])[-settings.LLM_PACK_MAX_MESSAGES :]
+            entry.stamp = stamp
+
+
+history_cache = HistoryCache()
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+from backend.services.gazetteer import gazetteer
+
+LOG = get_logger(__name__)
+
+# Local intent classifier in front of the LLM planner.
+# Obvious turns ("Hallo", "Wie wird das Wetter in Köln?", "Wie spät ist es?")
+# are decided in microseconds by rules, the rest by a small char-n-gram naive
+# Bayes model trained on logged LLM planner decisions. Anything unsure goes
+# to the LLM planner as before.
+#
+# Labels: "respond" or "tool:<name>". Only labels whose args can be built
+# locally are decided here; web_search queries are left to the LLM.
+
+UNSURE = "unsure"
+
+_LOCAL_LABELS = ("respond", "tool:get_datetime", "tool:get_weather", "tool:recipe_search")
+
+# "und morgen?", "und dort?": depends on the previous turn, so never decided locally.
+_FOLLOW_UP_RE = re.compile(r"^\s*(und|aber|oder|what about|and)\b", re.IGNORECASE)
+
+# One smalltalk phrase, optionally followed by a name ("Hallo Anna").
+_GREETING_RE = re.compile(
+    r"\s*(hallo|hi|hey|moin|servus|huhu|guten\s+(morgen|tag|abend)|gute\s+nacht|"
+    r"danke(\s+schön|schön|\s+dir)?|vielen\s+dank|merci|tschüss|ciao|bye|bis\s+später|"
+    r"wie\s+geht('?s|\s+es\s+dir)|wer\s+bist\s+du|was\s+kannst\s+du|ok(ay)?|super|cool|alles\s+klar)"
+    r"(\s+\w+)?\s*:?\)?\s*",
+    re.IGNORECASE,
+)
+_SENTENCE_SPLIT_RE = re.compile(r"[!.?,;]+")
+_DATETIME_RE = re.compile(
+    r"\b(wie\s+spät|uhrzeit|welche\s+zeit\s+ist|welcher\s+tag\s+ist\s+heute|welches\s+datum|"
+    r"der\s+wievielte|welcher\s+wochentag|what\s+time\s+is\s+it)\b",
+    re.IGNORECASE,
+)
+_WEATHER_RE = re.compile(
+    r"\b(wetter|regnet|regen|schneit|schnee|gewitter|temperatur|wie\s+warm|wie\s+kalt|"
+    r"sonnig|bewölkt|wind|grad\s+(draußen|heute|morgen)|weather)\b",
+    re.IGNORECASE,
+)
+_LOCATION_RE = re.compile(
+    r"\b(?:in|für|fuer|bei|um|an\s+der|am)\s+((?:[A-ZÄÖÜ][\wäöüß.\-]+)(?:\s+(?:am|an\s+der|im|[A-ZÄÖÜ][\wäöüß.\-]+))*)"
+)
+_NOT_A_PLACE = {
+    "Grad", "Celsius", "Wetter", "Regen", "Zukunft", "Moment", "Ordnung", "Wochenende", "Morgen", "Vormittag",
+    "Mittag", "Nachmittag", "Abend", "Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag",
+}
+_RECIPE_RE = re.compile(r"\brezept(e)?\s+(für|mit|zu)\s+(?P<q>.+?)[\s?!.]*$", re.IGNORECASE)
+# Several questions or places in one turn ("Wetter in Berlin und München und welche
+# Ferien sind gerade?") -> multi-tool plan, left to the LLM. A capitalised word
+# after "und" alone is no second place ("heute und Morgen", "Regen und Wind"),
+# see _multi_ask.
+_MULTI_ASK_RE = re.compile(r"\b(und|sowie)\s+(wie|was|wer|wann|wo|welche[rsmn]?)\b|\?.*\w.*\?")
+_AND_WORD_RE = re.compile(r"\b(?:und|sowie)\s+(?:(in|für)\s+)?([A-ZÄÖÜ][\wäöüß.\-]+)")
+_PLACE_AT_END_RE = re.compile(_LOCATION_RE.pattern + r"[\s,]*$")
+# Needs the web (news, events, facts) -> the LLM writes the search query.
+_SEARCH_HINT_RE = re.compile(r"\b(news|nachrichten|ferien|feiertag|wer\s+hat|aktuell|heute\s+im|suche|google)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class IntentGuess:
+    label: str  # "respond", "tool:<name>" or UNSURE
+    confidence: float
+    args: dict = field(default_factory=dict)
+    source: str = "rule"  # "rule" | "model" | "none"
+
+    @property
+    def tool(self) -> str | None:
+        return self.label[5:] if self.label.startswith("tool:") else None
+
+
+def normalize(text: str) -> str:
+    """Lowercase, folded diacritics, collapsed whitespace (model features only)."""
+    folded = unicodedata.normalize("NFKD", text.lower().replace("ß", "ss"))
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return " ".join(folded.split())
+
+
+def _location(text: str) -> str | None:
+    for m in _LOCATION_RE.finditer(text):
+        place = m.group(1).strip(" .-")
+        if place and place.split()[0] not in _NOT_A_PLACE:
+            return place
+    return None
+
+
+def _multi_ask(text: str) -> bool:
+    if _MULTI_ASK_RE.search(text):
+        return True
+    for m in _AND_WORD_RE.finditer(text):
+        word = m.group(2).strip(" .-")
+        if word in _NOT_A_PLACE:
+            continue
+        # "und in Köln", "Berlin und München" (a place right before "und") or a gazetteer name.
+        before = _PLACE_AT_END_RE.search(text[: m.start()])
+        if m.group(1) or (before and before.group(1).split()[0] not in _NOT_A_PLACE) or gazetteer.lookup(word):
+            return True
+    return False
+
+
+def _args_for(label: str, text: str) -> dict | None:
+    """Args the local path can build for a label; None = leave it to the LLM."""
+    if label in ("respond", "tool:get_datetime"):
+        return {}
+    if label == "tool:get_weather":
+        place = _location(text)
+        return {"location": place} if place else {}
+    if label == "tool:recipe_search":
+        m = _RECIPE_RE.search(text)
+        return {"query": f"{m.group('q').strip()} Rezept"} if m else None
+    return None
+
+
+def _is_smalltalk(text: str) -> bool:
+    parts = [p for p in _SENTENCE_SPLIT_RE.split(text) if p.strip()]
+    return bool(parts) and all(_GREETING_RE.fullmatch(p) for p in parts)
+
+
+def rule_guess(text: str) -> IntentGuess | None:
+    t = text.strip()
+    if not t or _FOLLOW_UP_RE.match(t):
+        return None
+    if len(t) <= 80 and _is_smalltalk(t):
+        return IntentGuess("respond", 0.99)
+    if _SEARCH_HINT_RE.search(t) or _multi_ask(t):
+        return None
+    if _DATETIME_RE.search(t) and not _WEATHER_RE.search(t):
+        return IntentGuess("tool:get_datetime", 0.97)
+    if _WEATHER_RE.search(t):
+        return IntentGuess("tool:get_weather", 0.95, _args_for("tool:get_weather", t) or {})
+    m = _RECIPE_RE.search(t)
+    if m:
+        return IntentGuess("tool:recipe_search", 0.93, {"query": f"{m.group('q').strip()} Rezept"})
+    return None
+
+
+class CharNgramNB:
+    """Multinomial naive Bayes over character n-grams (pure Python, sparse)."""
+
+    def __init__(self, n_min: int = 2, n_max: int = 4, alpha: float = 0.5) -> None:
+        self.n_min = n_min
+        self.n_max = n_max
+        self.alpha = alpha
+        self.labels: list[str] = []
+        self._log_prior: dict[str, float] = {}
+        self._counts: dict[str, Counter] = {}
+        self._totals: dict[str, int] = {}
+        self._vocab_size = 0
+
+    def features(self, text: str) -> Counter:
+        t = f" {normalize(text)} "
+        grams: Counter = Counter()
+        for n in range(self.n_min, self.n_max + 1):
+            for i in range(len(t) - n + 1):
+                grams[t[i : i + n]] += 1
+        return grams
+
+    def fit(self, texts: list[str], labels: list[str]) -> CharNgramNB:
+        per_label: dict[str, Counter] = {}
+        docs = Counter(labels)
+        vocab: set[str] = set()
+        for text, label in zip(texts, labels):
+            f = self.features(text)
+            per_label.setdefault(label, Counter()).update(f)
+            vocab.update(f)
+        self.labels = sorted(per_label)
+        self._counts = per_label
+        self._totals = {label: sum(c.values()) for label, c in per_label.items()}
+        self._vocab_size = len(vocab)
+        n = len(labels)
+        self._log_prior = {label: math.log(docs[label] / n) for label in self.labels}
+        return self
+
+    def predict_proba(self, text: str) -> dict[str, float]:
+        if not self.labels:
+            return {}
+        f = self.features(text)
+        scores: dict[str, float] = {}
+        for label in self.labels:
+            counts = self._counts[label]
+            denom = math.log(self._totals[label] + self.alpha * self._vocab_size)
+            s = self._log_prior[label]
+            for gram, k in f.items():
+                s += k * (math.log(counts.get(gram, 0) + self.alpha) - denom)
+            scores[label] = s
+        top = max(scores.values())
+        exp = {label: math.exp(s - top) for label, s in scores.items()}
+        z = sum(exp.values())
+        return {label: v / z for label, v in exp.items()}
+
+
+class IntentClassifier:
+    def __init__(self) -> None:
+        self.model: CharNgramNB | None = None
+        self.trained_on = 0
+        self._lock = threading.Lock()
+        # Shadow comparisons: (llm label, local label) -> count
+        self.confusion: Counter = Counter()
+
+    @property
+    def log_path(self) -> Path:
+        return Path(settings.LOG_DIR) / "planner_decisions.jsonl"
+
+    def classify(self, text: str) -> IntentGuess:
+        guess = rule_guess(text)
+        if guess is not None:
+            return guess
+        model = self.model
+        if model is None or _FOLLOW_UP_RE.match(text) or _SEARCH_HINT_RE.search(text) or _multi_ask(text):
+            return IntentGuess(UNSURE, 0.0, source="none")
+        proba = model.predict_proba(text)
+        label, p = max(proba.items(), key=lambda kv: kv[1])
+        args = _args_for(label, text) if label in _LOCAL_LABELS else None
+        if args is None:
+            return IntentGuess(UNSURE, p, source="model")
+        return IntentGuess(label, p, args, source="model")
+
+    def train(self, min_examples: int = 50) -> int:
+        """(Re)trains the model from the decision log. Returns the number of examples."""
+        texts, labels = load_examples(self.log_path)
+        if len(texts) < min_examples:
+            LOG.info("Intent model not trained: %s logged decisions (need %s)", len(texts), min_examples)
+            return len(texts)
+        model = CharNgramNB().fit(texts, labels)
+        with self._lock:
+            self.model = model
+            self.trained_on = len(texts)
+        LOG.info("Intent model trained on %s decisions labels=%s", len(texts), model.labels)
+        return len(texts)
+
+    async def record(self, text: str, llm_label: str, guess: IntentGuess) -> None:
+        """Counts an LLM planner decision against the local guess; with LLM_INTENT_LOG
+        it is also appended to the decision log (training data), in a thread."""
+        local = guess.label if guess.confidence >= settings.LLM_LOCAL_INTENT_THRESHOLD else UNSURE
+        with self._lock:
+            self.confusion[(llm_label, local)] += 1
+            total = sum(self.confusion.values())
+        metrics.incr(f"intent.shadow.{'agree' if local == llm_label else 'unsure' if local == UNSURE else 'disagree'}")
+        if local not in (UNSURE, llm_label):
+            LOG.info("Intent disagreement llm=%s local=%s (%s %.2f) text=%r", llm_label, local, guess.source, guess.confidence, text[:120])
+        if total % 50 == 0:
+            LOG.info("Intent confusion matrix (rows=LLM, cols=local) after %s turns:\n%s", total, self.confusion_table())
+        if not settings.LLM_INTENT_LOG:
+            return
+        line = json.dumps(
+            {"text": text, "label": llm_label, "local": guess.label, "confidence": round(guess.confidence, 3), "source": guess.source},
+            ensure_ascii=False,
+        )
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str) -> None:
+        path = self.log_path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                if path.exists() and path.stat().st_size + len(line) > settings.LLM_INTENT_LOG_MAX_BYTES:
+                    os.replace(path, _rotated(path))
+                with path.open("a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            LOG.warning("Could not write planner decision log: %s", e)
+
+    def confusion_table(self) -> str:
+        with self._lock:
+            return format_confusion(self.confusion)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "mode": settings.LLM_LOCAL_INTENT,
+                "trained_on": self.trained_on,
+                "labels": self.model.labels if self.model else [],
+                "confusion": {f"{a}->{b}": n for (a, b), n in sorted(self.confusion.items())},
+            }
+
+
+def _rotated(path: Path) -> Path:
+    return path.with_name(path.name + ".1")
+
+
+def load_examples(path: Path) -> tuple[list[str], list[str]]:
+    """Examples from the decision log and its rotated predecessor (oldest first)."""
+    texts: list[str] = []
+    labels: list[str] = []
+    for p in (_rotated(path), path):
+        if not p.exists():
+            continue
+        with p.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if row.get("text") and row.get("label"):
+                    texts.append(row["text"])
+                    labels.append(row["label"])
+    return texts, labels
+
+
+def format_confusion(confusion: Counter) -> str:
+    rows = sorted({a for a, _ in confusion})
+    cols = sorted({b for _, b in confusion} | set(rows))
+    width = max([len(c) for c in cols + rows] + [5])
+    lines = [" " * width + " | " + " ".join(c.rjust(width) for c in cols)]
+    for r in rows:
+        lines.append(r.rjust(width) + " | " + " ".join(str(confusion.get((r, c), 0)).rjust(width) for c in cols))
+    return "\n".join(lines)
+
+
+classifier = IntentClassifier()
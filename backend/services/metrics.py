@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+# Process-local counters for the admin metrics endpoint.
+# Deliberately tiny: a home setup runs one uvicorn worker, so there is no
+# need for Prometheus & co. Values reset on restart.
+
+_LOCK = threading.Lock()
+_COUNTERS: dict[str, float] = {}
+_OBSERVATIONS: dict[str, dict[str, float]] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def observe(name: str, value: float) -> None:
+    """Record a sample (e.g. a duration in ms). Keeps count/sum/max/last."""
+    with _LOCK:
+        o = _OBSERVATIONS.get(name)
+        if o is None:
+            o = {"count": 0, "sum": 0.0, "max": value, "last": value}
+            _OBSERVATIONS[name] = o
+        o["count"] += 1
+        o["sum"] += value
+        o["max"] = max(o["max"], value)
+        o["last"] = value
+
+
+def get(name: str) -> float:
+    with _LOCK:
+        return _COUNTERS.get(name, 0)
+
+
+def average(name: str) -> float | None:
+    """Mean of an observation, None if nothing was recorded yet."""
+    with _LOCK:
+        o = _OBSERVATIONS.get(name)
+        return (o["sum"] / o["count"]) if o and o["count"] else None
+
+
+def snapshot() -> dict[str, Any]:
+    with _LOCK:
+        observations = {
+            k: {**v, "avg": (v["sum"] / v["count"]) if v["count"] else 0.0}
+            for k, v in _OBSERVATIONS.items()
+        }
+        return {
+            "counters": dict(sorted(_COUNTERS.items())),
+            "observations": dict(sorted(observations.items())),
+        }
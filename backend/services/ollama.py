@@ -1,37 +1,41 @@
+import asyncio
 import requests
 import json as _json
-from typing import Generator
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Generator
 
 from backend.core.config import settings
 from backend.core.logging_setup import get_logger
+from backend.services import metrics
+from backend.services.ollama_backends import RETRYABLE_ERRORS, RETRYABLE_STATUS, Backend, pool
+from backend.services.ollama_runtime import runtime
 
 LOG = get_logger(__name__)
 
 
+class _BackendBusy(RuntimeError):
+    pass
+
+
 def chat_completion(messages: list[dict], *, temperature: float | None = None, max_tokens: int | None = None) -> str:
     """Gets a single (non-streaming) completion from Ollama /api/chat.
 
     Used for the Stage 1.5 planner phase, where we need strict JSON.
     """
-    url = f"{settings.OLLAMA_URL.rstrip('/')}/api/chat"
+    url = f"{pool.pick(settings.OLLAMA_MODEL).url}/api/chat"
+    # num_ctx/keep_alive come from the runtime manager: a different num_ctx
+    # than the streaming call would force Ollama to reload the model.
     payload = {
-        "model": settings.OLLAMA_MODEL,
         "messages": messages,
         "stream": False,
-        "options": {
-            "num_ctx": 8192,  # <--- WICHTIG: Erweitert das Gedächtnis für den Planer
-        }
+        **runtime.request_fields(temperature=temperature, num_predict=max_tokens),
     }
-    
-    if temperature is not None:
-        payload["options"]["temperature"] = temperature
-    if max_tokens is not None:
-        payload["options"]["num_predict"] = max_tokens
 
     try:
         r = requests.post(url, json=payload, timeout=60)
         r.raise_for_status()
         data = r.json()
+        runtime.record_timings(data, phase="planner")
         msg = (data or {}).get("message") or {}
         content = msg.get("content")
         if not isinstance(content, str):
@@ -43,20 +47,14 @@ def chat_completion(messages: list[dict], *, temperature: float | None = None, m
 
 
 def stream_chat_completion(messages: list[dict]) -> Generator[str, None, None]:
-    url = f"{settings.OLLAMA_URL.rstrip('/')}/api/chat"
-    
-    # HIER IST DIE WICHTIGSTE ÄNDERUNG:
+    url = f"{pool.pick(settings.OLLAMA_MODEL).url}/api/chat"
     payload = {
-        "model": settings.OLLAMA_MODEL,
         "messages": messages,
         "stream": True,
-        "options": {
-            "num_ctx": 4096,  # <--- WICHTIG: Erweitert das Gedächtnis für die Antwort
-            "temperature": 0.7
-        }
+        **runtime.request_fields(temperature=0.7),
     }
 
-    LOG.info("Calling Ollama model=%s msgs=%s ctx=4096", settings.OLLAMA_MODEL, len(messages))
+    LOG.info("Calling Ollama model=%s msgs=%s ctx=%s", settings.OLLAMA_MODEL, len(messages), runtime.num_ctx())
 
     with requests.post(url, json=payload, stream=True, timeout=300) as r:
         r.raise_for_status()
@@ -68,10 +66,214 @@ def stream_chat_completion(messages: list[dict]) -> Generator[str, None, None]:
                 # Ollama returns JSON per line
                 j = _json.loads(data)
                 if j.get("done") is True:
+                    runtime.record_timings(j, phase="stream")
                     break
                 msg = j.get("message") or {}
                 content = msg.get("content")
                 if content:
                     yield content
             except Exception:
-                continue
\ No newline at end of file
+                continue
+
+
+async def close_async_client() -> None:
+    await pool.aclose()
+
+
+async def _post_json(path: str, payload: dict, *, model: str) -> dict:
+    """POST to the best backend; retries on another one if it is unreachable."""
+    tried: tuple[Backend, ...] = ()
+    while True:
+        async with pool.lease(model, exclude=tried) as backend:
+            try:
+                r = await backend.client.post(path, json=payload)
+                if r.status_code in RETRYABLE_STATUS:
+                    raise _BackendBusy(f"HTTP {r.status_code}")
+            except (*RETRYABLE_ERRORS, _BackendBusy) as e:
+                pool.mark_failed(backend, e)
+                tried += (backend,)
+                if len(tried) >= len(pool.backends):
+                    raise
+                metrics.incr("ollama.failovers")
+                continue
+            r.raise_for_status()
+            backend.loaded_models.add(model)
+            return r.json() or {}
+
+
+async def achat_completion(
+    messages: list[dict],
+    *,
+    temperature: float | None = None,
+    max_tokens: int | None = None,
+    format: dict | str | None = None,
+) -> str:
+    """Async variant of chat_completion (same payload, same error handling).
+
+    `format` is passed through to Ollama ("json" or a JSON schema) so the
+    model is constrained to valid output.
+    """
+    payload = {
+        "messages": messages,
+        "stream": False,
+        **runtime.request_fields(temperature=temperature, num_predict=max_tokens),
+    }
+    if format is not None:
+        payload["format"] = format
+
+    try:
+        data = await _post_json("/api/chat", payload, model=payload["model"])
+        runtime.record_timings(data, phase="planner")
+        msg = (data or {}).get("message") or {}
+        content = msg.get("content")
+        if not isinstance(content, str):
+            return ""
+        return content
+    except Exception as e:
+        LOG.error(f"Ollama achat_completion failed: {e}")
+        return ""
+
+
+async def _astream_chunks(payload: dict) -> AsyncGenerator[dict, None]:
+    """Yields the parsed NDJSON chunks of a streaming /api/chat call.
+
+    If the chosen backend dies before the first chunk (e.g. while the
+    request sits in its internal queue) the call moves to another backend.
+    After output has started there is no transparent retry.
+    """
+    model = payload["model"]
+    tried: tuple[Backend, ...] = ()
+    while True:
+        async with pool.lease(model, exclude=tried) as backend:
+            started = False
+            try:
+                async with backend.client.stream("POST", "/api/chat", json=payload) as r:
+                    if r.status_code in RETRYABLE_STATUS:
+                        raise _BackendBusy(f"HTTP {r.status_code}")
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if not line:
+                            continue
+                        try:
+                            j = _json.loads(line)
+                        except Exception:
+                            continue
+                        started = True
+                        yield j
+                        if j.get("done") is True:
+                            break
+                backend.loaded_models.add(model)
+                return
+            except (*RETRYABLE_ERRORS, _BackendBusy) as e:
+                if started:
+                    raise
+                pool.mark_failed(backend, e)
+                tried += (backend,)
+                if len(tried) >= len(pool.backends):
+                    raise
+                metrics.incr("ollama.failovers")
+                LOG.warning("Ollama stream failover from=%s error=%s", backend.url, e)
+
+
+async def astream_chat_completion(messages: list[dict]) -> AsyncGenerator[str, None]:
+    """Async variant of stream_chat_completion.
+
+    Closing the generator (client disconnect / cancellation) closes the
+    upstream response, so Ollama stops generating for us.
+    """
+    payload = {
+        "messages": messages,
+        "stream": True,
+        **runtime.request_fields(temperature=0.7),
+    }
+
+    LOG.info("Calling Ollama (async) model=%s msgs=%s ctx=%s", settings.OLLAMA_MODEL, len(messages), runtime.num_ctx())
+
+    async with aclosing(_astream_chunks(payload)) as chunks:
+        async for j in chunks:
+            if j.get("done") is True:
+                runtime.record_timings(j, phase="stream")
+                break
+            msg = j.get("message") or {}
+            content = msg.get("content")
+            if content:
+                yield content
+
+
+async def astream_chat_with_tools(messages: list[dict], tools: list[dict]) -> AsyncGenerator[tuple[str, Any], None]:
+    """Streams one /api/chat turn with native tool calling.
+
+    Yields ("token", str) for text and ("tool_calls", list[dict]) when the
+    model decides to call tools instead (Ollama sends them in one chunk).
+    """
+    payload = {
+        "messages": messages,
+        "tools": tools,
+        "stream": True,
+        **runtime.request_fields(temperature=0.7),
+    }
+
+    LOG.info("Calling Ollama (native tools) model=%s msgs=%s tools=%s", settings.OLLAMA_MODEL, len(messages), len(tools))
+
+    async with aclosing(_astream_chunks(payload)) as chunks:
+        async for j in chunks:
+            msg = j.get("message") or {}
+            tool_calls = msg.get("tool_calls")
+            if tool_calls:
+                yield "tool_calls", tool_calls
+            content = msg.get("content")
+            if content:
+                yield "token", content
+            if j.get("done") is True:
+                runtime.record_timings(j, phase="stream")
+                break
+
+
+async def negotiate_context(model: str | None = None) -> int:
+    """Caps the configured num_ctx at the model's trained context length (/api/show)."""
+    model = model or settings.OLLAMA_MODEL
+    context_length = None
+    try:
+        data = await _post_json("/api/show", {"model": model}, model=model)
+        info = data.get("model_info") or {}
+        for key, value in info.items():
+            if key.endswith(".context_length") and isinstance(value, int):
+                context_length = value
+                break
+    except Exception as e:
+        LOG.warning("Ollama /api/show failed model=%s: %s", model, e)
+    return runtime.set_model_context_length(model, context_length)
+
+
+async def warm_up(model: str | None = None) -> None:
+    """Loads the model on every healthy backend (empty chat = preload only)."""
+    payload = {
+        "messages": [],
+        "stream": False,
+        **runtime.request_fields(model),
+    }
+    for backend in [b for b in pool.backends if b.healthy]:
+        try:
+            r = await backend.client.post("/api/chat", json=payload)
+            r.raise_for_status()
+            backend.loaded_models.add(payload["model"])
+            runtime.record_timings(r.json() or {}, phase="warmup", model=payload["model"])
+        except Exception as e:
+            LOG.warning("Ollama warm-up failed url=%s model=%s: %s", backend.url, payload["model"], e)
+
+
+async def keep_warm_loop() -> None:
+    """Negotiates num_ctx, preloads the model and pings it periodically.
+
+    The ping re-sends keep_alive, so the runner is not evicted during quiet
+    hours and the next user does not pay the load time.
+    """
+    await pool.probe_all()
+    await negotiate_context()
+    await warm_up()
+    interval = settings.OLLAMA_KEEP_WARM_INTERVAL_SECONDS
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        await warm_up()
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import httpx
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+from backend.services.scheduler import scheduler
+
+LOG = get_logger(__name__)
+
+# Errors after which a request may be retried on another backend: it never got
+# an answer from a working Ollama (refused/reset, died while queued, overloaded
+# or restarting). Callers only retry if no output was produced yet.
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadError, httpx.RemoteProtocolError, httpx.PoolTimeout)
+RETRYABLE_STATUS = (502, 503, 504)
+
+
+class BackendUnavailable(RuntimeError):
+    pass
+
+
+class Backend:
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.healthy = True  # optimistic until the first probe says otherwise
+        self.outstanding = 0
+        self.loaded_models: set[str] = set()
+        self.last_error: str | None = None
+        self.last_probe: float | None = None
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled keep-alive client for this backend (created lazily)."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.url,
+                timeout=httpx.Timeout(
+                    connect=5.0,
+                    read=settings.OLLAMA_READ_TIMEOUT_SECONDS,
+                    write=10.0,
+                    pool=settings.OLLAMA_POOL_TIMEOUT_SECONDS,
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    keepalive_expiry=60.0,
+                ),
+            )
+        return self._client
+
+    def has_model(self, model: str) -> bool:
+        return model in self.loaded_models or f"{model}:latest" in self.loaded_models
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def status(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "loaded_models": sorted(self.loaded_models),
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    """Routes Ollama requests across several backends.
+
+    Routing: healthy backends only, prefer one with a free slot (fewer than
+    OLLAMA_MAX_INFLIGHT leases), then one that already has the model loaded
+    (no load time), then least outstanding requests. When every candidate is
+    full, lease() waits for a slot: the cap holds per backend, not just in
+    sum. A backend that fails a request is marked unhealthy until the next
+    successful probe, and the request is retried elsewhere if it never
+    produced output.
+    """
+
+    def __init__(self, urls: list[str]) -> None:
+        if not urls:
+            raise ValueError("at least one Ollama backend URL is required")
+        self.backends = [Backend(u) for u in urls]
+        self._freed = asyncio.Event()
+
+    def pick(self, model: str, exclude: tuple[Backend, ...] = ()) -> Backend:
+        candidates = [b for b in self.backends if b.healthy and b not in exclude]
+        if not candidates:
+            # Nothing known-healthy: try the ones we have not tried yet anyway.
+            candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            raise BackendUnavailable("No Ollama backend available")
+        return min(candidates, key=lambda b: (self._full(b), not b.has_model(model), b.outstanding, self.backends.index(b)))
+
+    @staticmethod
+    def _full(backend: Backend) -> bool:
+        return backend.outstanding >= max(1, settings.OLLAMA_MAX_INFLIGHT)
+
+    @asynccontextmanager
+    async def lease(self, model: str, exclude: tuple[Backend, ...] = ()) -> AsyncIterator[Backend]:
+        backend = self.pick(model, exclude)
+        if self._full(backend):
+            metrics.incr("ollama.lease_waits")
+            t0 = time.perf_counter()
+            while self._full(backend):
+                await self._freed.wait()
+                backend = self.pick(model, exclude)
+            metrics.observe("ollama.lease_wait_ms", round((time.perf_counter() - t0) * 1000, 1))
+        backend.outstanding += 1
+        try:
+            yield backend
+        finally:
+            backend.outstanding -= 1
+            self._freed.set()
+            self._freed = asyncio.Event()
+
+    def mark_failed(self, backend: Backend, error: Exception | str) -> None:
+        if backend.healthy:
+            LOG.warning("Ollama backend marked unhealthy url=%s error=%s", backend.url, error)
+        backend.healthy = False
+        backend.last_error = str(error) or type(error).__name__
+        metrics.incr("ollama.backend_failures")
+        self._update_capacity()
+
+    async def probe(self, backend: Backend) -> bool:
+        """Health check via /api/tags, loaded models via /api/ps."""
+        try:
+            r = await backend.client.get("/api/tags", timeout=5.0)
+            r.raise_for_status()
+            loaded: set[str] = set()
+            try:
+                ps = await backend.client.get("/api/ps", timeout=5.0)
+                ps.raise_for_status()
+                for m in (ps.json() or {}).get("models") or []:
+                    name = m.get("name") or m.get("model")
+                    if name:
+                        loaded.add(name)
+            except Exception:
+                pass  # older Ollama without /api/ps: still healthy, no affinity info
+            if not backend.healthy:
+                LOG.info("Ollama backend healthy again url=%s", backend.url)
+            backend.healthy = True
+            backend.loaded_models = loaded
+            backend.last_error = None
+        except Exception as e:
+            if backend.healthy:
+                LOG.warning("Ollama backend probe failed url=%s error=%s", backend.url, e)
+            backend.healthy = False
+            backend.last_error = str(e) or type(e).__name__
+        backend.last_probe = time.time()
+        return backend.healthy
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self.probe(b) for b in self.backends))
+        self._update_capacity()
+
+    async def health_loop(self) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(settings.OLLAMA_HEALTH_INTERVAL_SECONDS)
+
+    def _update_capacity(self) -> None:
+        healthy = sum(1 for b in self.backends if b.healthy)
+        scheduler.set_capacity(settings.OLLAMA_MAX_INFLIGHT * max(1, healthy))
+
+    async def aclose(self) -> None:
+        for b in self.backends:
+            await b.aclose()
+
+    def status(self) -> list[dict]:
+        return [b.status() for b in self.backends]
+
+
+pool = BackendPool(settings.ollama_backend_urls)
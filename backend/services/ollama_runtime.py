@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+
+LOG = get_logger(__name__)
+
+# A load this slow means Ollama (re)loaded the runner, e.g. because num_ctx
+# changed between calls or keep_alive expired.
+_RELOAD_THRESHOLD_MS = 500.0
+
+
+class OllamaRuntime:
+    """Single source of truth for per-model Ollama options.
+
+    Ollama reloads the model runner whenever `num_ctx` differs from the
+    loaded one, so every call (planner, stream, warm-up) must send the
+    same value. The value is negotiated once per model (configured size,
+    capped by the model's trained context length from /api/show).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._num_ctx: dict[str, int] = {}
+        self._last_timings: dict[str, dict[str, Any]] = {}
+
+    def num_ctx(self, model: str | None = None) -> int:
+        model = model or settings.OLLAMA_MODEL
+        with self._lock:
+            return self._num_ctx.get(model, settings.OLLAMA_NUM_CTX)
+
+    def set_model_context_length(self, model: str, context_length: int | None) -> int:
+        num_ctx = settings.OLLAMA_NUM_CTX
+        if context_length:
+            num_ctx = min(num_ctx, int(context_length))
+        with self._lock:
+            self._num_ctx[model] = num_ctx
+        LOG.info("Ollama num_ctx negotiated model=%s model_max=%s num_ctx=%s", model, context_length, num_ctx)
+        return num_ctx
+
+    def request_fields(self, model: str | None = None, **options: Any) -> dict[str, Any]:
+        """Returns the model/keep_alive/options part of an /api/chat payload."""
+        model = model or settings.OLLAMA_MODEL
+        opts: dict[str, Any] = {"num_ctx": self.num_ctx(model)}
+        opts.update({k: v for k, v in options.items() if v is not None})
+        return {
+            "model": model,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "options": opts,
+        }
+
+    def record_timings(self, data: dict, *, phase: str, model: str | None = None) -> None:
+        """Logs + records the timing fields of a final (done) Ollama response."""
+        if not isinstance(data, dict) or ("total_duration" not in data and "load_duration" not in data):
+            return
+        model = model or data.get("model") or settings.OLLAMA_MODEL
+
+        def ms(key: str) -> float | None:
+            v = data.get(key)
+            return round(v / 1e6, 1) if isinstance(v, (int, float)) else None
+
+        timings = {
+            "phase": phase,
+            "load_ms": ms("load_duration"),
+            "prompt_eval_count": data.get("prompt_eval_count"),
+            "prompt_eval_ms": ms("prompt_eval_duration"),
+            "eval_count": data.get("eval_count"),
+            "eval_ms": ms("eval_duration"),
+            "total_ms": ms("total_duration"),
+        }
+        with self._lock:
+            self._last_timings[model] = timings
+
+        for key in ("load_ms", "prompt_eval_ms", "eval_ms", "total_ms"):
+            if timings[key] is not None:
+                metrics.observe(f"ollama.{phase}.{key}", timings[key])
+        for key in ("prompt_eval_count", "eval_count"):
+            if isinstance(timings[key], int):
+                metrics.observe(f"ollama.{phase}.{key}", timings[key])
+
+        load_ms = timings["load_ms"] or 0.0
+        if load_ms >= _RELOAD_THRESHOLD_MS:
+            metrics.incr("ollama.reloads")
+            LOG.warning("Ollama model load phase=%s model=%s load_ms=%s num_ctx=%s", phase, model, load_ms, self.num_ctx(model))
+        LOG.info(
+            "Ollama timings phase=%s model=%s load_ms=%s prompt_eval_count=%s prompt_eval_ms=%s eval_count=%s eval_ms=%s",
+            phase,
+            model,
+            timings["load_ms"],
+            timings["prompt_eval_count"],
+            timings["prompt_eval_ms"],
+            timings["eval_count"],
+            timings["eval_ms"],
+        )
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+                "num_ctx": dict(self._num_ctx) or {settings.OLLAMA_MODEL: settings.OLLAMA_NUM_CTX},
+                "last_timings": dict(self._last_timings),
+            }
+
+
+runtime = OllamaRuntime()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from backend.core.config import settings
+from backend.services import metrics
+from backend.services.intent import normalize
+
+if TYPE_CHECKING:
+    from backend.services.tool_orchestrator import PlannerDecision
+
+# LRU + TTL cache of planner decisions. Only the DECISION is cached: a hit
+# skips the planner LLM call, the tool itself still runs every time (weather,
+# time and search results stay fresh).
+
+# How long a decision stays valid, per outcome ("respond" or tool name).
+DECISION_TTL_SECONDS: dict[str, float] = {
+    "respond": 3600.0,
+    "get_datetime": 86400.0,
+    "get_weather": 3600.0,  # args depend on the default location (invalidated on change)
+    "web_search": 900.0,  # the query may mention "heute", "aktuell", ...
+    "recipe_search": 86400.0,
+}
+_DEFAULT_TTL = 600.0
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def _norm(text: str) -> str:
+    return " ".join(_PUNCT_RE.sub(" ", normalize(text)).split())
+
+
+def cache_key(llm_messages: list[dict], scope: str) -> str | None:
+    """Scope (user) + normalized last user message + fingerprint of the previous one.
+
+    The cache is process-wide: without the scope one user's args (default
+    location, names) would be replayed for another. Any message can refer to
+    the previous turn ("Wie ist das Wetter dort?"), so the fingerprint is
+    always part of the key.
+    """
+    users = [m.get("content") or "" for m in llm_messages if m.get("role") == "user"]
+    if not users:
+        return None
+    current = _norm(users[-1])
+    if not current:
+        return None
+    previous = _norm(users[-2])[:200] if len(users) > 1 else ""
+    fingerprint = hashlib.blake2b(previous.encode(), digest_size=8).hexdigest()
+    return f"{scope}|{current}|{fingerprint}"
+
+
+class PlannerCache:
+    def __init__(self, max_entries: int) -> None:
+        self._entries: OrderedDict[str, tuple[float, PlannerDecision]] = OrderedDict()
+        self._max = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> PlannerDecision | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                metrics.incr("planner_cache.misses")
+                return None
+            expires_at, decision = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                metrics.incr("planner_cache.expired")
+                metrics.incr("planner_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.incr("planner_cache.hits")
+        return decision
+
+    def put(self, key: str, decision: PlannerDecision) -> None:
+        tools = [tool for tool, _ in decision.calls] or ["respond"]
+        ttl = min(DECISION_TTL_SECONDS.get(tool, _DEFAULT_TTL) for tool in tools)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, decision)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max:
+                self._entries.popitem(last=False)
+
+    def invalidate_tool(self, tool: str) -> int:
+        """Drops all decisions that call a tool (any of their calls; "respond" for direct answers)."""
+        with self._lock:
+            keys = [k for k, (_, d) in self._entries.items() if tool in ({t for t, _ in d.calls} or {"respond"})]
+            for k in keys:
+                del self._entries[k]
+        if keys:
+            metrics.incr("planner_cache.invalidated", len(keys))
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self._max}
+
+
+planner_cache = PlannerCache(settings.PLANNER_CACHE_SIZE)
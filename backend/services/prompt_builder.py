@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from backend.db.models import AdminSettings
+
+# Prompt layout (prefix-stable, so Ollama can reuse its KV cache):
+#
+#   [system: persona + tool rules]   static, byte-identical for every call
+#   [system: rolling summary]        only changes when old turns are folded
+#   [history ...]                    append-only within a conversation
+#   [system: volatile facts]         time, location (changes every minute)
+#   [phase tail ...]                 planner instruction / TOOL_RESULT_JSON
+#
+# Everything that changes between turns or phases lives at the end. Planner,
+# speculative answer and final answer share the whole prefix up to the facts.
+
+PERSONA = "You are a helpful AI assistant."
+
+TOOL_RULES = (
+    "Tools (werden serverseitig ausgeführt, Ergebnisse kommen als TOOL_RESULT_JSON):\n"
+    "1. Aktuelle Nachrichten, Feiertage, Ferien, Events oder Fakten: 'web_search'.\n"
+    "2. Wetter: 'get_weather'. Ohne Ortsangabe gilt der aktuelle Standort. Mehrere Orte: ein Call mit locations.\n"
+    "3. Rezepte: 'recipe_search' oder 'web_search'.\n"
+    "4. Hallo / Smalltalk: kein Tool, direkt antworten.\n"
+    "5. Mehrere unabhängige Teilfragen (z.B. Wetter und Ferien): mehrere Tools, sie laufen parallel.\n"
+    "\n"
+    "Erlaubte Tools (Allowlist):\n"
+    "- get_datetime args:{}\n"
+    "- get_weather args:{location?:string, locations?:string[]}\n"
+    "- web_search args:{query:string, max_results?:int}\n"
+    "- recipe_search args:{query:string}\n"
+)
+
+STATIC_SYSTEM_PROMPT = f"{PERSONA}\n\n{TOOL_RULES}"
+
+
+def volatile_facts(row: AdminSettings, now: datetime | None = None) -> str:
+    now = now or datetime.now()
+    location_name = row.default_location_name or "Unknown Location"
+    return (
+        f"Current time: {now.strftime('%A, %d. %B %Y %H:%M')}. "
+        f"Current location: {location_name}. "
+        "If the user asks for weather without a city, use the current location."
+    )
+
+
+def assemble(history: list[dict], *, facts: str, summary: str | None = None) -> list[dict]:
+    """Builds the base message list: static system prompt, history, facts tail.
+
+    Phase-specific content (planner instruction, tool results) is appended
+    by the caller AFTER this list.
+    """
+    messages = [{"role": "system", "content": STATIC_SYSTEM_PROMPT}]
+    if summary:
+        messages.append({"role": "system", "content": f"Zusammenfassung des bisherigen Gesprächs:\n{summary}"})
+    for m in history:
+        if m.get("role") not in ("user", "assistant", "system"):
+            continue
+        messages.append({"role": m["role"], "content": m["content"]})
+    messages.append({"role": "system", "content": facts})
+    return messages
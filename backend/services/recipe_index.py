@@ -0,0 +1,211 @@
+"""Local recipe index: schema.org `Recipe` records from result pages (JSON-LD)
+in a SQLite FTS5 table, so repeated and similar recipe questions are answered
+without a search round trip, from structured data instead of snippets.
+
+Records are keyed by canonical URL. Name, ingredients and keywords are stored
+folded (see gazetteer.fold), the name also in its German transliteration, and
+query terms are matched as prefixes ("vegetarische" finds "vegetarisch").
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+from backend.services.gazetteer import fold, index_keys
+from backend.services.rerank import canonical_url, tokenize
+
+LOG = get_logger(__name__)
+
+_DURATION_RE = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:[\d.]+S)?)?$", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+# Words that say "recipe" but not which one.
+_QUERY_NOISE = frozenset({"rezept", "rezepte", "recipe", "recipes", "zubereitung", "kochen", "backen", "selber", "selbst", "machen"})
+_MAX_INGREDIENTS = 40
+_MAX_STEPS = 30
+_STEP_CHARS = 220
+
+
+def _text(value) -> str:
+    if isinstance(value, list):
+        value = ", ".join(_text(v) for v in value if v)
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("text") or ""
+    return " ".join(_TAG_RE.sub(" ", str(value or "")).split())
+
+
+def _minutes(value) -> int | None:
+    """ISO 8601 duration ("PT1H30M", "P0DT45M") -> minutes."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = _DURATION_RE.match(str(value or "").strip())
+    if not m or not any(m.groups()):
+        return None
+    days, hours, mins = (int(g or 0) for g in m.groups())
+    return days * 1440 + hours * 60 + mins or None
+
+
+def _steps(value) -> list[str]:
+    # String, list of strings, HowToStep {text} or HowToSection {itemListElement}.
+    if isinstance(value, str):
+        return [s for s in (_text(line) for line in value.splitlines()) if s]
+    if isinstance(value, dict):
+        if "itemListElement" in value:
+            return _steps(value["itemListElement"])
+        return [t] if (t := _text(value.get("text") or value.get("name"))) else []
+    if isinstance(value, list):
+        return [s for v in value for s in _steps(v)]
+    return []
+
+
+def _servings(value) -> str:
+    if isinstance(value, list):
+        value = next((v for v in value if v), "")
+    return _text(value)
+
+
+def _types(node: dict) -> set[str]:
+    t = node.get("@type")
+    return {str(x) for x in t} if isinstance(t, list) else {str(t)}
+
+
+def _recipe_nodes(item):
+    """Recipe objects anywhere in a JSON-LD document (lists, @graph, mainEntity)."""
+    if isinstance(item, list):
+        for v in item:
+            yield from _recipe_nodes(v)
+    elif isinstance(item, dict):
+        if "Recipe" in _types(item):
+            yield item
+            return
+        for key in ("@graph", "mainEntity"):
+            if key in item:
+                yield from _recipe_nodes(item[key])
+
+
+def extract_recipes(json_ld: list, url: str) -> list[dict]:
+    """Normalized recipe records from a page's JSON-LD items (without name/ingredients: skipped)."""
+    records = []
+    for node in _recipe_nodes(json_ld):
+        name = _text(node.get("name"))
+        raw_ingredients = node.get("recipeIngredient") or node.get("ingredients") or []
+        if isinstance(raw_ingredients, (str, dict)):
+            raw_ingredients = [raw_ingredients]  # single value instead of a list
+        ingredients = [t for t in (_text(i) for i in raw_ingredients) if t]
+        if not name or not ingredients:
+            continue
+        rating = (node.get("aggregateRating") or {}) if isinstance(node.get("aggregateRating"), dict) else {}
+        try:
+            rating_value = round(float(str(rating.get("ratingValue")).replace(",", ".")), 1)
+        except ValueError:
+            rating_value = None
+        records.append(
+            {
+                "name": name,
+                "url": url,
+                "description": _text(node.get("description"))[:300],
+                "ingredients": ingredients[:_MAX_INGREDIENTS],
+                "steps": [s[:_STEP_CHARS] for s in _steps(node.get("recipeInstructions"))][:_MAX_STEPS],
+                "total_min": _minutes(node.get("totalTime")),
+                "prep_min": _minutes(node.get("prepTime")),
+                "cook_min": _minutes(node.get("cookTime")),
+                "servings": _servings(node.get("recipeYield")),
+                "keywords": _text([node.get("keywords"), node.get("recipeCategory"), node.get("recipeCuisine")]),
+                "rating": rating_value,
+            }
+        )
+    return records
+
+
+def compact(record: dict, max_steps: int) -> dict:
+    """What goes to the LLM: no empty fields, few steps, no search-only fields."""
+    out = {k: record[k] for k in ("name", "url", "servings", "total_min", "prep_min", "cook_min", "ingredients") if record.get(k)}
+    if record.get("steps"):
+        out["steps"] = record["steps"][:max_steps]
+    return out
+
+
+def _match_expression(query: str) -> str:
+    terms = [t for t in tokenize(query) if t not in _QUERY_NOISE and not t.isdigit()]
+    # Crude German stemming: long words match by their first letters.
+    prefixes = dict.fromkeys(t[: max(4, len(t) - 3)] if len(t) > 5 else t for t in terms)
+    return " ".join(f'"{p}"*' for p in prefixes)
+
+
+class RecipeIndex:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.executescript(
+                """
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS recipes (
+                    id INTEGER PRIMARY KEY, url_key TEXT NOT NULL UNIQUE, data TEXT NOT NULL, fetched_at REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(name, ingredients, keywords);
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def add(self, records: list[dict]) -> int:
+        """Inserts or replaces records (by canonical URL + name). Returns the number written."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for r in records:
+                    key = f"{canonical_url(r['url'])}#{fold(r['name'])}"
+                    old = conn.execute("SELECT id FROM recipes WHERE url_key = ?", (key,)).fetchone()
+                    if old:
+                        conn.execute("DELETE FROM recipes_fts WHERE rowid = ?", old)
+                        conn.execute("DELETE FROM recipes WHERE id = ?", old)
+                    cur = conn.execute(
+                        "INSERT INTO recipes (url_key, data, fetched_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(r, ensure_ascii=False), now),
+                    )
+                    conn.execute(
+                        "INSERT INTO recipes_fts (rowid, name, ingredients, keywords) VALUES (?, ?, ?, ?)",
+                        (cur.lastrowid, " ".join(index_keys(r["name"])), fold(" ".join(r["ingredients"])), fold(r.get("keywords") or "")),
+                    )
+        metrics.incr("recipe_index.added", len(records))
+        return len(records)
+
+    def search(self, query: str, limit: int = 3) -> list[dict]:
+        """Best matching records; every query term must match name, ingredients or keywords."""
+        expr = _match_expression(query)
+        if not expr:
+            return []
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT r.data FROM recipes_fts f JOIN recipes r ON r.id = f.rowid "
+                "WHERE recipes_fts MATCH ? ORDER BY bm25(recipes_fts, 10.0, 1.0, 3.0) LIMIT ?",
+                (expr, limit),
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = self._connection().execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+        return {
+            "path": str(self.path),
+            "recipes": count,
+            "hits": metrics.get("recipe_index.hits"),
+            "misses": metrics.get("recipe_index.misses"),
+        }
+
+
+recipe_index = RecipeIndex(settings.RECIPE_INDEX_PATH)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from backend.services.gazetteer import fold
+
+# Lexical re-ranking for search results and page passages: BM25 over folded
+# word tokens. Documents are turned into term-frequency vectors once; a query
+# is scored against all of them in one pass over its (few) terms.
+
+_TOKEN_RE = re.compile(r"\w{2,}")
+_STOPWORDS = frozenset(
+    """
+    der die das den dem des ein eine einer eines einem einen und oder aber in im am an auf aus bei mit nach von vom zu zum zur
+    fur uber unter ist sind war wird werden hat haben wie was wer wo wann welche welcher welches es ich du er sie wir ihr man
+    nicht auch noch nur so als dass da dann mal bitte gibt
+    the a an and or of in on at to for from with by is are was be what who where when how which it this that
+    """.split()
+)
+_TRACKING_PARAMS = frozenset({"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src"})
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(fold(text)) if t not in _STOPWORDS]
+
+
+def canonical_url(url: str) -> str:
+    """Dedupe key: lowercase host without www., no fragment/tracking params/trailing slash."""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    host = parts.netloc.lower().removeprefix("www.")
+    params = [(k, v) for k, v in parse_qsl(parts.query) if not (k.lower().startswith("utm_") or k.lower() in _TRACKING_PARAMS)]
+    query = urlencode(sorted(params))
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme, host, parts.path.rstrip("/"), query, ""))
+
+
+class BM25:
+    def __init__(self, docs: list[str], *, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.tfs = [Counter(tokenize(d)) for d in docs]
+        self.lengths = [sum(tf.values()) for tf in self.tfs]
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.df: Counter = Counter()
+        for tf in self.tfs:
+            self.df.update(tf.keys())
+
+    def scores(self, query: str) -> list[float]:
+        n = len(self.tfs)
+        terms = set(tokenize(query))
+        idf = {t: math.log(1 + (n - self.df[t] + 0.5) / (self.df[t] + 0.5)) for t in terms if self.df[t]}
+        out = []
+        for tf, length in zip(self.tfs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_len) if self.avg_len else self.k1
+            out.append(sum(w * tf[t] * (self.k1 + 1) / (tf[t] + norm) for t, w in idf.items() if t in tf))
+        return out
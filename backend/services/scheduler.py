@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import AsyncGenerator
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+
+LOG = get_logger(__name__)
+
+# Priority classes: lower value = dispatched first.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# user_id used for jobs that do not belong to a user (summaries, warm-up).
+SYSTEM_USER_ID = 0
+
+
+class Ticket:
+    """One admission request. Use `wait()` to get queue positions, then `release()`."""
+
+    def __init__(self, scheduler: GenerationScheduler, user_id: int, priority: int) -> None:
+        self._scheduler = scheduler
+        self.user_id = user_id
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+        self.released = False
+
+    async def wait(self) -> AsyncGenerator[int, None]:
+        """Yields the 1-based queue position whenever it changes; returns once granted."""
+        last = None
+        while not self.granted:
+            changed = self._scheduler._changed
+            pos = self._scheduler.position(self)
+            if pos != last:
+                last = pos
+                yield pos
+            if self.granted:
+                break
+            await changed.wait()
+
+    def release(self) -> None:
+        self._scheduler._release(self)
+
+
+class GenerationScheduler:
+    """Caps in-flight generations and dispatches the rest fairly.
+
+    Within a priority class users are served round-robin (one ticket per
+    user per round), so one user with many tabs/jobs cannot starve the
+    others. Interactive tickets always go before background ones.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._capacity = max(1, capacity)
+        self._in_flight = 0
+        # priority -> round-robin order of user_ids / per-user FIFO
+        self._rr: dict[int, deque[int]] = {INTERACTIVE: deque(), BACKGROUND: deque()}
+        self._per_user: dict[int, dict[int, deque[Ticket]]] = {INTERACTIVE: {}, BACKGROUND: {}}
+        self._changed = asyncio.Event()
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def set_capacity(self, capacity: int) -> None:
+        self._capacity = max(1, capacity)
+        self._dispatch()
+
+    def enqueue(self, user_id: int, priority: int = INTERACTIVE) -> Ticket:
+        ticket = Ticket(self, user_id, priority)
+        users = self._per_user[priority]
+        if user_id not in users:
+            users[user_id] = deque()
+            self._rr[priority].append(user_id)
+        users[user_id].append(ticket)
+        self._dispatch()
+        if not ticket.granted:
+            metrics.incr("scheduler.queued")
+        return ticket
+
+    def try_acquire(self, user_id: int, priority: int = INTERACTIVE) -> Ticket | None:
+        """A slot right now, or None; never queues (for optional extra generations).
+
+        Free capacity means the queue is empty (_dispatch fills it), so this
+        never takes a slot away from a waiting ticket.
+        """
+        if self._in_flight >= self._capacity:
+            return None
+        ticket = Ticket(self, user_id, priority)
+        ticket.granted = True
+        self._in_flight += 1
+        return ticket
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self._capacity:
+            ticket = self._pop_next()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._in_flight += 1
+            wait_ms = (time.perf_counter() - ticket.enqueued_at) * 1000
+            metrics.observe(f"scheduler.wait_ms.{_PRIORITY_NAMES[ticket.priority]}", round(wait_ms, 1))
+        self._notify()
+
+    def _pop_next(self) -> Ticket | None:
+        for priority in (INTERACTIVE, BACKGROUND):
+            rr = self._rr[priority]
+            if not rr:
+                continue
+            user_id = rr.popleft()
+            fifo = self._per_user[priority][user_id]
+            ticket = fifo.popleft()
+            if fifo:
+                rr.append(user_id)
+            else:
+                del self._per_user[priority][user_id]
+            return ticket
+        return None
+
+    def _release(self, ticket: Ticket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted:
+            self._in_flight -= 1
+        else:
+            # Left the queue (client disconnected while waiting).
+            fifo = self._per_user[ticket.priority].get(ticket.user_id)
+            if fifo is not None and ticket in fifo:
+                fifo.remove(ticket)
+                if not fifo:
+                    del self._per_user[ticket.priority][ticket.user_id]
+                    self._rr[ticket.priority].remove(ticket.user_id)
+            metrics.incr("scheduler.abandoned")
+        self._dispatch()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _dispatch_order(self) -> list[Ticket]:
+        order: list[Ticket] = []
+        for priority in (INTERACTIVE, BACKGROUND):
+            queues = [list(self._per_user[priority][u]) for u in self._rr[priority]]
+            depth = max((len(q) for q in queues), default=0)
+            for i in range(depth):
+                order.extend(q[i] for q in queues if i < len(q))
+        return order
+
+    def position(self, ticket: Ticket) -> int:
+        if ticket.granted:
+            return 0
+        try:
+            return self._dispatch_order().index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self._capacity,
+            "in_flight": self._in_flight,
+            "queued": {
+                _PRIORITY_NAMES[p]: sum(len(q) for q in users.values()) for p, users in self._per_user.items()
+            },
+        }
+
+
+scheduler = GenerationScheduler(settings.OLLAMA_MAX_INFLIGHT)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+import time
+from json.encoder import encode_basestring
+from typing import AsyncGenerator, Awaitable, Callable, Iterator, Optional
+
+from backend.core.config import settings
+from backend.services.stream_runs import StreamRun
+
+# SSE framing for the chat stream.
+# Token frames are by far the most frequent ones, so they are built from
+# pre-rendered pieces and only the token text goes through the (C) JSON
+# string encoder; consecutive tokens are coalesced into one frame.
+
+HEARTBEAT = ": ping\n\n"
+_TOKEN_HEAD = 'event: token\ndata: {"token": '
+_TOKEN_TAIL = "}\n\n"
+
+
+def frame(data: dict, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    s = ""
+    if event_id:
+        s += f"id: {event_id}\n"
+    if event:
+        s += f"event: {event}\n"
+    s += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return s
+
+
+def token_frame(text: str, event_id: str) -> str:
+    # Same bytes as frame({"token": text}, "token", event_id).
+    return f"id: {event_id}\n{_TOKEN_HEAD}{encode_basestring(text)}{_TOKEN_TAIL}"
+
+
+def render_batch(run_id: str, batch: list[tuple[int, str, dict]], max_chars: int) -> Iterator[str]:
+    """Frames for one batch; consecutive tokens are merged up to `max_chars`.
+
+    A merged frame carries the id of its last token, so Last-Event-ID resume
+    continues right after it.
+    """
+    parts: list[str] = []
+    size = 0
+    last_seq = 0
+    for seq, event, data in batch:
+        if event == "token":
+            token = data.get("token") or ""
+            if parts and size + len(token) > max_chars:
+                yield token_frame("".join(parts), f"{run_id}.{last_seq}")
+                parts, size = [], 0
+            parts.append(token)
+            size += len(token)
+            last_seq = seq
+            continue
+        if parts:
+            yield token_frame("".join(parts), f"{run_id}.{last_seq}")
+            parts, size = [], 0
+        yield frame(data, event=event, event_id=f"{run_id}.{seq}")
+    if parts:
+        yield token_frame("".join(parts), f"{run_id}.{last_seq}")
+
+
+async def sse_frames(
+    run: StreamRun,
+    after: int = 0,
+    *,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    window: float | None = None,
+) -> AsyncGenerator[str, None]:
+    """SSE text for a run: one chunk (= one write) per batch, heartbeats while idle.
+
+    Heartbeat comments keep proxies from buffering or timing out during the
+    planner/tool phases, when no tokens flow.
+    """
+    if window is None:
+        window = settings.STREAM_COALESCE_MS / 1000
+    max_chars = settings.STREAM_COALESCE_MAX_CHARS
+    heartbeat = settings.STREAM_HEARTBEAT_SECONDS
+    poll = settings.STREAM_DISCONNECT_POLL_SECONDS
+    idle = min((x for x in (heartbeat, poll) if x > 0), default=None)
+    last_write = last_check = time.monotonic()
+    async for batch in run.events(after, idle=idle, window=window):
+        now = time.monotonic()
+        if is_disconnected is not None and now - last_check >= poll:
+            last_check = now
+            if await is_disconnected():
+                return
+        if batch:
+            last_write = now
+            yield "".join(render_batch(run.run_id, batch, max_chars))
+        elif heartbeat > 0 and now - last_write >= heartbeat:
+            last_write = now
+            yield HEARTBEAT
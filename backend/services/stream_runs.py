@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import AsyncGenerator, Awaitable, Callable
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+
+LOG = get_logger(__name__)
+
+_run_ids = itertools.count(1)
+
+
+class StreamRun:
+    """One assistant generation, decoupled from any HTTP connection.
+
+    The generation task emits numbered events into a ring buffer; any
+    number of SSE clients attach and read from an event id onwards
+    (Last-Event-ID), so reconnects and second tabs do not generate again.
+    """
+
+    def __init__(self, conversation_id: int, user_id: int) -> None:
+        self.run_id = f"{int(time.time()):x}-{next(_run_ids)}"
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.done = False
+        self.finished_at: float | None = None
+        self.task: asyncio.Task | None = None
+        self.listeners = 0
+        self.cancel_reason: str | None = None
+        # Answer tokens since the last reset (for the "tokens saved" estimate).
+        self.answer_tokens = 0
+        self._ring: deque[tuple[int, str, dict]] = deque(maxlen=settings.STREAM_RING_SIZE)
+        self._seq = 0
+        # Full text so far, used to resync clients that fell out of the ring.
+        self._text: list[str] = []
+        self._changed = asyncio.Event()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def text(self) -> str:
+        return "".join(self._text)
+
+    def emit(self, event: str, data: dict) -> None:
+        self._seq += 1
+        self._ring.append((self._seq, event, data))
+        if event == "token":
+            self._text.append(data.get("token") or "")
+            self.answer_tokens += 1
+        elif event == "reset":
+            self._text.clear()
+            self.answer_tokens = 0
+        self._wake()
+
+    def finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    def cancel(self, reason: str) -> bool:
+        """Stops the generation task (and with it the upstream Ollama stream)."""
+        if self.done or self.task is None or self.task.done():
+            return False
+        self.cancel_reason = reason
+        self.task.cancel()
+        return True
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def events(
+        self, after: int = 0, *, idle: float | None = None, window: float = 0.0
+    ) -> AsyncGenerator[list[tuple[int, str, dict]], None]:
+        """Yields batches of (seq, event, data) with seq > after until the run is done.
+
+        After a wake-up the reader waits `window` seconds before draining, so
+        tokens arriving close together come out as one batch. With `idle`, an
+        empty batch is yielded whenever nothing happened for that long (used
+        for disconnect checks and heartbeats).
+        """
+        cursor = after
+        while True:
+            changed = self._changed
+            batch: list[tuple[int, str, dict]] = []
+            first = self._ring[0][0] if self._ring else None
+            if first is not None and cursor < first - 1:
+                # Client missed events that already left the ring: resync it
+                # with the text so far, then continue with the buffer.
+                batch.append((first - 1, "reset", {"reason": "resync"}))
+                head = self._text_before_ring()
+                if head:
+                    batch.append((first - 1, "token", {"token": head}))
+                cursor = first - 1
+            for seq, event, data in list(self._ring):
+                if seq > cursor:
+                    cursor = seq
+                    batch.append((seq, event, data))
+            if batch:
+                yield batch
+            if self.done and cursor >= self._seq:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), idle)
+            except asyncio.TimeoutError:
+                yield []
+                continue
+            if window > 0 and not self.done:
+                await asyncio.sleep(window)
+
+    def _text_before_ring(self) -> str:
+        if any(event == "reset" for _, event, _ in self._ring):
+            return ""  # everything before the ring was discarded anyway
+        in_ring = sum(len(d.get("token") or "") for _, e, d in self._ring if e == "token")
+        full = self.text
+        return full[: len(full) - in_ring]
+
+
+class RunRegistry:
+    """Active (and recently finished) runs per conversation."""
+
+    def __init__(self) -> None:
+        self._runs: dict[int, StreamRun] = {}
+
+    def get(self, conversation_id: int) -> StreamRun | None:
+        run = self._runs.get(conversation_id)
+        if run is not None and run.done and time.monotonic() - (run.finished_at or 0) > settings.STREAM_RETENTION_SECONDS:
+            self._runs.pop(conversation_id, None)
+            return None
+        return run
+
+    def active(self, conversation_id: int) -> StreamRun | None:
+        run = self.get(conversation_id)
+        return run if run is not None and not run.done else None
+
+    def get_or_start(
+        self,
+        conversation_id: int,
+        user_id: int,
+        generate: Callable[[StreamRun], Awaitable[None]],
+    ) -> StreamRun:
+        """Returns the running generation for the conversation or starts one.
+
+        Must be called on the event loop; there is no await between the
+        check and the insert, so two tabs cannot start two generations.
+        """
+        run = self.active(conversation_id)
+        if run is not None:
+            metrics.incr("stream_runs.attached")
+            return run
+        run = StreamRun(conversation_id, user_id)
+        self._runs[conversation_id] = run
+        run.task = asyncio.create_task(self._drive(run, generate))
+        metrics.incr("stream_runs.started")
+        return run
+
+    async def _drive(self, run: StreamRun, generate: Callable[[StreamRun], Awaitable[None]]) -> None:
+        try:
+            await generate(run)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            LOG.exception("Stream run crashed conversation_id=%s", run.conversation_id)
+            run.emit("error", {"ok": False, "detail": "LLM streaming failed"})
+        finally:
+            run.finish()
+
+    def attach(self, run: StreamRun) -> None:
+        run.listeners += 1
+
+    def detach(self, run: StreamRun) -> None:
+        """Last reader gone: cancel the run unless someone reattaches within the grace time.
+
+        The grace time covers EventSource reconnects (Last-Event-ID resume).
+        """
+        run.listeners -= 1
+        if run.listeners > 0 or run.done:
+            return
+        grace = settings.STREAM_DETACH_GRACE_SECONDS
+        if grace <= 0:
+            self._reap(run)
+        else:
+            asyncio.get_running_loop().call_later(grace, self._reap, run)
+
+    def _reap(self, run: StreamRun) -> None:
+        if run.listeners == 0 and run.cancel("disconnect"):
+            LOG.info("Stream run abandoned, cancelled conversation_id=%s", run.conversation_id)
+
+    def cancel(self, conversation_id: int, reason: str = "client") -> bool:
+        run = self.active(conversation_id)
+        return run.cancel(reason) if run is not None else False
+
+    def stats(self) -> dict:
+        return {
+            "active": sum(1 for r in self._runs.values() if not r.done),
+            "listeners": sum(r.listeners for r in self._runs.values() if not r.done),
+            "retained": sum(1 for r in self._runs.values() if r.done),
+        }
+
+
+runs = RunRegistry()
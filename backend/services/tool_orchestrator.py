@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import re
+import time
+from contextlib import aclosing
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, AsyncGenerator
 
+from backend.core.config import settings
 from backend.core.logging_setup import get_logger
-from backend.services.ollama import chat_completion
+from backend.db.database import SessionLocal
+from backend.services import metrics
+from backend.services.context_packer import estimate_tokens
+from backend.services.intent import UNSURE, IntentGuess, classifier
+from backend.services.planner_cache import cache_key, planner_cache
+from backend.services.scheduler import SYSTEM_USER_ID, scheduler
+from backend.services.ollama import achat_completion, astream_chat_completion, astream_chat_with_tools, chat_completion
+from backend.services.tools.compact import compact_payload, dumps
 from backend.services.tools.context import ToolContext
-from backend.services.tools.registry import TOOL_ALLOWLIST, run_tool
+from backend.services.tools.registry import TOOL_ALLOWLIST, run_tool, tool_schemas
 
 LOG = get_logger(__name__)
 
@@ -17,32 +29,64 @@ class PlannerDecision:
     action: str  # "respond" or "tool_call"
     tool: str | None = None
     args: dict | None = None
+    # Further independent calls of a multi-tool plan, run concurrently with the first.
+    more: tuple[tuple[str, dict], ...] = ()
+    # The question only asks for the tool data itself ("Wie spät ist es?"):
+    # a renderer template may answer instead of the final LLM pass.
+    simple: bool = False
 
+    @property
+    def calls(self) -> list[tuple[str, dict]]:
+        if self.action != "tool_call" or not self.tool:
+            return []
+        return [(self.tool, self.args or {}), *self.more]
 
+
+# Appended AFTER the shared prefix (static system prompt + history + facts, see
+# prompt_builder), so the planner call reuses the KV cache of the answer call.
+# The tool rules/allowlist live in the static system prompt.
 _PLANNER_SYSTEM_PROMPT = (
-    "Du bist ein Planner für einen privaten AI Assistant. "
+    "PLANNER-MODUS: Du bist jetzt der Planner für einen privaten AI Assistant. "
     "Du MUSST strikt JSON zurückgeben und darfst keinen Freitext schreiben. "
-    "Deine Aufgabe: Entscheide, ob ein Tool notwendig ist, um die Frage zu beantworten.\n\n"
-    
-    "REGELN FÜR TOOLS:\n"
-    "1. Wenn der Nutzer nach aktuellen Nachrichten, Feiertagen, Ferien, Events oder Fakten fragt, NUTZE 'web_search'.\n"
-    "2. Wenn der Nutzer nach dem Wetter fragt, NUTZE 'get_weather'.\n"
-    "3. Wenn der Nutzer nach Rezepten fragt, NUTZE 'recipe_search' oder 'web_search'.\n"
-    "4. Wenn der Nutzer nur Hallo sagt oder Smalltalk macht, NUTZE 'respond'.\n"
-    "\n"
-    "Erlaubte Tools (Allowlist):\n"
-    "- get_datetime args:{}\n"
-    "- get_weather args:{location?:string}\n"
-    "- web_search args:{query:string, max_results?:int}\n"
-    "- recipe_search args:{query:string}\n"
+    "Deine Aufgabe: Entscheide, ob ein Tool notwendig ist, um die letzte Nutzerfrage zu beantworten.\n"
     "\n"
     "Erlaubte JSON Antworten (exakt ein Objekt):\n"
     '{"action":"respond"}\n'
     'ODER {"action":"tool_call","tool":"web_search","args":{"query":"Ferien Rheinland-Pfalz 2026"}}\n'
     'ODER {"action":"tool_call","tool":"get_weather","args":{"location":"Berlin"}}\n'
+    'ODER {"action":"tool_call","tool":"get_weather","args":{"locations":["Berlin","München"]}}\n'
+    "Braucht die Frage mehrere unabhängige Tools (z.B. Wetter und Ferien), nutze calls (max. 4):\n"
+    '{"action":"tool_call","calls":[{"tool":"get_weather","args":{"location":"Berlin"}},'
+    '{"tool":"web_search","args":{"query":"Schulferien Berlin aktuell"}}]}\n'
+    'Fragt der Nutzer nur nach den Tool-Daten selbst (z.B. "Wie spät ist es?", "Wie ist das Wetter in Berlin?"), '
+    'setze zusätzlich "simple":true; bei Rat, Vergleich oder Erklärung nicht.\n'
 )
 
 
+# JSON schema for Ollama's `format` option: the planner can only emit a valid decision.
+_PLANNER_FORMAT: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["respond", "tool_call"]},
+        "tool": {"type": "string", "enum": list(TOOL_ALLOWLIST.keys())},
+        "args": {"type": "object"},
+        "simple": {"type": "boolean"},
+        "calls": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "tool": {"type": "string", "enum": list(TOOL_ALLOWLIST.keys())},
+                    "args": {"type": "object"},
+                },
+                "required": ["tool"],
+            },
+        },
+    },
+    "required": ["action"],
+}
+
+
 def _try_parse_json(text: str) -> dict | None:
     if not text:
         return None
@@ -70,19 +114,50 @@ def _try_parse_json(text: str) -> dict | None:
     return None
 
 
-def plan_action(llm_messages: list[dict]) -> PlannerDecision:
-    """Phase 1: Ask the model to decide whether to call a tool.
+def _planner_messages(llm_messages: list[dict]) -> list[dict]:
+    return llm_messages + [{"role": "system", "content": _PLANNER_SYSTEM_PROMPT}]
 
-    If anything is invalid, we fall back to Stage-1 behavior (respond).
-    """
-    planner_messages = [{"role": "system", "content": _PLANNER_SYSTEM_PROMPT}] + llm_messages[-8:]
-    try:
-        # NOTE: We use temperature=0.0 to get deterministic JSON
-        raw = chat_completion(planner_messages, temperature=0.0, max_tokens=256)
-    except Exception:
-        LOG.exception("Planner request failed")
+
+def _valid_call(tool: Any, args: Any) -> tuple[str, dict] | None:
+    if args is None:
+        args = {}
+    if not isinstance(tool, str) or tool not in TOOL_ALLOWLIST or not isinstance(args, dict):
+        return None
+    return tool, args
+
+
+def _merge_weather_calls(calls: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+    # get_weather for several places -> one call with `locations` (one batched request).
+    places: list[str] = []
+    for tool, args in calls:
+        if tool == "get_weather":
+            places += [p for p in [args.get("location"), *(args.get("locations") or [])] if isinstance(p, str) and p]
+    if len(places) < 2:
+        return calls
+    merged: list[tuple[str, dict]] = []
+    for tool, args in calls:
+        if tool != "get_weather":
+            merged.append((tool, args))
+        elif not any(t == "get_weather" for t, _ in merged):
+            merged.append(("get_weather", {"locations": list(dict.fromkeys(places))}))
+    return merged
+
+
+def _decision_from_calls(calls: list[tuple[str, dict]], *, simple: bool = False) -> PlannerDecision:
+    """Deduplicated, capped at TOOLS_MAX_PARALLEL_CALLS; no calls -> respond."""
+    unique: list[tuple[str, dict]] = []
+    for call in _merge_weather_calls(calls):
+        if call not in unique:
+            unique.append(call)
+    unique = unique[: max(1, settings.TOOLS_MAX_PARALLEL_CALLS)]
+    if not unique:
         return PlannerDecision(action="respond")
+    (tool, args), *more = unique
+    # Only a single call (after merging) can be answered from a template.
+    return PlannerDecision(action="tool_call", tool=tool, args=args, more=tuple(more), simple=simple and not more)
+
 
+def _decision_from_raw(raw: str) -> PlannerDecision:
     obj = _try_parse_json(raw)
     if not obj:
         return PlannerDecision(action="respond")
@@ -94,16 +169,228 @@ def plan_action(llm_messages: list[dict]) -> PlannerDecision:
     if action != "tool_call":
         return PlannerDecision(action="respond")
 
-    tool = obj.get("tool")
-    args = obj.get("args")
-    if not isinstance(tool, str) or tool not in TOOL_ALLOWLIST:
+    simple = obj.get("simple") is True
+    raw_calls = obj.get("calls")
+    if isinstance(raw_calls, list) and raw_calls:
+        calls = [_valid_call(c.get("tool"), c.get("args")) for c in raw_calls if isinstance(c, dict)]
+        return _decision_from_calls([c for c in calls if c is not None], simple=simple)
+
+    call = _valid_call(obj.get("tool"), obj.get("args"))
+    if call is None:
         return PlannerDecision(action="respond")
-    if args is None:
-        args = {}
-    if not isinstance(args, dict):
+    return PlannerDecision(action="tool_call", tool=call[0], args=call[1], simple=simple)
+
+
+def plan_action(llm_messages: list[dict]) -> PlannerDecision:
+    """Phase 1: Ask the model to decide whether to call a tool.
+
+    If anything is invalid, we fall back to Stage-1 behavior (respond).
+    """
+    try:
+        # NOTE: We use temperature=0.0 to get deterministic JSON
+        raw = chat_completion(_planner_messages(llm_messages), temperature=0.0, max_tokens=256)
+    except Exception:
+        LOG.exception("Planner request failed")
+        return PlannerDecision(action="respond")
+
+    return _decision_from_raw(raw)
+
+
+def _last_user_text(llm_messages: list[dict]) -> str:
+    for m in reversed(llm_messages):
+        if m.get("role") == "user":
+            return m.get("content") or ""
+    return ""
+
+
+def _decision_label(decision: PlannerDecision) -> str:
+    if decision.more:
+        return "multi"  # never decided locally
+    return f"tool:{decision.tool}" if decision.action == "tool_call" else "respond"
+
+
+# Questions that ask for nothing but the tool data ("Wie spät ist es?", "Wie ist
+# das Wetter in Köln morgen?"). Anything around it ("Soll ich bei dem Wetter
+# joggen gehen?") needs the final LLM pass, even if a rule picked the tool.
+_WHEN = r"(\s+(?i:heute|morgen|übermorgen|jetzt|gerade|aktuell|am\s+wochenende))?"
+_SIMPLE_RE = re.compile(
+    r"(?i:wie\s+spät\s+ist\s+es|wie\s?viel\s+uhr\s+ist\s+es|welche\s+uhrzeit\s+(ist\s+es|haben\s+wir)|"
+    r"welcher\s+(wochen)?tag\s+ist\s+heute|welches\s+datum\s+(ist|haben\s+wir)\s+heute|der\s+wievielte\s+ist\s+heute|"
+    r"what\s+time\s+is\s+it)(\s+(?i:gerade|jetzt))?"
+    r"|(?i:wie\s+(ist|wird)\s+das\s+wetter|wetter)" + _WHEN
+    + r"(\s+(?i:in|für)\s+[A-ZÄÖÜ][\wäöüß.\-]*(\s+[A-ZÄÖÜ][\wäöüß.\-]*){0,2})?" + _WHEN
+)
+
+
+def _local_decision(text: str) -> tuple[PlannerDecision | None, IntentGuess]:
+    """Local intent classifier (see services/intent.py); decision only if confident."""
+    t0 = time.perf_counter()
+    guess = classifier.classify(text)
+    metrics.observe("intent.classify_us", round((time.perf_counter() - t0) * 1e6, 1))
+    if guess.label == UNSURE or guess.confidence < settings.LLM_LOCAL_INTENT_THRESHOLD:
+        return None, guess
+    if guess.tool:
+        simple = guess.source == "rule" and _SIMPLE_RE.fullmatch(text.strip().rstrip("?!. ")) is not None
+        return PlannerDecision(action="tool_call", tool=guess.tool, args=dict(guess.args), simple=simple), guess
+    return PlannerDecision(action="respond"), guess
+
+
+async def aplan_action(llm_messages: list[dict], *, user_id: int | None = None) -> PlannerDecision:
+    """Async variant of plan_action (used by the streaming endpoint).
+
+    user_id scopes the planner cache (decisions carry per-user args).
+
+    LLM_LOCAL_INTENT="on" skips the LLM call when the local classifier is
+    confident; "shadow" only compares and logs (confusion matrix).
+    """
+    mode = settings.LLM_LOCAL_INTENT
+    text = _last_user_text(llm_messages)
+    guess = None
+    if mode in ("shadow", "on") and text:
+        local, guess = _local_decision(text)
+        if local is not None and mode == "on":
+            metrics.incr("intent.local_decisions")
+            return local
+
+    # Same question (normalized) as recently: reuse the decision, the tool still runs.
+    key = cache_key(llm_messages, f"u{user_id}") if settings.PLANNER_CACHE_SIZE > 0 else None
+    if key is not None:
+        cached = planner_cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        raw = await achat_completion(
+            _planner_messages(llm_messages), temperature=0.0, max_tokens=256, format=_PLANNER_FORMAT
+        )
+    except Exception:
+        LOG.exception("Planner request failed")
         return PlannerDecision(action="respond")
 
-    return PlannerDecision(action="tool_call", tool=tool, args=args)
+    decision = _decision_from_raw(raw)
+    # Empty output (Ollama error), truncated JSON or garbage also end up as
+    # "respond", but are no real decision: neither cached nor a label.
+    parsed = (_try_parse_json(raw) or {}).get("action") in ("respond", "tool_call")
+    if key is not None and parsed:
+        planner_cache.put(key, decision)
+    if guess is not None and parsed:
+        # Every parsed LLM decision is training data for the local model.
+        await classifier.record(text, _decision_label(decision), guess)
+    return decision
+
+
+async def speculative_plan(llm_messages: list[dict], *, user_id: int | None = None) -> AsyncGenerator[tuple[str, Any], None]:
+    """Runs the planner and a speculative "respond" stream concurrently.
+
+    Yields ("token", str) for speculative tokens and exactly one
+    ("decision", PlannerDecision) as soon as the planner is done. On
+    "respond" the speculative tokens keep flowing and ARE the answer; on
+    "tool_call" the stream is cancelled right away and the caller has to
+    discard what it already forwarded.
+
+    The caller's admission ticket covers one generation; the second one needs
+    its own scheduler slot. Without a free slot the turn runs like "planner"
+    mode (decision first, then the answer stream).
+    """
+    extra = scheduler.try_acquire(user_id if user_id is not None else SYSTEM_USER_ID)
+    if extra is None:
+        metrics.incr("speculation.skipped")
+        decision = await aplan_action(llm_messages, user_id=user_id)
+        yield "decision", decision
+        if decision.action == "respond":
+            async with aclosing(astream_chat_completion(llm_messages)) as answer:
+                async for token in answer:
+                    yield "token", token
+        return
+
+    planner = asyncio.create_task(aplan_action(llm_messages, user_id=user_id))
+    stream = astream_chat_completion(llm_messages)
+    next_token: asyncio.Future | None = None
+    decision: PlannerDecision | None = None
+    spec_tokens = 0
+    metrics.incr("speculation.started")
+
+    try:
+        while True:
+            if next_token is None:
+                next_token = asyncio.ensure_future(stream.__anext__())
+            wait_for = {next_token} if decision is not None else {next_token, planner}
+            done, _ = await asyncio.wait(wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+            if decision is None and planner in done:
+                decision = planner.result()
+                yield "decision", decision
+                if decision.action == "tool_call":
+                    break
+
+            if next_token in done:
+                try:
+                    token = next_token.result()
+                except StopAsyncIteration:
+                    next_token = None
+                    break
+                next_token = None
+                spec_tokens += 1
+                yield "token", token
+
+        if decision is None:
+            # Speculative answer finished before the planner did.
+            decision = await planner
+            yield "decision", decision
+
+        if decision.action == "tool_call":
+            metrics.incr("speculation.wasted")
+            metrics.incr("speculation.wasted_tokens", spec_tokens)
+            LOG.info("speculation wasted tool=%s spec_tokens=%s", decision.tool, spec_tokens)
+        else:
+            metrics.incr("speculation.used")
+    finally:
+        if next_token is not None and not next_token.done():
+            next_token.cancel()
+            try:
+                await next_token
+            except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                pass
+        if not planner.done():
+            planner.cancel()
+        await stream.aclose()
+        extra.release()
+
+
+def _decision_from_tool_calls(tool_calls: list[dict]) -> PlannerDecision:
+    # Same contract as the JSON planner: all valid calls, run concurrently.
+    calls: list[tuple[str, dict]] = []
+    for call in tool_calls or []:
+        fn = (call or {}).get("function") or {}
+        tool = fn.get("name")
+        args = fn.get("arguments")
+        if isinstance(args, str):
+            args = _try_parse_json(args)
+        valid = _valid_call(tool, args)
+        if valid is None:
+            LOG.info("native tool call ignored tool=%s", tool)
+            continue
+        calls.append(valid)
+    return _decision_from_calls(calls)
+
+
+async def native_plan(llm_messages: list[dict]) -> AsyncGenerator[tuple[str, Any], None]:
+    """Single pass with Ollama native tool calling (no separate planner call).
+
+    Same event contract as speculative_plan: ("token", str)* and exactly one
+    ("decision", PlannerDecision). On "respond" the streamed text is the answer.
+    """
+    decision = PlannerDecision(action="respond")
+    async with aclosing(astream_chat_with_tools(llm_messages, tool_schemas())) as turn:
+        async for kind, value in turn:
+            if kind == "tool_calls":
+                decision = _decision_from_tool_calls(value)
+                if decision.action == "tool_call":
+                    break
+            else:
+                yield "token", value
+    metrics.incr(f"native.{decision.action}")
+    yield "decision", decision
 
 
 @dataclass(frozen=True)
@@ -112,31 +399,122 @@ class ToolRunOutcome:
     tool_payload: dict | None
 
 
-def run_planned_tool(decision: PlannerDecision, ctx: ToolContext) -> ToolRunOutcome:
-    if decision.action != "tool_call" or not decision.tool:
+async def _run_own_session(tool: str, args: dict, ctx: ToolContext) -> dict:
+    # A Session must not be shared by concurrently running tools (some use threads).
+    db = SessionLocal()
+    try:
+        return await run_tool(tool, args, ToolContext(db=db, user=ctx.user, question=ctx.question))
+    finally:
+        db.close()
+
+
+async def _run_parallel(calls: list[tuple[str, dict]], ctx: ToolContext) -> dict:
+    """Runs independent calls concurrently under TOOLS_LATENCY_BUDGET_SECONDS.
+
+    Calls still running when the budget is spent are cancelled and reported
+    as errors, so the answer can use whatever did finish (partial result).
+    """
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(_run_own_session(tool, args, ctx)) for tool, args in calls]
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=settings.TOOLS_LATENCY_BUDGET_SECONDS)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    results: list[dict] = []
+    for (tool, args), task in zip(calls, tasks):
+        if task in pending:
+            metrics.incr("tools.parallel.over_budget")
+            results.append({
+                "ok": False,
+                "tool": tool,
+                "args": args,
+                "error": {"code": "tool_timeout", "message": "Tool did not finish within the latency budget"},
+            })
+        else:
+            results.append(task.result())
+    elapsed = time.perf_counter() - t0
+    metrics.observe("tools.parallel.wall_ms", round(elapsed * 1000, 1))
+    LOG.info("parallel tools n=%s ok=%s wall=%.2fs", len(calls), sum(1 for r in results if r.get("ok")), elapsed)
+    return {
+        "ok": any(r.get("ok") for r in results),
+        "tool": "multi",
+        "partial": not all(r.get("ok") for r in results),
+        "calls": results,
+    }
+
+
+async def run_planned_tool(decision: PlannerDecision, ctx: ToolContext) -> ToolRunOutcome:
+    calls = decision.calls
+    if not calls:
         return ToolRunOutcome(decision=PlannerDecision(action="respond"), tool_payload=None)
 
-    payload = run_tool(decision.tool, decision.args or {}, ctx)
+    if len(calls) == 1:
+        payload = await run_tool(decision.tool, decision.args or {}, ctx)
+    else:
+        payload = await _run_parallel(calls, ctx)
     return ToolRunOutcome(decision=decision, tool_payload=payload)
 
 
+def payload_tools(tool_payload: dict | None) -> list[str]:
+    """Tool names in a (possibly merged) tool payload."""
+    if not tool_payload:
+        return []
+    if tool_payload.get("tool") == "multi":
+        return [c.get("tool") for c in tool_payload.get("calls") or []]
+    return [tool_payload.get("tool")]
+
+
+def render_direct_answer(outcome: ToolRunOutcome, locale: str) -> str | None:
+    """Template answer for a simple single-tool question; None -> final LLM pass."""
+    payload = outcome.tool_payload
+    if not settings.TOOLS_DIRECT_ANSWERS or not outcome.decision.simple or not payload or not payload.get("ok"):
+        return None
+    render = TOOL_ALLOWLIST.get(payload.get("tool"), {}).get("render")
+    if render is None:
+        return None
+    try:
+        return render(payload.get("result") or {}, locale)
+    except Exception:
+        # Unexpected result shape: the LLM can still make sense of it.
+        LOG.exception("direct answer render failed tool=%s", payload.get("tool"))
+        return None
+
+
 def build_final_messages(llm_messages: list[dict], outcome: ToolRunOutcome) -> tuple[list[dict], dict | None]:
     """Phase 2: Create final LLM messages (streamed) including tool results."""
     if outcome.decision.action != "tool_call" or not outcome.tool_payload:
         return llm_messages, None
 
-    tool_name = outcome.tool_payload.get("tool")
-    tool_json = json.dumps(outcome.tool_payload, ensure_ascii=False)
+    tools = payload_tools(outcome.tool_payload)
+    if settings.TOOLS_RESULT_COMPACT:
+        tool_json = dumps(compact_payload(outcome.tool_payload, token_budget=settings.TOOLS_RESULT_TOKEN_BUDGET))
+    else:
+        tool_json = dumps(outcome.tool_payload)
+    metrics.observe("tool_result.tokens", estimate_tokens(tool_json))
 
     instr = (
         "Du bist ein hilfreicher Assistent. Du erhältst TOOL_RESULT_JSON mit Ergebnissen/Fehlern. "
         "Nutze es für die Antwort. Wenn TOOL_RESULT_JSON einen Fehler enthält, erkläre ihn kurz und nenne die nächste Aktion. "
     )
-    if tool_name in ("web_search", "recipe_search"):
+    if settings.TOOLS_RESULT_COMPACT:
+        instr += "Listen sind spaltenweise: gleicher Index = gleicher Eintrag (Ort, Tag, Treffer). "
+    if len(tools) > 1:
+        instr += (
+            "TOOL_RESULT_JSON enthält unter calls mehrere Tool-Ergebnisse; beantworte alle Teile der Frage. "
+            "Fehlt ein Ergebnis (Fehler), sag das für diesen Teil kurz. "
+        )
+    if any(t in ("web_search", "recipe_search") for t in tools):
         instr += (
             "\nWICHTIG: Du MUSST am Ende eine Quellenliste enthalten. Format:\n"
             "Quellen:\n- <Titel> — <URL>\n- ...\n"
         )
+    if "recipe_search" in tools:
+        instr += (
+            "recipes enthält strukturierte Rezepte (Zutaten, Zeiten in Minuten, Portionen, Schritte): "
+            "übernimm Zutaten und Mengen daraus, statt sie zu erfinden.\n"
+        )
 
     sys_msg = {
         "role": "system",
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from backend.core.logging_setup import get_logger
+from backend.db.database import SessionLocal
+from backend.db.models import ToolCacheEntry
+from backend.services import metrics
+
+LOG = get_logger(__name__)
+
+# Two-tier cache for tool results: an in-memory LRU in front of the SQLite
+# table `tool_cache` (survives restarts). Entries younger than `ttl` are
+# served as they are; up to `ttl + stale` they are still served, but a
+# background refresh is started (stale-while-revalidate). Concurrent misses
+# for the same key share one fetch (single-flight).
+
+Fetch = Callable[[], Awaitable[Any]]
+
+_MAX_KEY_CHARS = 200
+# Expired rows are deleted every N writes.
+_PURGE_EVERY = 200
+
+
+def _db_key(key: str) -> str:
+    if len(key) <= _MAX_KEY_CHARS:
+        return key
+    return f"{key[:100]}#{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"
+
+
+class ToolCache:
+    def __init__(
+        self, namespace: str, *, ttl: float, stale: float = 0.0, max_entries: int = 512, max_age: float | None = None
+    ) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale = stale
+        # Longest age any caller may still accept (per-call TTLs), used by purge().
+        self.max_age = max(max_age or 0.0, ttl + stale)
+        self._writes = 0
+        self._max = max_entries
+        self._mem: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._background: set[asyncio.Task] = set()
+
+    # --- memory tier -------------------------------------------------------
+
+    def _mem_get(self, key: str) -> tuple[Any, float] | None:
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                self._mem.move_to_end(key)
+            return item
+
+    def _mem_put(self, key: str, value: Any, fetched_at: float) -> None:
+        with self._lock:
+            self._mem[key] = (value, fetched_at)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self._max:
+                self._mem.popitem(last=False)
+
+    # --- SQLite tier (sync, called in a thread) ----------------------------
+
+    def _load(self, key: str) -> tuple[Any, float] | None:
+        db = SessionLocal()
+        try:
+            row = db.get(ToolCacheEntry, (self.namespace, _db_key(key)))
+            if row is None:
+                return None
+            return json.loads(row.value), row.fetched_at
+        except Exception:
+            LOG.warning("tool cache load failed ns=%s", self.namespace, exc_info=True)
+            return None
+        finally:
+            db.close()
+
+    def _store(self, key: str, value: Any, fetched_at: float) -> None:
+        db = SessionLocal()
+        try:
+            db.merge(
+                ToolCacheEntry(
+                    namespace=self.namespace,
+                    key=_db_key(key),
+                    value=json.dumps(value, ensure_ascii=False),
+                    fetched_at=fetched_at,
+                )
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            LOG.warning("tool cache store failed ns=%s", self.namespace, exc_info=True)
+        finally:
+            db.close()
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            self.purge()
+
+    def purge(self) -> int:
+        """Deletes persisted entries that are too old to be served (sync)."""
+        cutoff = time.time() - self.max_age
+        db = SessionLocal()
+        try:
+            n = (
+                db.query(ToolCacheEntry)
+                .filter(ToolCacheEntry.namespace == self.namespace, ToolCacheEntry.fetched_at < cutoff)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            if n:
+                LOG.info("tool cache purged ns=%s rows=%s", self.namespace, n)
+            return n
+        finally:
+            db.close()
+
+    # --- lookups -----------------------------------------------------------
+
+    async def _lookup(self, key: str) -> tuple[Any, float] | None:
+        item = self._mem_get(key)
+        if item is None:
+            item = await asyncio.to_thread(self._load, key)
+            if item is not None:
+                self._mem_put(key, *item)
+        return item
+
+    async def _fetch_and_store(self, key: str, fetch: Fetch) -> Any:
+        t0 = time.perf_counter()
+        value = await fetch()
+        metrics.observe(f"tool_cache.{self.namespace}.fetch_ms", round((time.perf_counter() - t0) * 1000, 1))
+        fetched_at = time.time()
+        self._mem_put(key, value, fetched_at)
+        await asyncio.to_thread(self._store, key, value, fetched_at)
+        return value
+
+    def _start_fetch(self, key: str, fetch: Fetch) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            metrics.incr(f"tool_cache.{self.namespace}.coalesced")
+            return task
+        task = asyncio.create_task(self._fetch_and_store(key, fetch))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _revalidate(self, key: str, fetch: Fetch) -> None:
+        if key in self._inflight:
+            return
+        task = self._start_fetch(key, fetch)
+        task.add_done_callback(self._log_refresh_error)
+
+    def _record_saved(self, n: int = 1) -> None:
+        # Estimated upstream latency a cache hit saved (mean of the real fetches).
+        avg = metrics.average(f"tool_cache.{self.namespace}.fetch_ms")
+        if avg and n:
+            metrics.incr(f"tool_cache.{self.namespace}.saved_ms_est", round(avg * n, 1))
+
+    def _log_refresh_error(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            metrics.incr(f"tool_cache.{self.namespace}.refresh_failed")
+            LOG.warning("tool cache refresh failed ns=%s: %s", self.namespace, task.exception())
+
+    async def get_or_fetch(self, key: str, fetch: Fetch, *, ttl: float | None = None, stale: float | None = None) -> Any:
+        """Cached value for `key`, calling `fetch()` on a miss (exceptions are not cached)."""
+        ttl = self.ttl if ttl is None else ttl
+        stale = self.stale if stale is None else stale
+        item = await self._lookup(key)
+        if item is not None:
+            value, fetched_at = item
+            age = time.time() - fetched_at
+            if age < ttl:
+                metrics.incr(f"tool_cache.{self.namespace}.hits")
+                self._record_saved()
+                return value
+            if age < ttl + stale:
+                metrics.incr(f"tool_cache.{self.namespace}.stale")
+                self._record_saved()
+                self._revalidate(key, fetch)
+                return value
+        metrics.incr(f"tool_cache.{self.namespace}.misses")
+        # shield: a cancelled caller must not cancel the fetch other callers share.
+        return await asyncio.shield(self._start_fetch(key, fetch))
+
+    async def get_many_or_fetch(self, keys: list[str], fetch_many: Callable[[list[str]], Awaitable[list[Any]]]) -> list[Any]:
+        """Batch variant: all missing keys are fetched with ONE `fetch_many(missing)` call
+        (same order), stale ones are served and revalidated together in the background."""
+        items = await asyncio.gather(*(self._lookup(k) for k in keys))
+        now = time.time()
+        values: dict[str, Any] = {}
+        missing: list[str] = []
+        stale: list[str] = []
+        for key, item in zip(keys, items):
+            age = now - item[1] if item is not None else None
+            if age is not None and age < self.ttl + self.stale:
+                values[key] = item[0]
+                if age >= self.ttl and key not in stale:
+                    stale.append(key)
+            elif key not in missing:
+                missing.append(key)
+        metrics.incr(f"tool_cache.{self.namespace}.hits", len(values) - len(stale))
+        metrics.incr(f"tool_cache.{self.namespace}.stale", len(stale))
+        metrics.incr(f"tool_cache.{self.namespace}.misses", len(missing))
+        self._record_saved(len(values))
+
+        async def fetch_and_store(batch: list[str]) -> list[Any]:
+            t0 = time.perf_counter()
+            fetched = await fetch_many(batch)
+            metrics.observe(f"tool_cache.{self.namespace}.fetch_ms", round((time.perf_counter() - t0) * 1000, 1))
+            fetched_at = time.time()
+            for key, value in zip(batch, fetched):
+                self._mem_put(key, value, fetched_at)
+                await asyncio.to_thread(self._store, key, value, fetched_at)
+            return fetched
+
+        if stale:
+            task = asyncio.create_task(fetch_and_store(stale))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            task.add_done_callback(self._log_refresh_error)
+        if missing:
+            values.update(zip(missing, await fetch_and_store(missing)))
+        return [values[k] for k in keys]
+
+    async def warm(self, key: str, fetch: Fetch, *, max_age: float) -> bool:
+        """Refetches `key` if it is missing or older than `max_age`. Returns True if it fetched."""
+        item = await self._lookup(key)
+        if item is not None and time.time() - item[1] < max_age:
+            return False
+        await asyncio.shield(self._start_fetch(key, fetch))
+        return True
+
+    def stats(self) -> dict:
+        prefix = f"tool_cache.{self.namespace}"
+        served = metrics.get(f"{prefix}.hits") + metrics.get(f"{prefix}.stale")
+        lookups = served + metrics.get(f"{prefix}.misses")
+        with self._lock:
+            return {
+                "memory_entries": len(self._mem),
+                "inflight": len(self._inflight),
+                "ttl": self.ttl,
+                "stale": self.stale,
+                "hit_rate": round(served / lookups, 3) if lookups else None,
+                "saved_ms_est": metrics.get(f"{prefix}.saved_ms_est"),
+            }
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+from backend.services.context_packer import estimate_tokens
+
+LOG = get_logger(__name__)
+
+# TOOL_RESULT_JSON as the final LLM pass sees it. run_tool payloads echo the
+# args, carry ok flags, verbose keys, coordinates and one dict per forecast
+# day / search hit. Here every tool has its own compact shape: redundant
+# fields dropped, lists of records as columns (same index = same record),
+# floats rounded. If the result is still over the token budget, per-tool
+# shrink steps run in priority order (least useful data first) on the
+# largest call until it fits; shrunk calls are marked "truncated".
+
+_UNITS = {"metric": "°C km/h mm", "imperial": "°F mph in"}
+_SNIPPET_CHARS = 160
+_RECIPE_STEPS = 4
+
+
+def _round(value: Any, digits: int = 1) -> Any:
+    if isinstance(value, float):
+        value = round(value, digits)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, dict):
+        return {k: _round(v, digits) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_round(v, digits) for v in value]
+    return value
+
+
+def _columns(items: list[dict], keys: tuple[str, ...], empty: dict[str, Any] | None = None) -> dict[str, list]:
+    """[{a, b}, {a, b}] -> {a: [..], b: [..]}; keys no item has are left out."""
+    empty = empty or {}
+    return {k: [item.get(k, empty.get(k, "")) for item in items] for k in keys if any(k in item for item in items)}
+
+
+# --- per-tool shapes ---------------------------------------------------------
+
+
+def _datetime(r: dict) -> dict:
+    return {"date": r.get("date"), "time": (r.get("time") or "")[:5], "weekday": r.get("weekday"), "tz": r.get("timezone")}
+
+
+def _weather(r: dict) -> dict:
+    units = _UNITS.get(r.get("units"), r.get("units"))
+    if "locations" in r:
+        current = r.get("current") or {}
+        daily = r.get("daily") or {}
+        return {
+            "units": units,
+            "locs": r["locations"],
+            "now": {"time": r.get("current_time"), "temp": current.get("temperature"), "wind": current.get("wind_speed"), "precip": current.get("precipitation")},
+            "dates": r.get("dates") or [],
+            "min": daily.get("temp_min"),
+            "max": daily.get("temp_max"),
+            "precip": daily.get("precipitation_sum"),
+            "wind_max": daily.get("wind_max"),
+            "not_found": r.get("not_found"),
+        }
+    current = r.get("current") or {}
+    days = r.get("forecast") or []
+    return {
+        "loc": (r.get("location") or {}).get("name"),
+        "units": units,
+        "now": {"time": current.get("time"), "temp": current.get("temperature"), "wind": current.get("wind_speed"), "precip": current.get("precipitation")},
+        "dates": [d.get("date") for d in days],
+        "min": [d.get("temp_min") for d in days],
+        "max": [d.get("temp_max") for d in days],
+        "precip": [d.get("precipitation_sum") for d in days],
+        "wind_max": [d.get("wind_max") for d in days],
+    }
+
+
+def _search(r: dict) -> dict:
+    out: dict[str, Any] = {"query": r.get("query")}
+    results = r.get("results") or []
+    if results:
+        out["results"] = _columns(results, ("title", "url", "snippet", "passages"), {"passages": []})
+    if r.get("recipes"):
+        out["recipes"] = r["recipes"]
+    return out
+
+
+_SHAPES: dict[str, Callable[[dict], dict]] = {
+    "get_datetime": _datetime,
+    "get_weather": _weather,
+    "web_search": _search,
+    "recipe_search": _search,
+}
+
+
+# --- shrink steps (mutate, True = something was removed) ---------------------
+
+
+def _drop_passages(c: dict) -> bool:
+    return (c.get("results") or {}).pop("passages", None) is not None
+
+
+def _cut_snippets(c: dict) -> bool:
+    # The cut text ends with "..." and is at most _SNIPPET_CHARS + 3 long, so a
+    # second pass finds nothing to cut (also without spaces: URLs, CJK).
+    snippets = (c.get("results") or {}).get("snippet") or []
+    changed = False
+    for i, s in enumerate(snippets):
+        if len(s) > _SNIPPET_CHARS + 3:
+            cut = s[:_SNIPPET_CHARS]
+            if " " in cut[_SNIPPET_CHARS // 2 :]:
+                cut = cut.rsplit(" ", 1)[0]
+            snippets[i] = cut + "..."
+            changed = True
+    return changed
+
+
+def _drop_last_result(c: dict, keep: int = 1) -> bool:
+    results = c.get("results") or {}
+    if len(results.get("url") or []) <= keep:
+        return False
+    for col in results.values():
+        col.pop()
+    return True
+
+
+def _drop_all_results(c: dict) -> bool:
+    # Recipes are the answer; plain hits only serve as extra sources.
+    return bool(c.get("recipes")) and _drop_last_result(c, keep=0)
+
+
+def _cut_recipe_steps(c: dict) -> bool:
+    changed = False
+    for recipe in c.get("recipes") or []:
+        steps = recipe.get("steps")
+        if steps and len(steps) > _RECIPE_STEPS:
+            recipe["steps"] = steps[:_RECIPE_STEPS]
+            changed = True
+        elif steps:
+            del recipe["steps"]
+            changed = True
+    return changed
+
+
+def _drop_last_recipe(c: dict) -> bool:
+    recipes = c.get("recipes") or []
+    if len(recipes) <= 1:
+        return False
+    recipes.pop()
+    return True
+
+
+def _drop_last_day(c: dict) -> bool:
+    if len(c.get("dates") or []) <= 1:
+        return False
+    c["dates"].pop()
+    many = "locs" in c
+    for col in ("min", "max", "precip", "wind_max"):
+        values = c.get(col)
+        if not values:
+            continue
+        for row in (values if many else [values]):
+            if row:
+                row.pop()
+    return True
+
+
+def _drop_last_location(c: dict) -> bool:
+    if len(c.get("locs") or []) <= 1:
+        return False
+    c["locs"].pop()
+    for col in [*(c.get("now") or {}).values(), *(c.get(k) for k in ("min", "max", "precip", "wind_max"))]:
+        if isinstance(col, list) and col:
+            col.pop()
+    return True
+
+
+_SHRINK_STEPS: dict[str, tuple[Callable[[dict], bool], ...]] = {
+    "web_search": (_drop_passages, _cut_snippets, _drop_last_result),
+    "recipe_search": (_drop_passages, _drop_all_results, _cut_recipe_steps, _drop_last_recipe, _cut_snippets, _drop_last_result),
+    "get_weather": (_drop_last_day, _drop_last_location),
+}
+
+
+def _compact_call(payload: dict) -> dict:
+    tool = payload.get("tool")
+    if not payload.get("ok"):
+        error = payload.get("error") or {}
+        return {"tool": tool, "error": error.get("message") or error.get("code") or "failed"}
+    result = payload.get("result") or {}
+    shape = _SHAPES.get(tool)
+    body = shape(result) if shape else result
+    return {"tool": tool, **_round(body)}
+
+
+def _shrink(call: dict) -> bool:
+    for step in _SHRINK_STEPS.get(call.get("tool"), ()):
+        if step(call):
+            call["truncated"] = True
+            return True
+    return False
+
+
+def dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact_payload(payload: dict, *, token_budget: int) -> dict:
+    """Compact TOOL_RESULT_JSON for a (single or merged multi) tool payload.
+
+    token_budget <= 0 disables the budget (shapes and rounding still apply).
+    """
+    multi = payload.get("tool") == "multi"
+    calls = [_compact_call(c) for c in (payload.get("calls") or [])] if multi else [_compact_call(payload)]
+
+    def wrap() -> dict:
+        if not multi:
+            return calls[0]
+        return {"calls": calls, **({"partial": True} if payload.get("partial") else {})}
+
+    if token_budget > 0:
+        while estimate_tokens(dumps(wrap())) > token_budget:
+            by_size = sorted(calls, key=lambda c: estimate_tokens(dumps(c)), reverse=True)
+            if not any(_shrink(c) for c in by_size):
+                LOG.info("tool result over budget after all shrink steps budget=%s", token_budget)
+                break
+            metrics.incr("tool_result.shrink_steps")
+    return wrap()
@@ -10,4 +10,6 @@ from backend.db.models import User
 @dataclass(frozen=True)
 class ToolContext:
     db: Session
-    user: User
\ No newline at end of file
+    user: User
+    # Last user message (search re-ranking scores results against it).
+    question: str | None = None
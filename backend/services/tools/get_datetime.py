@@ -55,4 +55,13 @@ def run(args: dict, ctx: ToolContext) -> dict:
         "time": now.strftime("%H:%M:%S"),
         "timezone": tz_name,
         "locale": row.locale,
-    }
\ No newline at end of file
+    }
+
+
+def render(result: dict, locale: str) -> str | None:
+    """Direct answer without the final LLM pass (simple questions only)."""
+    date = datetime.fromisoformat(result["date"])
+    hhmm = result["time"][:5]
+    if (locale or "").lower().startswith("de"):
+        return f"Es ist {hhmm} Uhr, {result['weekday']}, der {date.strftime('%d.%m.%Y')}."
+    return f"It is {hhmm} on {result['weekday']}, {date.strftime('%Y-%m-%d')}."
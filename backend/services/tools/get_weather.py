@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime
 from typing import Any
 
@@ -7,12 +8,30 @@ import httpx
 
 from backend.core.config import settings
 from backend.core.logging_setup import get_logger
+from backend.db.database import SessionLocal
 from backend.db.settings_crud import get_admin_settings
+from backend.services.gazetteer import gazetteer
+from backend.services.tools.cache import ToolCache
 from backend.services.tools.context import ToolContext
 from backend.services.tools.errors import ToolError
+from backend.services.tools.get_datetime import _weekday_localized
+from backend.services.tools.http_client import get_client, request_timeout
 
 LOG = get_logger(__name__)
 
+# Place names barely change: geocoding results are kept for weeks. Forecasts
+# are keyed by rounded coordinates (~1 km), units and timezone; Open-Meteo
+# updates them hourly, so older entries are served while a refresh runs.
+geocode_cache = ToolCache(
+    "geocode", ttl=settings.WEATHER_GEOCODE_TTL_SECONDS, max_entries=settings.TOOL_CACHE_MEMORY_ENTRIES
+)
+forecast_cache = ToolCache(
+    "forecast",
+    ttl=settings.WEATHER_FORECAST_TTL_SECONDS,
+    stale=settings.WEATHER_FORECAST_STALE_SECONDS,
+    max_entries=settings.TOOL_CACHE_MEMORY_ENTRIES,
+)
+
 
 def _open_meteo_units(row_units: str) -> dict[str, str]:
     # Open-Meteo accepts explicit units params.
@@ -29,7 +48,7 @@ def _open_meteo_units(row_units: str) -> dict[str, str]:
     }
 
 
-def _geocode_open_meteo(name: str, *, language: str = "de") -> tuple[float, float, str]:
+async def _geocode_open_meteo(name: str, *, language: str = "de") -> tuple[float, float, str]:
     url = "https://geocoding-api.open-meteo.com/v1/search"
     params = {
         "name": name,
@@ -37,11 +56,9 @@ def _geocode_open_meteo(name: str, *, language: str = "de") -> tuple[float, floa
         "language": language,
         "format": "json",
     }
-    timeout = httpx.Timeout(connect=5.0, read=settings.WEATHER_TIMEOUT_SECONDS, write=10.0, pool=10.0)
-    with httpx.Client(timeout=timeout) as client:
-        r = client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json()
+    r = await get_client().get(url, params=params, timeout=request_timeout(settings.WEATHER_TIMEOUT_SECONDS))
+    r.raise_for_status()
+    data = r.json()
 
     results = data.get("results") or []
     if not results:
@@ -60,7 +77,7 @@ def _geocode_open_meteo(name: str, *, language: str = "de") -> tuple[float, floa
     return float(lat), float(lon), ", ".join(parts) if parts else name
 
 
-def _forecast_open_meteo(lat: float, lon: float, *, timezone: str, units: str) -> dict[str, Any]:
+async def _forecast_open_meteo(lat: float, lon: float, *, timezone: str, units: str) -> dict[str, Any]:
     url = "https://api.open-meteo.com/v1/forecast"
     unit_params = _open_meteo_units(units)
     params: dict[str, Any] = {
@@ -73,24 +90,195 @@ def _forecast_open_meteo(lat: float, lon: float, *, timezone: str, units: str) -
     }
     params.update(unit_params)
 
-    timeout = httpx.Timeout(connect=5.0, read=settings.WEATHER_TIMEOUT_SECONDS, write=10.0, pool=10.0)
-    with httpx.Client(timeout=timeout) as client:
-        r = client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
+    r = await get_client().get(url, params=params, timeout=request_timeout(settings.WEATHER_TIMEOUT_SECONDS))
+    r.raise_for_status()
+    return r.json()
+
+
+async def _forecast_open_meteo_many(coords: list[tuple[float, float]], *, timezone: str, units: str) -> list[dict[str, Any]]:
+    """One request for several locations (Open-Meteo takes comma-separated lat/lon lists)."""
+    if len(coords) == 1:
+        return [await _forecast_open_meteo(*coords[0], timezone=timezone, units=units)]
+    url = "https://api.open-meteo.com/v1/forecast"
+    params: dict[str, Any] = {
+        "latitude": ",".join(f"{lat}" for lat, _ in coords),
+        "longitude": ",".join(f"{lon}" for _, lon in coords),
+        "timezone": timezone,
+        "current": "temperature_2m,wind_speed_10m,precipitation",
+        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,wind_speed_10m_max",
+        "forecast_days": 4,
+    }
+    params.update(_open_meteo_units(units))
+
+    r = await get_client().get(url, params=params, timeout=request_timeout(settings.WEATHER_TIMEOUT_SECONDS))
+    r.raise_for_status()
+    data = r.json()
+    # A list with one object per location, in request order.
+    if not isinstance(data, list) or len(data) != len(coords):
+        raise ToolError("Unexpected batched weather response")
+    return data
+
+
+async def _geocode(name: str, *, language: str) -> tuple[float, float, str]:
+    # Offline gazetteer first (microseconds, works without network), then the cached geocoder.
+    place = gazetteer.lookup(name)
+    if place is not None:
+        return place.lat, place.lon, place.display
+    key = f"{language}|{' '.join(name.lower().split())}"
+    lat, lon, resolved_name = await geocode_cache.get_or_fetch(key, lambda: _geocode_open_meteo(name, language=language))
+    return lat, lon, resolved_name
+
+
+def _forecast_key(lat: float, lon: float, *, timezone: str, units: str) -> tuple[str, float, float]:
+    rlat, rlon = round(lat, 2), round(lon, 2)
+    return f"{rlat:.2f},{rlon:.2f}|{units}|{timezone}", rlat, rlon
+
+
+async def _forecast(lat: float, lon: float, *, timezone: str, units: str) -> dict[str, Any]:
+    key, rlat, rlon = _forecast_key(lat, lon, timezone=timezone, units=units)
+    return await forecast_cache.get_or_fetch(key, lambda: _forecast_open_meteo(rlat, rlon, timezone=timezone, units=units))
+
+
+async def _forecast_many(coords: list[tuple[float, float]], *, timezone: str, units: str) -> list[dict[str, Any]]:
+    # Cached per location (same keys as _forecast); all misses share one upstream request.
+    keyed = [_forecast_key(lat, lon, timezone=timezone, units=units) for lat, lon in coords]
+    by_key = {key: (rlat, rlon) for key, rlat, rlon in keyed}
+
+    async def fetch_many(keys: list[str]) -> list[dict[str, Any]]:
+        return await _forecast_open_meteo_many([by_key[k] for k in keys], timezone=timezone, units=units)
+
+    return await forecast_cache.get_many_or_fetch([key for key, _, _ in keyed], fetch_many)
+
+
+def _current(raw: dict[str, Any]) -> dict[str, Any]:
+    current = raw.get("current") or {}
+    return {
+        "time": current.get("time"),
+        "temperature": current.get("temperature_2m"),
+        "wind_speed": current.get("wind_speed_10m"),
+        "precipitation": current.get("precipitation"),
+    }
+
+
+def _days(raw: dict[str, Any], n: int = 3) -> list[dict[str, Any]]:
+    daily = raw.get("daily") or {}
+
+    times = daily.get("time") or []
+    tmax = daily.get("temperature_2m_max") or []
+    tmin = daily.get("temperature_2m_min") or []
+    psum = daily.get("precipitation_sum") or []
+    wmax = daily.get("wind_speed_10m_max") or []
+
+    days = []
+    for i in range(min(n, len(times))):
+        days.append(
+            {
+                "date": times[i],
+                "temp_max": tmax[i] if i < len(tmax) else None,
+                "temp_min": tmin[i] if i < len(tmin) else None,
+                "precipitation_sum": psum[i] if i < len(psum) else None,
+                "wind_max": wmax[i] if i < len(wmax) else None,
+            }
+        )
+    return days
+
+
+async def _run_many(names: list[str], *, language: str, timezone: str, units: str) -> dict:
+    """Several locations: concurrent geocoding, one batched forecast request,
+    columnar result (one list entry per location) so tokens grow slowly."""
+    geo = await asyncio.gather(*(_geocode(n, language=language) for n in names), return_exceptions=True)
+    found = [(name, g) for name, g in zip(names, geo) if not isinstance(g, BaseException)]
+    not_found = [name for name, g in zip(names, geo) if isinstance(g, BaseException)]
+    if not found:
+        raise ToolError(f"Keiner der Orte konnte aufgelöst werden: {', '.join(names)}")
+
+    t0 = datetime.utcnow()
+    try:
+        raws = await _forecast_many([(lat, lon) for _, (lat, lon, _) in found], timezone=timezone, units=units)
+    except ToolError:
+        raise
+    except httpx.TimeoutException:
+        raise ToolError("Weather request timeout")
+    except Exception as e:
+        LOG.exception("Weather request failed")
+        raise ToolError("Weather request failed") from e
+    finally:
+        dt_ms = int((datetime.utcnow() - t0).total_seconds() * 1000)
+        LOG.info("tool=get_weather locations=%s duration_ms=%s", len(found), dt_ms)
+
+    currents = [_current(raw) for raw in raws]
+    days = [_days(raw) for raw in raws]
+    result: dict[str, Any] = {
+        "timezone": timezone,
+        "units": units,
+        "locations": [resolved for _, (_, _, resolved) in found],
+        "current_time": currents[0]["time"],
+        "current": {col: [c[col] for c in currents] for col in ("temperature", "wind_speed", "precipitation")},
+        "dates": [d["date"] for d in days[0]],
+        "daily": {
+            col: [[d[col] for d in loc_days] for loc_days in days]
+            for col in ("temp_max", "temp_min", "precipitation_sum", "wind_max")
+        },
+    }
+    if not_found:
+        result["not_found"] = not_found
+    return result
+
 
+def _default_location() -> tuple[float, float, str, str] | None:
+    db = SessionLocal()
+    try:
+        row = get_admin_settings(db)
+        if row.default_lat is None or row.default_lon is None:
+            return None
+        return float(row.default_lat), float(row.default_lon), row.timezone or "Europe/Berlin", row.units or "metric"
+    finally:
+        db.close()
 
-def run(args: dict, ctx: ToolContext) -> dict:
-    row = get_admin_settings(ctx.db)
+
+async def refresh_loop() -> None:
+    """Keeps the default location's forecast warm, so most weather questions
+    are answered without an outbound request (started in main.py)."""
+    while True:
+        try:
+            default = await asyncio.to_thread(_default_location)
+            if default is not None:
+                lat, lon, tz, units = default
+                key, rlat, rlon = _forecast_key(lat, lon, timezone=tz, units=units)
+                fetched = await forecast_cache.warm(
+                    key,
+                    lambda: _forecast_open_meteo(rlat, rlon, timezone=tz, units=units),
+                    max_age=settings.WEATHER_FORECAST_TTL_SECONDS * 0.75,
+                )
+                if fetched:
+                    LOG.info("weather refresh: default forecast updated key=%s", key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOG.warning("weather refresh failed: %s", e)
+        await asyncio.sleep(settings.WEATHER_REFRESH_INTERVAL_SECONDS)
+
+
+async def run(args: dict, ctx: ToolContext) -> dict:
+    row = await asyncio.to_thread(get_admin_settings, ctx.db)
 
     location = (args or {}).get("location")
     location = location.strip() if isinstance(location, str) else None
 
     tz = row.timezone or "Europe/Berlin"
     units = row.units or "metric"
+    language = (row.locale or "de").split("-")[0] or "de"
+
+    names = list(dict.fromkeys(n.strip() for n in (args or {}).get("locations") or [] if isinstance(n, str) and n.strip()))
+    if location and location not in names and names:
+        names.insert(0, location)
+    if len(names) > 1:
+        return await _run_many(names, language=language, timezone=tz, units=units)
+    if names:
+        location = names[0]
 
     if location:
-        lat, lon, resolved_name = _geocode_open_meteo(location, language=(row.locale or "de").split("-")[0] or "de")
+        lat, lon, resolved_name = await _geocode(location, language=language)
     else:
         if row.default_lat is None or row.default_lon is None:
             raise ToolError(
@@ -102,7 +290,7 @@ def run(args: dict, ctx: ToolContext) -> dict:
 
     t0 = datetime.utcnow()
     try:
-        raw = _forecast_open_meteo(lat, lon, timezone=tz, units=units)
+        raw = await _forecast(lat, lon, timezone=tz, units=units)
     except httpx.TimeoutException:
         raise ToolError("Weather request timeout")
     except Exception as e:
@@ -112,27 +300,6 @@ def run(args: dict, ctx: ToolContext) -> dict:
         dt_ms = int((datetime.utcnow() - t0).total_seconds() * 1000)
         LOG.info("tool=get_weather lat=%s lon=%s duration_ms=%s", lat, lon, dt_ms)
 
-    current = raw.get("current") or {}
-    daily = raw.get("daily") or {}
-
-    times = daily.get("time") or []
-    tmax = daily.get("temperature_2m_max") or []
-    tmin = daily.get("temperature_2m_min") or []
-    psum = daily.get("precipitation_sum") or []
-    wmax = daily.get("wind_speed_10m_max") or []
-
-    days = []
-    for i in range(min(3, len(times))):
-        days.append(
-            {
-                "date": times[i],
-                "temp_max": tmax[i] if i < len(tmax) else None,
-                "temp_min": tmin[i] if i < len(tmin) else None,
-                "precipitation_sum": psum[i] if i < len(psum) else None,
-                "wind_max": wmax[i] if i < len(wmax) else None,
-            }
-        )
-
     return {
         "location": {
             "name": resolved_name,
@@ -141,11 +308,76 @@ def run(args: dict, ctx: ToolContext) -> dict:
         },
         "timezone": tz,
         "units": units,
-        "current": {
-            "time": current.get("time"),
-            "temperature": current.get("temperature_2m"),
-            "wind_speed": current.get("wind_speed_10m"),
-            "precipitation": current.get("precipitation"),
-        },
-        "forecast": days,
-    }
\ No newline at end of file
+        "current": _current(raw),
+        "forecast": _days(raw),
+    }
+
+
+# --- direct answers (simple questions, no final LLM pass) -------------------
+
+_UNIT_LABELS = {
+    "metric": ("°C", "km/h", "mm"),
+    "imperial": ("°F", "mph", "in"),
+}
+
+
+def _num(value: float | None, de: bool, digits: int = 1) -> str:
+    if value is None:
+        return "?"
+    text = f"{value:.{digits}f}"
+    return text.replace(".", ",") if de else text
+
+
+def _day_label(i: int, date: str, de: bool) -> str:
+    if i < 2:
+        return ("Heute", "Morgen")[i] if de else ("Today", "Tomorrow")[i]
+    weekday = datetime.fromisoformat(date).strftime("%A")
+    return _weekday_localized(weekday, "de" if de else "en")
+
+
+def _day_text(label: str, tmin, tmax, psum, wmax, de: bool, units: tuple[str, str, str]) -> str:
+    deg, speed, rain = units
+    parts = [f"{label}: {_num(tmin, de, 0)}–{_num(tmax, de, 0)} {deg}"]
+    if psum:
+        parts.append(f"{_num(psum, de)} {rain} {'Niederschlag' if de else 'precipitation'}")
+    elif psum is not None:
+        parts.append("trocken" if de else "dry")
+    if wmax is not None:
+        parts.append(f"{'Wind bis' if de else 'wind up to'} {_num(wmax, de, 0)} {speed}")
+    return ", ".join(parts)
+
+
+def render(result: dict, locale: str) -> str | None:
+    """Direct answer without the final LLM pass (simple questions only)."""
+    de = (locale or "").lower().startswith("de")
+    units = _UNIT_LABELS.get(result.get("units"), _UNIT_LABELS["metric"])
+    deg, speed, _ = units
+
+    if "locations" in result:
+        lines = []
+        for i, name in enumerate(result["locations"]):
+            temp = result["current"]["temperature"][i]
+            days = []
+            for d, date in enumerate(result["dates"][:2]):
+                values = [result["daily"][col][i][d] for col in ("temp_min", "temp_max", "precipitation_sum", "wind_max")]
+                days.append(_day_text(_day_label(d, date, de), *values, de, units))
+            lines.append(f"- {name}: {'aktuell' if de else 'now'} {_num(temp, de)} {deg}; " + "; ".join(days))
+        if result.get("not_found"):
+            lines.append(f"{'Nicht gefunden' if de else 'Not found'}: {', '.join(result['not_found'])}")
+        return ("Wetter:\n" if de else "Weather:\n") + "\n".join(lines)
+
+    current = result.get("current") or {}
+    if current.get("temperature") is None:
+        return None
+    head = (
+        f"{'Wetter in' if de else 'Weather in'} {result['location']['name']}: "
+        f"{'aktuell' if de else 'currently'} {_num(current['temperature'], de)} {deg}, "
+        f"{'Wind' if de else 'wind'} {_num(current.get('wind_speed'), de, 0)} {speed}"
+    )
+    if current.get("precipitation"):
+        head += f", {'Niederschlag' if de else 'precipitation'} {_num(current['precipitation'], de)} {units[2]}"
+    days = [
+        "- " + _day_text(_day_label(i, d["date"], de), d["temp_min"], d["temp_max"], d["precipitation_sum"], d["wind_max"], de, units)
+        for i, d in enumerate(result.get("forecast") or [])
+    ]
+    return "\n".join([head + ".", *days])
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import importlib.util
+
+import httpx
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+
+LOG = get_logger(__name__)
+
+# One pooled client for all tool HTTP calls (Open-Meteo, SearXNG, ...), so
+# repeated calls reuse keep-alive connections instead of paying a TLS
+# handshake each time. HTTP/2 (multiplexing) needs the optional `h2`
+# package (`pip install httpx[http2]`); without it the client uses HTTP/1.1.
+# Timeouts are set per request by the tools.
+
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = settings.TOOLS_HTTP2 and _HTTP2_AVAILABLE
+        if settings.TOOLS_HTTP2 and not _HTTP2_AVAILABLE:
+            LOG.info("Tool HTTP client: h2 not installed, using HTTP/1.1")
+        _client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=settings.TOOLS_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TOOLS_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=90.0,
+            ),
+            headers={"User-Agent": "AI-Voice-Assistant/1.0"},
+            follow_redirects=True,
+        )
+    return _client
+
+
+def request_timeout(read: float) -> httpx.Timeout:
+    return httpx.Timeout(connect=5.0, read=read, write=10.0, pool=10.0)
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
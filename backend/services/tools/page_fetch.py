@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import asyncio
+import codecs
+import hashlib
+import ipaddress
+import json
+import re
+import socket
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+from backend.services.context_packer import estimate_tokens
+from backend.services.rerank import BM25
+from backend.services.tools.http_client import get_client
+
+LOG = get_logger(__name__)
+
+# Optional fetch stage for web_search (SEARCH_FETCH_PAGES > 0): the top
+# results are downloaded concurrently with strict limits (bytes, time,
+# content type), parsed incrementally while streaming, split into passages,
+# and only the best passages for the question (BM25) within a token budget go
+# to the LLM. Extracted text (and JSON-LD, for structured data such as
+# recipes) is cached on disk per URL; stale entries are revalidated with
+# If-None-Match / If-Modified-Since.
+
+_ALLOWED_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+_SKIP_TAGS = frozenset({"script", "style", "noscript", "template", "svg", "nav", "footer", "header", "aside", "form", "iframe", "button"})
+_BLOCK_TAGS = frozenset(
+    {"p", "div", "li", "ul", "ol", "tr", "table", "section", "article", "main", "h1", "h2", "h3", "h4", "h5", "h6",
+     "br", "dd", "dt", "blockquote", "pre", "figcaption", "caption", "summary", "details"}
+)
+_CELL_TAGS = frozenset({"td", "th"})
+_WS_RE = re.compile(r"\s+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_PASSAGE_CHARS = 500
+_REDIRECT_CODES = frozenset({301, 302, 303, 307, 308})
+_MAX_REDIRECTS = 3
+_MIN_BLOCK_CHARS = 25
+
+
+class TextExtractor(HTMLParser):
+    """Streaming HTML -> text blocks (no DOM): fed chunk by chunk, skips
+    script/style/navigation, starts a new block at block-level tags.
+    JSON-LD scripts are collected raw in `json_ld`."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[str] = []
+        self._current: list[str] = []
+        self._skip_depth = 0
+        self.title = ""
+        self._in_title = False
+        self.json_ld: list[str] = []
+        self._ld: list[str] | None = None
+
+    def _flush(self) -> None:
+        text = _WS_RE.sub(" ", "".join(self._current)).strip(" |")
+        self._current = []
+        if len(text) >= _MIN_BLOCK_CHARS:
+            self.blocks.append(text)
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag == "script" and (dict(attrs).get("type") or "").strip().lower() == "application/ld+json":
+            self._ld = []
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if tag == "title":
+            self._in_title = True
+        if tag in _BLOCK_TAGS:
+            self._flush()
+        elif tag in _CELL_TAGS:
+            self._current.append(" | ")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "script" and self._ld is not None:
+            self.json_ld.append("".join(self._ld))
+            self._ld = None
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if tag == "title":
+            self._in_title = False
+        if tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data: str) -> None:
+        if self._ld is not None:
+            self._ld.append(data)
+        elif self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self._current.append(data)
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+
+
+def _parse_json_ld(raw: list[str]) -> list:
+    items = []
+    for text in raw:
+        try:
+            items.append(json.loads(text))
+        except ValueError:
+            metrics.incr("page_fetch.bad_json_ld")
+    return items
+
+
+def split_passages(blocks: list[str], max_chars: int = _PASSAGE_CHARS) -> list[str]:
+    """Joins short blocks and splits long ones (at sentence ends) into ~max_chars passages."""
+    passages: list[str] = []
+    current = ""
+    for block in blocks:
+        parts = [block] if len(block) <= max_chars else _SENTENCE_RE.split(block)
+        for part in parts:
+            while len(part) > max_chars:
+                cut = part.rfind(" ", 0, max_chars)
+                cut = cut if cut > max_chars // 2 else max_chars
+                if current:
+                    passages.append(current)
+                    current = ""
+                passages.append(part[:cut].strip())
+                part = part[cut:].strip()
+            if current and len(current) + len(part) + 1 > max_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current} {part}".strip()
+    if current:
+        passages.append(current)
+    return passages
+
+
+def _public_http_url(url: str) -> bool:
+    # Result URLs come from the internet: no internal addresses (unless allowed,
+    # e.g. for tests against a local server). Literal check only; DNS names
+    # are resolved per hop in _allowed_target.
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    if settings.SEARCH_FETCH_ALLOW_PRIVATE:
+        return True
+    host = parts.hostname
+    if host == "localhost" or host.endswith(".local") or host.endswith(".internal"):
+        return False
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return True
+    return ip.is_global
+
+
+async def _allowed_target(url: str) -> bool:
+    """Literal check plus DNS: every address the host resolves to must be global."""
+    if not _public_http_url(url):
+        return False
+    if settings.SEARCH_FETCH_ALLOW_PRIVATE:
+        return True
+    parts = urlsplit(url)
+    try:
+        ipaddress.ip_address(parts.hostname)
+        return True  # literal IP, already checked
+    except ValueError:
+        pass
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, parts.port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM
+        )
+    except OSError:
+        return False
+    # (The connection resolves again; a rebinding DNS server could still answer
+    # differently in between. Good enough for search result pages.)
+    return bool(infos) and all(ipaddress.ip_address(info[4][0].split("%")[0]).is_global for info in infos)
+
+
+class PageCache:
+    """Extracted page text on disk, one JSON file per URL (with ETag/Last-Modified)."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def _path(self, url: str) -> Path:
+        return self.directory / f"{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+    def get(self, url: str) -> dict | None:
+        try:
+            with self._path(url).open(encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, entry: dict) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self._path(url).with_suffix(".tmp")
+            tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self._path(url))
+        except OSError as e:
+            LOG.warning("page cache write failed: %s", e)
+
+
+page_cache = PageCache(Path(settings.DB_DIR) / "page_cache")
+
+
+async def _download(url: str, cached: dict | None) -> dict | None:
+    """Fetches one page, following redirects manually so every hop is checked
+    against private addresses. Returns the cache entry, or None if skipped."""
+    headers = {"Accept": "text/html,application/xhtml+xml,text/plain;q=0.8"}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    timeout = httpx.Timeout(settings.SEARCH_FETCH_TIMEOUT_SECONDS, connect=min(3.0, settings.SEARCH_FETCH_TIMEOUT_SECONDS))
+    target = url
+    for _ in range(_MAX_REDIRECTS + 1):
+        if not await _allowed_target(target):
+            metrics.incr("page_fetch.blocked")
+            LOG.info("page fetch blocked url=%s target=%s", url, target)
+            return None
+        async with get_client().stream("GET", target, headers=headers, timeout=timeout, follow_redirects=False) as r:
+            location = r.headers.get("location")
+            if r.status_code in _REDIRECT_CODES and location:
+                target = urljoin(str(r.url), location)
+                continue
+            return await _read(url, r, cached)
+    metrics.incr("page_fetch.too_many_redirects")
+    return None
+
+
+async def _read(url: str, r: httpx.Response, cached: dict | None) -> dict | None:
+    """Streams and parses the final response of a page fetch."""
+    if r.status_code == 304 and cached:
+        metrics.incr("page_fetch.not_modified")
+        return {**cached, "fetched_at": time.time()}
+    if r.status_code != 200:
+        metrics.incr("page_fetch.skipped_status")
+        return None
+    content_type = r.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in _ALLOWED_TYPES:
+        metrics.incr("page_fetch.skipped_type")
+        return None
+    length = r.headers.get("content-length")
+    if length and length.isdigit() and int(length) > settings.SEARCH_FETCH_MAX_BYTES * 4:
+        metrics.incr("page_fetch.skipped_size")
+        return None
+
+    try:
+        decoder = codecs.getincrementaldecoder(r.charset_encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = TextExtractor()
+    plain: list[str] = []
+    received = 0
+    async for chunk in r.aiter_bytes():
+        chunk = chunk[: settings.SEARCH_FETCH_MAX_BYTES - received]  # one read can be far larger than the cap
+        received += len(chunk)
+        text = decoder.decode(chunk)
+        if content_type == "text/plain":
+            plain.append(text)
+        else:
+            parser.feed(text)
+        if received >= settings.SEARCH_FETCH_MAX_BYTES:
+            metrics.incr("page_fetch.truncated")
+            break
+    if content_type == "text/plain":
+        paragraphs = "".join(plain).split("\n\n")
+        parser.blocks = [_WS_RE.sub(" ", p).strip() for p in paragraphs if len(p.strip()) >= _MIN_BLOCK_CHARS]
+    else:
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+
+    metrics.observe("page_fetch.bytes", received)
+    return {
+        "url": url,
+        "etag": r.headers.get("etag"),
+        "last_modified": r.headers.get("last-modified"),
+        "fetched_at": time.time(),
+        "blocks": parser.blocks,
+        "json_ld": _parse_json_ld(parser.json_ld),
+    }
+
+
+async def _page(url: str, sem: asyncio.Semaphore) -> dict | None:
+    cached = await asyncio.to_thread(page_cache.get, url)
+    if cached and time.time() - cached.get("fetched_at", 0) < settings.SEARCH_PAGE_CACHE_TTL_SECONDS:
+        metrics.incr("page_fetch.cache_hits")
+        return cached
+    async with sem:
+        t0 = time.perf_counter()
+        try:
+            entry = await asyncio.wait_for(_download(url, cached), settings.SEARCH_FETCH_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, httpx.HTTPError) as e:
+            metrics.incr("page_fetch.failed")
+            LOG.info("page fetch failed url=%s: %s", url, type(e).__name__)
+            return None
+        finally:
+            metrics.observe("page_fetch.ms", round((time.perf_counter() - t0) * 1000, 1))
+    if entry is not None:
+        await asyncio.to_thread(page_cache.put, url, entry)
+    return entry
+
+
+async def fetch_pages(urls: list[str]) -> dict[str, dict]:
+    """Page entries (blocks, json_ld, ...) by URL, concurrently; skipped/failed URLs are missing."""
+    urls = [u for u in dict.fromkeys(urls) if u and _public_http_url(u)]
+    if not urls:
+        return {}
+    sem = asyncio.Semaphore(settings.SEARCH_FETCH_CONCURRENCY)
+    pages = await asyncio.gather(*(_page(u, sem) for u in urls))
+    return {url: page for url, page in zip(urls, pages) if page is not None}
+
+
+async def fetch_passages(results: list[dict], query: str, *, token_budget: int) -> dict[str, list[str]]:
+    """Best passages per result URL for `query`, at most `token_budget` tokens in total."""
+    pages = await fetch_pages([r.get("url") for r in results])
+    candidates = [(url, p) for url, page in pages.items() for p in split_passages(page.get("blocks") or [])]
+    if not candidates:
+        return {}
+    scores = BM25([p for _, p in candidates]).scores(query)
+    picked: dict[str, list[str]] = {}
+    used = 0
+    for i in sorted(range(len(candidates)), key=lambda i: -scores[i]):
+        if scores[i] <= 0:
+            break
+        url, passage = candidates[i]
+        cost = estimate_tokens(passage)
+        if used + cost > token_budget:
+            continue
+        picked.setdefault(url, []).append(passage)
+        used += cost
+    metrics.observe("page_fetch.passage_tokens", used)
+    return picked
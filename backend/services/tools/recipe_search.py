@@ -1,21 +1,64 @@
 from __future__ import annotations
 
+import asyncio
+import time
+
+from backend.core.config import settings
+from backend.core.logging_setup import get_logger
+from backend.services import metrics
+from backend.services.recipe_index import compact, extract_recipes, recipe_index
 from backend.services.tools.context import ToolContext
+from backend.services.tools.page_fetch import fetch_pages
 from backend.services.tools.web_search import run as web_search_run
 
+LOG = get_logger(__name__)
+
+
+async def _extract_and_index(results: list[dict]) -> list[dict]:
+    """schema.org Recipe records from the top result pages; new ones go into the index."""
+    pages = await fetch_pages([r.get("url") for r in results[: settings.RECIPE_FETCH_PAGES]])
+    records = [rec for url, page in pages.items() for rec in extract_recipes(page.get("json_ld") or [], url)]
+    if records:
+        await asyncio.to_thread(recipe_index.add, records)
+    return records
 
-def run(args: dict, ctx: ToolContext) -> dict:
+
+async def run(args: dict, ctx: ToolContext) -> dict:
     query = (args or {}).get("query")
     if isinstance(query, str):
         query = query.strip()
     else:
         query = ""
 
-    # Keep it simple: rely on the configured search backend.
     # The LLM must produce the final recipe answer and include sources.
     search_query = query if query.lower().startswith("rezept") else f"Rezept {query}".strip()
 
-    res = web_search_run({"query": search_query, "max_results": 5}, ctx)
+    if settings.RECIPE_INDEX_ENABLED and query:
+        t0 = time.perf_counter()
+        hits = await asyncio.to_thread(recipe_index.search, query, settings.RECIPE_MAX_RESULTS)
+        metrics.observe("recipe_index.lookup_ms", round((time.perf_counter() - t0) * 1000, 2))
+        if len(hits) >= settings.RECIPE_INDEX_MIN_MATCHES:
+            metrics.incr("recipe_index.hits")
+            LOG.info("tool=recipe_search source=index recipes=%s", len(hits))
+            return {
+                "query": search_query,
+                "engine": "recipe_index",
+                "recipes": [compact(r, settings.RECIPE_MAX_STEPS) for r in hits],
+                "results": [],
+                "original_query": query,
+                "tool": "recipe_search",
+            }
+        metrics.incr("recipe_index.misses")
+
+    res = await web_search_run({"query": search_query, "max_results": 5}, ctx)
+    if settings.RECIPE_INDEX_ENABLED:
+        recipes = (await _extract_and_index(res["results"]))[: settings.RECIPE_MAX_RESULTS]
+        if recipes:
+            # Structured records replace the snippets of the same pages.
+            urls = {r["url"] for r in recipes}
+            res["recipes"] = [compact(r, settings.RECIPE_MAX_STEPS) for r in recipes]
+            res["results"] = [r for r in res["results"] if r["url"] not in urls]
+        LOG.info("tool=recipe_search source=web recipes=%s", len(recipes))
     res["original_query"] = query
     res["tool"] = "recipe_search"
-    return res
\ No newline at end of file
+    return res
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import asyncio
+import inspect
 import time
-from typing import Any, Callable
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Union
 
 from pydantic import BaseModel, Field
 
+from backend.core.config import settings
 from backend.core.logging_setup import get_logger
 from backend.services.tools.context import ToolContext
 from backend.services.tools.errors import ToolError
@@ -29,6 +33,8 @@ class GetDateTimeArgs(_BaseArgs):
 
 class GetWeatherArgs(_BaseArgs):
     location: str | None = None
+    # Several places in one call (one batched forecast request).
+    locations: list[str] | None = Field(default=None, max_length=10)
 
 
 class WebSearchArgs(_BaseArgs):
@@ -40,29 +46,88 @@ class RecipeSearchArgs(_BaseArgs):
     query: str
 
 
-ToolFn = Callable[[dict, ToolContext], dict]
+# Tools are either `async def run(args, ctx)` (HTTP tools, shared client) or
+# legacy sync functions, which run in the default thread pool.
+ToolFn = Callable[[dict, ToolContext], Union[dict, Awaitable[dict]]]
+# Optional "render": (result, locale) -> answer text or None. Used instead of the
+# final LLM pass when the planner marked the question as simple.
+RenderFn = Callable[[dict, str], Union[str, None]]
 
 
 TOOL_ALLOWLIST: dict[str, dict[str, Any]] = {
     "get_datetime": {
+        "description": "Aktuelles Datum, Uhrzeit und Wochentag (lokale Zeitzone).",
         "args_model": GetDateTimeArgs,
         "fn": tool_get_datetime.run,
+        "render": tool_get_datetime.render,
+        "timeout": 5.0,
+        "concurrency": 16,
     },
     "get_weather": {
+        "description": (
+            "Aktuelles Wetter und 3-Tage-Vorhersage. Ohne location: Standardort aus den Settings. "
+            "Mehrere Orte vergleichen: locations (Liste) in einem Call."
+        ),
         "args_model": GetWeatherArgs,
         "fn": tool_get_weather.run,
+        "render": tool_get_weather.render,
+        # geocoding + forecast
+        "timeout": 2 * settings.WEATHER_TIMEOUT_SECONDS,
+        "concurrency": 8,
     },
     "web_search": {
+        "description": "Websuche (SearXNG) für aktuelle Nachrichten, Feiertage, Ferien, Events und Fakten.",
         "args_model": WebSearchArgs,
         "fn": tool_web_search.run,
+        "timeout": settings.SEARCH_TIMEOUT_SECONDS + settings.SEARCH_FETCH_TIMEOUT_SECONDS + 3.0,
+        "concurrency": 4,  # one SearXNG instance
     },
     "recipe_search": {
+        "description": "Rezeptsuche im Web. Die Antwort muss Quellen enthalten.",
         "args_model": RecipeSearchArgs,
         "fn": tool_recipe_search.run,
+        # search (+ optional passages) and the recipe page fetch run one after the other
+        "timeout": settings.SEARCH_TIMEOUT_SECONDS + 2 * settings.SEARCH_FETCH_TIMEOUT_SECONDS + 3.0,
+        "concurrency": 4,
     },
 }
 
 
+def _compact_schema(schema: Any) -> Any:
+    # pydantic adds "title" everywhere and renders `str | None` as anyOf+null;
+    # both only cost prompt tokens (optional = not in "required").
+    if isinstance(schema, dict):
+        any_of = schema.get("anyOf")
+        if isinstance(any_of, list):
+            non_null = [s for s in any_of if s != {"type": "null"}]
+            if len(non_null) == 1:
+                schema = {**{k: v for k, v in schema.items() if k != "anyOf"}, **non_null[0]}
+        return {k: _compact_schema(v) for k, v in schema.items() if k != "title" and not (k == "default" and v is None)}
+    if isinstance(schema, list):
+        return [_compact_schema(v) for v in schema]
+    return schema
+
+
+@lru_cache(maxsize=1)
+def tool_schemas() -> list[dict]:
+    """Ollama/OpenAI-style `tools` array generated from the args models."""
+    out = []
+    for name, spec in TOOL_ALLOWLIST.items():
+        params = _compact_schema(spec["args_model"].model_json_schema())
+        params.setdefault("properties", {})
+        out.append(
+            {
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "description": spec.get("description", ""),
+                    "parameters": params,
+                },
+            }
+        )
+    return out
+
+
 def validate_tool_call(tool: str, args: Any) -> tuple[str, dict]:
     if tool not in TOOL_ALLOWLIST:
         raise ToolError(f"Tool not allowlisted: {tool}")
@@ -79,18 +144,36 @@ def validate_tool_call(tool: str, args: Any) -> tuple[str, dict]:
     return tool, m.model_dump()
 
 
-def run_tool(tool: str, args: dict, ctx: ToolContext) -> dict:
-    """Run tool with validation + logging.
+_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+def _semaphore(tool: str) -> asyncio.Semaphore:
+    sem = _semaphores.get(tool)
+    if sem is None:
+        sem = _semaphores[tool] = asyncio.Semaphore(TOOL_ALLOWLIST[tool].get("concurrency", 4))
+    return sem
+
+
+async def _call(fn: ToolFn, args: dict, ctx: ToolContext) -> dict:
+    if inspect.iscoroutinefunction(fn):
+        return await fn(args, ctx)
+    return await asyncio.to_thread(fn, args, ctx)
+
+
+async def run_tool(tool: str, args: dict, ctx: ToolContext) -> dict:
+    """Run tool with validation + logging, a timeout and a per-tool concurrency limit.
 
     Returns a dict that is safe to show to end-users / LLM.
     """
     tool, args = validate_tool_call(tool, args)
-    fn: ToolFn = TOOL_ALLOWLIST[tool]["fn"]
+    spec = TOOL_ALLOWLIST[tool]
+    fn: ToolFn = spec["fn"]
 
     start = time.perf_counter()
     ok_flag: bool | None = None
     try:
-        result = fn(args, ctx)
+        async with _semaphore(tool):
+            result = await asyncio.wait_for(_call(fn, args, ctx), spec.get("timeout", 15.0))
         if not isinstance(result, dict):
             raise ToolError(f"Tool {tool} returned non-object result")
         ok_flag = True
@@ -100,6 +183,17 @@ def run_tool(tool: str, args: dict, ctx: ToolContext) -> dict:
             "args": args,
             "result": result,
         }
+    except asyncio.TimeoutError:
+        ok_flag = False
+        return {
+            "ok": False,
+            "tool": tool,
+            "args": args,
+            "error": {
+                "code": "tool_timeout",
+                "message": f"Tool {tool} timed out",
+            },
+        }
     except ToolError as te:
         ok_flag = False
         return {
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import re
 from datetime import datetime
 from urllib.parse import urljoin
 
@@ -7,11 +9,125 @@ import httpx
 
 from backend.core.config import settings
 from backend.core.logging_setup import get_logger
+from backend.services.rerank import BM25, canonical_url
+from backend.services.tools.cache import ToolCache
 from backend.services.tools.context import ToolContext
 from backend.services.tools.errors import ToolError
+from backend.services.tools.http_client import get_client, request_timeout
+from backend.services.tools.page_fetch import fetch_passages
 
 LOG = get_logger(__name__)
 
+_LANGUAGE = "de"
+
+# Results are cached per (language, max_results, normalized query); identical
+# concurrent queries share one SearXNG request. TTL depends on the query class.
+search_cache = ToolCache(
+    "search",
+    ttl=settings.SEARCH_CACHE_TTL_SECONDS,
+    max_entries=settings.TOOL_CACHE_MEMORY_ENTRIES,
+    max_age=max(settings.SEARCH_CACHE_TTL_NEWS_SECONDS, settings.SEARCH_CACHE_TTL_RECIPE_SECONDS),
+)
+
+_NEWS_RE = re.compile(
+    r"\b(news|nachrichten|aktuell\w*|heute|gestern|live|breaking|ergebnis(se)?|spielstand|börse|kurs|wahl\w*|\d{1,2}\.\d{1,2}\.)",
+    re.IGNORECASE,
+)
+_RECIPE_RE = re.compile(r"\b(rezept\w*|recipe\w*|zubereitung|kochen|backen)\b", re.IGNORECASE)
+
+
+def query_class(query: str) -> str:
+    if _NEWS_RE.search(query):
+        return "news"
+    if _RECIPE_RE.search(query):
+        return "recipe"
+    return "default"
+
+
+_CLASS_TTL = {
+    "news": lambda: settings.SEARCH_CACHE_TTL_NEWS_SECONDS,
+    "recipe": lambda: settings.SEARCH_CACHE_TTL_RECIPE_SECONDS,
+    "default": lambda: settings.SEARCH_CACHE_TTL_SECONDS,
+}
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().strip(" ?!.").split())
+
+
+# Fan-out mode: a few query variants run concurrently; their results are merged,
+# deduped by canonical URL, re-ranked with BM25 against the user question and
+# cut to a character budget.
+_FANOUT_CANDIDATES = 8  # results fetched per variant
+# Hyphenated names ("Rheinland-Pfalz") first; German capitalizes every noun,
+# so runs of capitalized words ("Tatort Münster") are only the fallback.
+_HYPHEN_NAME_RE = re.compile(r"\b[A-ZÄÖÜ][\wäöüß]+(?:-[A-ZÄÖÜ][\wäöüß]+)+")
+_CAPITALIZED_RUN_RE = re.compile(r"\b[A-ZÄÖÜ][\wäöüß]+(?:\s+[A-ZÄÖÜ][\wäöüß]+)+")
+_MIN_SNIPPET_CHARS = 120
+
+
+def query_variants(query: str) -> list[tuple[str, str]]:
+    """(query, language) pairs: original, original without language filter,
+    and the longest named entity quoted (exact phrase) if there is one."""
+    variants = [(query, _LANGUAGE), (query, "all")]
+    if '"' not in query:
+        entities = sorted(_HYPHEN_NAME_RE.findall(query) or _CAPITALIZED_RUN_RE.findall(query), key=len, reverse=True)
+        if entities and entities[0] != query:
+            variants.append((query.replace(entities[0], f'"{entities[0]}"', 1), _LANGUAGE))
+    return variants
+
+
+def _merge(result_lists: list[list[dict]]) -> list[tuple[dict, int]]:
+    """Deduped by canonical URL; keeps the longest snippet and the best original rank."""
+    merged: dict[str, tuple[dict, int]] = {}
+    for results in result_lists:
+        for rank, item in enumerate(results):
+            key = canonical_url(item["url"]) if item["url"] else item["title"]
+            seen = merged.get(key)
+            if seen is None:
+                merged[key] = (item, rank)
+                continue
+            best = item if len(item["snippet"]) > len(seen[0]["snippet"]) else seen[0]
+            merged[key] = (best, min(rank, seen[1]))
+    return list(merged.values())
+
+
+def _within_budget(ranked: list[dict], limit: int, budget: int) -> list[dict]:
+    out: list[dict] = []
+    used = 0
+    for item in ranked[:limit]:
+        fixed = len(item["title"]) + len(item["url"])
+        room = budget - used - fixed
+        if room < _MIN_SNIPPET_CHARS and out:
+            break
+        snippet = item["snippet"]
+        if len(snippet) > room:
+            snippet = snippet[: max(room, _MIN_SNIPPET_CHARS)].rsplit(" ", 1)[0] + "..."
+        out.append({**item, "snippet": snippet})
+        used += fixed + len(snippet)
+    return out
+
+
+async def _cached_search(url: str, query: str, language: str, limit: int) -> list[dict]:
+    key = f"{language}|{limit}|{_normalize_query(query)}"
+    ttl = _CLASS_TTL[query_class(query)]()
+    return await search_cache.get_or_fetch(key, lambda: _search(url, query, limit, language=language), ttl=ttl)
+
+
+async def _fanout(url: str, query: str, question: str | None, max_results: int) -> list[dict]:
+    variants = query_variants(query)
+    lists = await asyncio.gather(*(_cached_search(url, q, lang, _FANOUT_CANDIDATES) for q, lang in variants), return_exceptions=True)
+    ok = [r for r in lists if not isinstance(r, BaseException)]
+    if not ok:
+        raise lists[0]
+    candidates = _merge(ok)
+    bm25 = BM25([f"{item['title']} {item['snippet']}" for item, _ in candidates])
+    scores = bm25.scores(f"{question or ''} {query}")
+    order = sorted(range(len(candidates)), key=lambda i: (-scores[i], candidates[i][1]))
+    ranked = [candidates[i][0] for i in order]
+    LOG.info("web_search fanout variants=%s ok=%s candidates=%s", len(variants), len(ok), len(candidates))
+    return _within_budget(ranked, max_results, settings.SEARCH_RESULT_CHAR_BUDGET)
+
 
 def _build_search_url(base: str) -> str:
     b = (base or "").strip()
@@ -25,7 +141,7 @@ def _build_search_url(base: str) -> str:
     return urljoin(b, "search")
 
 
-def run(args: dict, ctx: ToolContext) -> dict:
+async def run(args: dict, ctx: ToolContext) -> dict:
     searx_url = settings.SEARXNG_URL
     if not searx_url:
         raise ToolError(
@@ -43,35 +159,59 @@ def run(args: dict, ctx: ToolContext) -> dict:
     except Exception:
         max_results = 5
     
-    # Wir begrenzen auf maximal 3 Ergebnisse, um Token zu sparen
-    max_results = max(1, min(3, max_results))
-
     url = _build_search_url(searx_url)
     if not url:
         raise ToolError("SEARXNG_URL ist ungültig")
 
+    fanout = settings.SEARCH_MODE == "fanout"
+    if not fanout:
+        # Wir begrenzen auf maximal 3 Ergebnisse, um Token zu sparen
+        max_results = max(1, min(3, max_results))
+
+    t0 = datetime.utcnow()
+    try:
+        if fanout:
+            # The character budget, not the count, bounds the prompt size here.
+            out = await _fanout(url, query, ctx.question, max(1, max_results))
+        else:
+            out = await _cached_search(url, query, _LANGUAGE, max_results)
+    finally:
+        dt_ms = int((datetime.utcnow() - t0).total_seconds() * 1000)
+        LOG.info("tool=web_search duration_ms=%s max_results=%s mode=%s", dt_ms, max_results, settings.SEARCH_MODE)
+
+    if settings.SEARCH_FETCH_PAGES > 0 and out:
+        # Snippets rarely contain the answer (dates, tables): add the best page passages.
+        passages = await fetch_passages(
+            out[: settings.SEARCH_FETCH_PAGES],
+            f"{ctx.question or ''} {query}",
+            token_budget=settings.SEARCH_PASSAGE_TOKEN_BUDGET,
+        )
+        out = [{**item, "passages": passages[item["url"]]} if item["url"] in passages else item for item in out]
+
+    return {
+        "query": query,
+        "engine": "searxng",
+        "results": out,
+    }
+
+
+async def _search(url: str, query: str, max_results: int, *, language: str = _LANGUAGE) -> list[dict]:
     params = {
         "q": query,
         "format": "json",
-        "language": "de",
+        "language": language,
         "safesearch": 0,
     }
 
-    t0 = datetime.utcnow()
     try:
-        timeout = httpx.Timeout(connect=5.0, read=settings.SEARCH_TIMEOUT_SECONDS, write=10.0, pool=10.0)
-        with httpx.Client(timeout=timeout) as client:
-            r = client.get(url, params=params)
-            r.raise_for_status()
-            data = r.json()
+        r = await get_client().get(url, params=params, timeout=request_timeout(settings.SEARCH_TIMEOUT_SECONDS))
+        r.raise_for_status()
+        data = r.json()
     except httpx.TimeoutException:
         raise ToolError("Search request timeout")
     except Exception as e:
         LOG.exception("Search request failed")
         raise ToolError("Search request failed") from e
-    finally:
-        dt_ms = int((datetime.utcnow() - t0).total_seconds() * 1000)
-        LOG.info("tool=web_search duration_ms=%s max_results=%s", dt_ms, max_results)
 
     results = data.get("results") or []
     out = []
@@ -95,9 +235,4 @@ def run(args: dict, ctx: ToolContext) -> dict:
             "url": (url_ or "").strip(),
             "snippet": content.strip(),
         })
-
-    return {
-        "query": query,
-        "engine": "searxng",
-        "results": out,
-    }
\ No newline at end of file
+    return out
\ No newline at end of file
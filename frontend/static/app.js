@@ -7,7 +7,7 @@
     activeConversationId: null,
     messages: [],
     streaming: false,
-    eventSource: null,
+    streamController: null,
   };
 
   function setRoute(path) {
@@ -243,6 +243,34 @@
         loadConv(res.conversation.id);
     });
 
+    // Minimal SSE reader for fetch() bodies (EventSource cannot POST).
+    async function readSSE(body, onEvent) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buf = "";
+        for(;;) {
+            const { value, done } = await reader.read();
+            if(done) return;
+            buf += decoder.decode(value, { stream: true });
+            let sep;
+            while((sep = buf.indexOf("\n\n")) >= 0) {
+                const raw = buf.slice(0, sep);
+                buf = buf.slice(sep + 2);
+                const ev = { event: "message", data: "", id: null };
+                raw.split("\n").forEach(line => {
+                    if(line.startsWith(":")) return; // heartbeat
+                    const i = line.indexOf(":");
+                    const field = i < 0 ? line : line.slice(0, i);
+                    const val = i < 0 ? "" : line.slice(i + 1).replace(/^ /, "");
+                    if(field === "event") ev.event = val;
+                    else if(field === "data") ev.data += val;
+                    else if(field === "id") ev.id = val;
+                });
+                if(ev.data) onEvent(ev);
+            }
+        }
+    }
+
     // Sending
     async function send() {
         const txt = input.value.trim();
@@ -253,10 +281,6 @@
         renderMessages();
         input.value = "";
 
-        await API.apiFetch(`/api/conversations/${state.activeConversationId}/messages`, {
-            method: "POST", body: { role: 'user', content: txt }
-        });
-
         // Streaming start
         state.streaming = true;
         sendBtn.classList.add("hidden");
@@ -266,30 +290,77 @@
         state.messages.push(placeholder);
         renderMessages();
 
-        const es = new EventSource(`/api/conversations/${state.activeConversationId}/stream`, { withCredentials: true });
-        state.eventSource = es;
+        const convId = state.activeConversationId;
+        // Idempotency key: a retry after a dropped connection resumes the same answer.
+        const clientId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
+        const controller = new AbortController();
+        state.streamController = controller;
         let fullText = "";
+        let lastEventId = null;
 
-        es.addEventListener("token", (e) => {
-            const d = JSON.parse(e.data);
-            fullText += d.token;
-            // Update last message in DOM directly for smooth stream
+        const setBubble = (text) => {
             const bubbles = msgContainer.querySelectorAll(".msg.assistant .content");
-            if(bubbles.length) bubbles[bubbles.length-1].textContent = fullText;
-            msgContainer.scrollTop = msgContainer.scrollHeight;
-        });
+            if(bubbles.length) bubbles[bubbles.length-1].textContent = text;
+        };
 
+        let finished = false;
         const finish = async () => {
-             es.close();
+             if(finished) return;
+             finished = true;
+             controller.abort();
              state.streaming = false;
              stopBtn.classList.add("hidden");
              sendBtn.classList.remove("hidden");
-             await loadConv(state.activeConversationId); // reload clean
+             await loadConv(convId); // reload clean
         };
-        es.addEventListener("done", finish);
-        es.addEventListener("error", finish);
-        
-        stopBtn.onclick = () => { finish(); };
+
+        const handlers = {
+            token: (d) => {
+                fullText += d.token;
+                // Update last message in DOM directly for smooth stream
+                setBubble(fullText);
+                msgContainer.scrollTop = msgContainer.scrollHeight;
+            },
+            // Admission queue: show the position until generation starts.
+            queue: (d) => { if(!fullText) setBubble(`In Warteschlange (Position ${d.position}) ...`); },
+            // Speculative mode / resync: drop what was rendered so far.
+            reset: () => { fullText = ""; setBubble("..."); },
+            done: () => finish(),
+            error: () => finish(),
+        };
+
+        // Stop: cancel the generation on the server (frees the Ollama slot), keep the partial answer.
+        stopBtn.onclick = async () => {
+            await API.apiFetch(`/api/conversations/${convId}/cancel`, { method: "POST" });
+            finish();
+        };
+
+        // One request stores the message and streams the answer. On a dropped
+        // connection the same request is retried with Last-Event-ID.
+        for(let attempt = 0; attempt < 4 && !finished; attempt++) {
+            try {
+                const headers = { "Content-Type": "application/json" };
+                const csrf = API.getCookie("csrf_token");
+                if(csrf) headers["X-CSRF-Token"] = csrf;
+                if(lastEventId) headers["Last-Event-ID"] = lastEventId;
+                const res = await fetch(`/api/conversations/${convId}/send`, {
+                    method: "POST", credentials: "include", headers, signal: controller.signal,
+                    body: JSON.stringify({ content: txt, client_id: clientId }),
+                });
+                // 409: an answer for this conversation is still running (other tab); keep the text for a resend.
+                if(res.status === 409) input.value = txt;
+                if(!res.ok || res.status === 204) break;
+                await readSSE(res.body, (ev) => {
+                    if(ev.id) lastEventId = ev.id;
+                    const handler = handlers[ev.event];
+                    if(handler) handler(JSON.parse(ev.data));
+                });
+            } catch(e) {
+                if(finished) return;
+            }
+            if(!finished) await new Promise(r => setTimeout(r, 1000 * (attempt + 1)));
+        }
+        finish();
     }
 
     sendBtn.addEventListener("click", send);
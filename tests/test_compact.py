@@ -0,0 +1,35 @@
+import threading
+
+from backend.services.context_packer import estimate_tokens
+from backend.services.tools.compact import compact_payload, dumps
+
+
+def _search_payload(snippet: str, n: int = 5) -> dict:
+    results = [{"title": f"Treffer {i}", "url": f"https://example.org/{i}", "snippet": snippet} for i in range(n)]
+    return {"ok": True, "tool": "web_search", "args": {"query": "q"}, "result": {"query": "q", "results": results}}
+
+
+def _compact_with_timeout(payload: dict, budget: int, seconds: float = 5.0) -> dict:
+    out: dict = {}
+    t = threading.Thread(target=lambda: out.update(compact_payload(payload, token_budget=budget)), daemon=True)
+    t.start()
+    t.join(seconds)
+    assert not t.is_alive(), "compact_payload did not finish"
+    return out
+
+
+def test_space_free_snippets_terminate_and_drop_results():
+    out = _compact_with_timeout(_search_payload("x" * 800), budget=150)
+    assert out["truncated"] is True
+    assert len(out["results"]["url"]) < 5
+    assert all(len(s) <= 163 for s in out["results"]["snippet"])
+
+
+def test_cjk_snippets_terminate():
+    out = _compact_with_timeout(_search_payload("東京の天気" * 100), budget=100)
+    assert len(out["results"]["url"]) >= 1
+
+
+def test_budget_is_respected_when_possible():
+    out = _compact_with_timeout(_search_payload("wort " * 200), budget=300)
+    assert estimate_tokens(dumps(out)) <= 300
@@ -0,0 +1,43 @@
+import os
+
+from backend.services.gazetteer import Gazetteer, build
+
+
+def _dump(path, *rows: tuple[int, str, str, int]) -> None:
+    lines = []
+    for geonameid, name, country, population in rows:
+        cols = [""] * 19
+        cols[0], cols[1], cols[2] = str(geonameid), name, name
+        cols[4], cols[5], cols[6], cols[8], cols[14] = "48.1", "11.6", "P", country, str(population)
+        lines.append("\t".join(cols))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_lookup_cache_is_per_instance_and_counts_hits(tmp_path):
+    src, dst = tmp_path / "dump.txt", tmp_path / "places.sqlite"
+    _dump(src, (1, "München", "DE", 1_500_000))
+    build(src, dst)
+    a, b = Gazetteer(dst), Gazetteer(dst)
+
+    assert a.lookup("Muenchen").name == "München"
+    assert a.lookup("MUENCHEN").name == "München"
+    assert a.lookup("Atlantis") is None
+    assert a.stats()["lookup_cache"] == {"hits": 1, "misses": 2, "maxsize": 1024, "currsize": 2}
+    assert b.stats()["lookup_cache"]["currsize"] == 0
+
+
+def test_lookup_cache_resets_when_the_index_is_replaced(tmp_path):
+    src, dst = tmp_path / "dump.txt", tmp_path / "places.sqlite"
+    _dump(src, (1, "Springfield", "US", 100))
+    build(src, dst)
+    g = Gazetteer(dst)
+    assert g.lookup("Springfield").population == 100
+    assert g.lookup("Shelbyville") is None
+
+    _dump(src, (1, "Springfield", "US", 100), (2, "Shelbyville", "US", 50))
+    build(src, dst)
+    st = dst.stat()
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))  # coarse mtime on some filesystems
+
+    assert g.lookup("Shelbyville").population == 50
+    assert g.stats()["lookup_cache"]["currsize"] == 1
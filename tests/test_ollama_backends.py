@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend.bench.fake_ollama import build_app
+from backend.core.config import settings
+from backend.services import metrics, ollama, ollama_backends
+from backend.services.ollama_backends import BackendPool, BackendUnavailable
+from backend.services.scheduler import GenerationScheduler
+
+
+@pytest.fixture(autouse=True)
+def _own_scheduler(monkeypatch):
+    # mark_failed/probe_all resize the scheduler; keep the app's one untouched.
+    monkeypatch.setattr(ollama_backends, "scheduler", GenerationScheduler(1))
+
+
+def _fake(backend, name: str) -> None:
+    """Serves the backend from an in-process fake Ollama (backend/bench/fake_ollama.py)."""
+    app = build_app(name, token_delay=0.0, die_after=None)
+    backend._client = httpx.AsyncClient(base_url=backend.url, transport=httpx.ASGITransport(app=app))
+
+
+def _dead(backend) -> list[str]:
+    calls: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    backend._client = httpx.AsyncClient(base_url=backend.url, transport=httpx.MockTransport(handler))
+    return calls
+
+
+class _DiesMidStream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield (json.dumps({"message": {"role": "assistant", "content": "Teil "}, "done": False}) + "\n").encode()
+        raise httpx.ReadError("connection reset")
+
+
+def test_pick_prefers_free_slot_then_model_then_least_outstanding(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_MAX_INFLIGHT", 2)
+    pool = BackendPool(["http://a:1", "http://b:1", "http://c:1"])
+    a, b, c = pool.backends
+    assert pool.pick("m") is a  # all equal: configuration order
+    b.loaded_models.add("m:latest")
+    assert pool.pick("m") is b  # model already loaded
+    b.outstanding = 1
+    assert pool.pick("m") is b  # affinity beats one more request
+    b.outstanding = 2
+    a.outstanding = 1
+    assert pool.pick("m") is c  # b is full, c has fewer requests than a
+    c.healthy = False
+    assert pool.pick("m") is a
+    assert pool.pick("m", exclude=(a,)) is b  # only a full one is left
+
+
+def test_pick_falls_back_to_unhealthy_and_fails_when_all_excluded():
+    pool = BackendPool(["http://a:1", "http://b:1"])
+    a, b = pool.backends
+    a.healthy = b.healthy = False
+    assert pool.pick("m", exclude=(a,)) is b
+    with pytest.raises(BackendUnavailable):
+        pool.pick("m", exclude=(a, b))
+
+
+def test_mark_failed_and_probe_recovery():
+    async def main():
+        pool = BackendPool(["http://a:1", "http://b:1"])
+        a, b = pool.backends
+        _fake(b, "b")
+        pool.mark_failed(b, httpx.ConnectError("boom"))
+        assert not b.healthy and b.last_error == "boom"
+        assert pool.pick("llama3.1:8b") is a
+
+        # The backend answers again: healthy, and the loaded models come from /api/ps.
+        async with b.client.stream("POST", "/api/chat", json={"model": "llama3.1:8b", "messages": []}) as r:
+            await r.aread()
+        assert await pool.probe(b) is True
+        assert b.healthy and b.last_error is None and b.has_model("llama3.1:8b")
+        assert pool.pick("llama3.1:8b") is b
+
+        _dead(a)
+        assert await pool.probe(a) is False
+        assert not a.healthy and a.last_probe is not None
+        await pool.aclose()
+
+    asyncio.run(main())
+
+
+def test_stream_retries_on_another_backend_before_the_first_chunk(monkeypatch):
+    async def main():
+        pool = BackendPool(["http://a:1", "http://b:1"])
+        a, b = pool.backends
+        a.loaded_models.add(settings.OLLAMA_MODEL)  # routing tries a first
+        dead_calls = _dead(a)
+        _fake(b, "b")
+        monkeypatch.setattr(ollama, "pool", pool)
+        failovers = metrics.get("ollama.failovers")
+
+        text = "".join([t async for t in ollama.astream_chat_completion([{"role": "user", "content": "Hallo"}])])
+
+        assert dead_calls == ["/api/chat"]
+        assert text.startswith("[b] ")
+        assert not a.healthy and b.healthy
+        assert metrics.get("ollama.failovers") == failovers + 1
+        assert [x.outstanding for x in pool.backends] == [0, 0]
+        await pool.aclose()
+
+    asyncio.run(main())
+
+
+def test_no_retry_after_output_started(monkeypatch):
+    async def main():
+        pool = BackendPool(["http://a:1", "http://b:1"])
+        a, b = pool.backends
+        a.loaded_models.add(settings.OLLAMA_MODEL)
+        a._client = httpx.AsyncClient(
+            base_url=a.url, transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=_DiesMidStream()))
+        )
+        other_calls = _dead(b)
+        monkeypatch.setattr(ollama, "pool", pool)
+
+        tokens = []
+        with pytest.raises(httpx.ReadError):
+            async for t in ollama.astream_chat_completion([{"role": "user", "content": "Hallo"}]):
+                tokens.append(t)
+        assert tokens == ["Teil "]
+        assert other_calls == []  # the answer was already half sent: no silent restart elsewhere
+        await pool.aclose()
+
+    asyncio.run(main())
+
+
+def test_lease_caps_in_flight_per_backend(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_MAX_INFLIGHT", 1)
+
+    async def main():
+        pool = BackendPool(["http://a:11434", "http://b:11434"])
+        a, b = pool.backends
+        a.loaded_models.add("m")  # affinity alone would send everything to a
+        peak = {a.url: 0, b.url: 0}
+        used = []
+
+        async def generation():
+            async with pool.lease("m") as backend:
+                used.append(backend.url)
+                peak[backend.url] = max(peak[backend.url], backend.outstanding)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(generation() for _ in range(6)))
+        return peak, used, [x.outstanding for x in pool.backends]
+
+    peak, used, outstanding = asyncio.run(main())
+    assert peak == {"http://a:11434": 1, "http://b:11434": 1}
+    assert set(used[:2]) == {"http://a:11434", "http://b:11434"}
+    assert len(used) == 6 and outstanding == [0, 0]
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+from backend.core.config import settings
+from backend.services import metrics
+from backend.services.context_packer import estimate_tokens
+from backend.services.tools import page_fetch
+from backend.services.tools.http_client import close_client
+
+_FILLER = "<p>Absatz {i}: Allgemeiner Text über Schulentwicklung, Lehrpläne und Bildungspolitik im Land.</p>"
+_PAGE = (
+    "<!doctype html><html><head><title>Schulferien</title><script>var x = 'Sommerferien';</script></head><body>"
+    "<nav>Startseite Sommerferien Winterferien Kalender Impressum</nav><main>"
+    + "".join(_FILLER.format(i=i) for i in range(40))
+    + "<p>Die Sommerferien in Rheinland-Pfalz dauern vom 06.07. bis 14.08.2026, die Herbstferien vom 12.10. bis 23.10.2026.</p>"
+    + "".join(_FILLER.format(i=i) for i in range(40, 80))
+    + "</main></body></html>"
+).encode()
+_ETAG = '"v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: dict | None = None) -> None:
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if body or status == 200:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self.server.seen.append((self.path, dict(self.headers)))
+        if self.path == "/page.html":
+            if self.headers.get("If-None-Match") == _ETAG:
+                return self._send(304, headers={"ETag": _ETAG})
+            return self._send(200, _PAGE, {"Content-Type": "text/html; charset=utf-8", "ETag": _ETAG})
+        if self.path == "/huge.html":  # announced size far over the cap
+            body = b"<p>" + b"x" * 50_000 + b"</p>"
+            return self._send(200, body, {"Content-Type": "text/html"})
+        if self.path == "/stream.txt":  # no Content-Length: stopped while reading
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for i in range(400):
+                self.wfile.write(f"Zeile {i} mit etwas Text, der den Absatz ausreichend lang macht.\n\n".encode())
+            return None
+        if self.path == "/to-page":
+            return self._send(302, headers={"Location": "/page.html"})
+        if self.path == "/to-internal":
+            return self._send(302, headers={"Location": "/internal"})
+        if self.path == "/loop":
+            return self._send(302, headers={"Location": "/loop"})
+        return self._send(404)
+
+
+@pytest.fixture(scope="module")
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.seen = []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+
+@pytest.fixture
+def base(server, tmp_path, monkeypatch):
+    server.seen.clear()
+    monkeypatch.setattr(settings, "SEARCH_FETCH_ALLOW_PRIVATE", True)
+    monkeypatch.setattr(page_fetch, "page_cache", page_fetch.PageCache(tmp_path / "page_cache"))
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def _run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_client()
+
+    return asyncio.run(main())
+
+
+def _paths(server) -> list[str]:
+    return [path for path, _ in server.seen]
+
+
+def test_announced_size_over_the_cap_is_skipped(server, base, monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_FETCH_MAX_BYTES", 4_000)
+    assert _run(page_fetch.fetch_pages([f"{base}/huge.html"])) == {}
+
+
+def test_body_is_cut_at_the_byte_cap(server, base, monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_FETCH_MAX_BYTES", 4_000)
+    truncated = metrics.get("page_fetch.truncated")
+    pages = _run(page_fetch.fetch_pages([f"{base}/stream.txt"]))
+    blocks = pages[f"{base}/stream.txt"]["blocks"]
+    assert 0 < sum(len(b) for b in blocks) <= 4_000
+    assert len(blocks) < 400
+    assert metrics.get("page_fetch.truncated") == truncated + 1
+
+
+def test_redirects_are_followed_and_every_hop_checked(server, base, monkeypatch):
+    hops = []
+    real = page_fetch._allowed_target
+
+    async def allowed(url: str) -> bool:
+        hops.append(urlsplit(url).path)
+        return urlsplit(url).path != "/internal" and await real(url)
+
+    monkeypatch.setattr(page_fetch, "_allowed_target", allowed)
+    pages = _run(page_fetch.fetch_pages([f"{base}/to-page", f"{base}/to-internal", f"{base}/loop"]))
+
+    assert list(pages) == [f"{base}/to-page"]
+    assert pages[f"{base}/to-page"]["blocks"]
+    assert "/internal" in hops
+    assert "/internal" not in _paths(server)  # blocked before the request
+    assert _paths(server).count("/loop") == page_fetch._MAX_REDIRECTS + 1
+
+
+def test_private_addresses_are_rejected(server, base, monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_FETCH_ALLOW_PRIVATE", False)
+    assert _run(page_fetch.fetch_pages([f"{base}/page.html", "http://localhost/x", "http://10.0.0.1/"])) == {}
+    assert _paths(server) == []
+
+
+@pytest.mark.parametrize(
+    "url, addresses, allowed",
+    [
+        ("http://93.184.216.34/", [], True),
+        ("http://192.168.1.10/", [], False),
+        ("http://[::1]/", [], False),
+        ("http://intranet.example/", ["10.1.2.3"], False),
+        ("http://rebind.example/", ["93.184.216.34", "127.0.0.1"], False),
+        ("https://public.example/", ["93.184.216.34"], True),
+        ("ftp://public.example/", ["93.184.216.34"], False),
+    ],
+)
+def test_allowed_target_resolves_names(monkeypatch, url, addresses, allowed):
+    monkeypatch.setattr(settings, "SEARCH_FETCH_ALLOW_PRIVATE", False)
+
+    async def fake_getaddrinfo(self, host, port, **kwargs):
+        return [(None, None, None, "", (a, port)) for a in addresses]
+
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", fake_getaddrinfo)
+    assert asyncio.run(page_fetch._allowed_target(url)) is allowed
+
+
+def test_etag_revalidation_reuses_the_disk_cache(server, base, monkeypatch):
+    url = f"{base}/page.html"
+    first = _run(page_fetch.fetch_pages([url]))[url]
+    assert first["etag"] == _ETAG
+
+    _run(page_fetch.fetch_pages([url]))  # fresh: served from disk, no request
+    assert _paths(server) == ["/page.html"]
+
+    monkeypatch.setattr(settings, "SEARCH_PAGE_CACHE_TTL_SECONDS", 0.0)
+    not_modified = metrics.get("page_fetch.not_modified")
+    again = _run(page_fetch.fetch_pages([url]))[url]
+    assert server.seen[-1][1].get("If-None-Match") == _ETAG
+    assert metrics.get("page_fetch.not_modified") == not_modified + 1
+    assert again["blocks"] == first["blocks"]
+    assert again["fetched_at"] > first["fetched_at"]
+    assert page_fetch.page_cache.get(url)["fetched_at"] == again["fetched_at"]
+
+
+def test_passages_fit_the_token_budget(server, base):
+    url = f"{base}/page.html"
+    budget = 200
+    picked = _run(page_fetch.fetch_passages([{"url": url}], "Wann sind die Sommerferien in Rheinland-Pfalz?", token_budget=budget))
+    passages = picked[url]
+    assert sum(estimate_tokens(p) for p in passages) <= budget
+    assert any("06.07." in p for p in passages)
+    assert not any("var x" in p or "Startseite" in p for p in passages)
@@ -0,0 +1,78 @@
+import time
+
+from backend.services.planner_cache import DECISION_TTL_SECONDS, PlannerCache, cache_key
+from backend.services.tool_orchestrator import PlannerDecision
+
+
+def _user(text: str) -> dict:
+    return {"role": "user", "content": text}
+
+
+def _weather_and_search() -> PlannerDecision:
+    return PlannerDecision(
+        action="tool_call",
+        tool="web_search",
+        args={"query": "Schulferien"},
+        more=(("get_weather", {"location": "Berlin"}),),
+    )
+
+
+def test_cache_key_normalises_case_punctuation_and_diacritics():
+    a = cache_key([_user("Wie wird das Wetter in München?")], "u1")
+    b = cache_key([_user("  wie wird das WETTER in munchen ")], "u1")
+    assert a == b
+    assert a.startswith("u1|wie wird das wetter in munchen|")
+
+
+def test_cache_key_is_scoped_and_includes_history():
+    msgs = [_user("Wetter in Berlin?"), {"role": "assistant", "content": "Sonnig."}, _user("Wie ist es morgen dort?")]
+    assert cache_key(msgs, "u1") != cache_key(msgs, "u2")
+    # Same question after a different previous question -> different key.
+    other = [_user("Wetter in Köln?"), *msgs[1:]]
+    assert cache_key(msgs, "u1") != cache_key(other, "u1")
+    # Assistant messages do not change the key.
+    assert cache_key(msgs, "u1") == cache_key([msgs[0], msgs[2]], "u1")
+
+
+def test_cache_key_without_user_text():
+    assert cache_key([], "u1") is None
+    assert cache_key([_user(" ?! ")], "u1") is None
+
+
+def test_ttl_is_the_shortest_of_all_calls():
+    cache = PlannerCache(8)
+    before = time.monotonic()
+    cache.put("k", _weather_and_search())
+    expires_at, _ = cache._entries["k"]
+    ttl = min(DECISION_TTL_SECONDS["web_search"], DECISION_TTL_SECONDS["get_weather"])
+    assert before + ttl <= expires_at <= time.monotonic() + ttl
+
+
+def test_expired_entries_are_misses():
+    cache = PlannerCache(8)
+    cache.put("k", PlannerDecision(action="respond"))
+    cache._entries["k"] = (time.monotonic() - 1, cache._entries["k"][1])
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = PlannerCache(2)
+    for key in ("a", "b"):
+        cache.put(key, PlannerDecision(action="respond"))
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.put("c", PlannerDecision(action="respond"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_invalidate_tool_matches_every_call():
+    cache = PlannerCache(8)
+    cache.put("multi", _weather_and_search())
+    cache.put("search", PlannerDecision(action="tool_call", tool="web_search", args={"query": "x"}))
+    cache.put("respond", PlannerDecision(action="respond"))
+    assert cache.invalidate_tool("get_weather") == 1
+    assert cache.get("multi") is None
+    assert cache.get("search") is not None
+    assert cache.invalidate_tool("respond") == 1
+    assert cache.get("respond") is None
@@ -0,0 +1,97 @@
+import asyncio
+
+from backend.services.scheduler import BACKGROUND, INTERACTIVE, GenerationScheduler
+
+
+def test_capacity_is_never_exceeded():
+    s = GenerationScheduler(2)
+    tickets = [s.enqueue(user_id=i) for i in range(5)]
+    assert [t.granted for t in tickets] == [True, True, False, False, False]
+    assert s.stats()["in_flight"] == 2
+    tickets[0].release()
+    assert tickets[2].granted and not tickets[3].granted
+    assert s.stats()["in_flight"] == 2
+
+
+def test_round_robin_between_users():
+    s = GenerationScheduler(1)
+    running = s.enqueue(user_id=9)
+    a = [s.enqueue(user_id=1) for _ in range(3)]
+    b = s.enqueue(user_id=2)
+    c = s.enqueue(user_id=3)
+    # One ticket per user per round: user 1's backlog does not starve 2 and 3.
+    assert [s.position(t) for t in (a[0], b, c, a[1], a[2])] == [1, 2, 3, 4, 5]
+    order = []
+    current = running
+    for _ in range(5):
+        current.release()
+        current = next(t for t in (*a, b, c) if t.granted and not t.released)
+        order.append(current)
+    assert order == [a[0], b, c, a[1], a[2]]
+
+
+def test_interactive_before_background():
+    s = GenerationScheduler(1)
+    running = s.enqueue(user_id=1)
+    background = s.enqueue(user_id=0, priority=BACKGROUND)
+    interactive = s.enqueue(user_id=2, priority=INTERACTIVE)
+    running.release()
+    assert interactive.granted and not background.granted
+    interactive.release()
+    assert background.granted
+
+
+def test_abandoned_ticket_leaves_the_queue():
+    s = GenerationScheduler(1)
+    running = s.enqueue(user_id=1)
+    gone = s.enqueue(user_id=2)
+    waiting = s.enqueue(user_id=3)
+    gone.release()
+    assert s.position(waiting) == 1
+    running.release()
+    assert waiting.granted and s.stats()["in_flight"] == 1
+    waiting.release()
+    assert s.stats() == {"capacity": 1, "in_flight": 0, "queued": {"interactive": 0, "background": 0}}
+
+
+def test_set_capacity_dispatches_waiting_tickets():
+    s = GenerationScheduler(1)
+    tickets = [s.enqueue(user_id=i) for i in range(3)]
+    s.set_capacity(3)
+    assert all(t.granted for t in tickets)
+
+
+def test_wait_yields_positions_until_granted():
+    async def main():
+        s = GenerationScheduler(1)
+        running = s.enqueue(user_id=1)
+        first = s.enqueue(user_id=2)
+        second = s.enqueue(user_id=3)
+        seen = []
+
+        async def waiter():
+            async for pos in second.wait():
+                seen.append(pos)
+
+        task = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        running.release()
+        await asyncio.sleep(0)
+        first.release()
+        await asyncio.wait_for(task, 1.0)
+        return seen, second.granted
+
+    seen, granted = asyncio.run(main())
+    assert seen == [2, 1] and granted
+
+
+def test_try_acquire_only_uses_idle_capacity():
+    s = GenerationScheduler(2)
+    turn = s.enqueue(user_id=1)
+    extra = s.try_acquire(user_id=1)
+    assert extra is not None and extra.granted
+    assert s.try_acquire(user_id=2) is None  # full
+    extra.release()
+    turn.release()
+    assert s.stats()["in_flight"] == 0
+
@@ -0,0 +1,50 @@
+import asyncio
+
+from backend.services import tool_orchestrator
+from backend.services.scheduler import GenerationScheduler
+from backend.services.tool_orchestrator import PlannerDecision, speculative_plan
+
+
+def _run(monkeypatch, capacity: int) -> tuple[list, int, int]:
+    sched = GenerationScheduler(capacity)
+    monkeypatch.setattr(tool_orchestrator, "scheduler", sched)
+    state = {"streams": 0, "peak": 0}
+
+    async def plan(llm_messages, *, user_id=None):
+        await asyncio.sleep(0.01)
+        return PlannerDecision(action="respond")
+
+    async def stream(llm_messages):
+        state["streams"] += 1
+        state["peak"] = max(state["peak"], sched.stats()["in_flight"])
+        for token in ("Hallo", " Welt"):
+            await asyncio.sleep(0)
+            yield token
+
+    monkeypatch.setattr(tool_orchestrator, "aplan_action", plan)
+    monkeypatch.setattr(tool_orchestrator, "astream_chat_completion", stream)
+
+    async def main():
+        turn = sched.enqueue(user_id=1)  # the ticket generate_turn holds
+        events = [e async for e in speculative_plan([{"role": "user", "content": "Hi"}], user_id=1)]
+        in_flight = sched.stats()["in_flight"]
+        turn.release()
+        return events, in_flight
+
+    events, in_flight = asyncio.run(main())
+    return events, state["peak"], in_flight
+
+
+def test_speculation_takes_a_second_slot(monkeypatch):
+    events, peak, in_flight = _run(monkeypatch, capacity=2)
+    assert peak == 2  # planner + speculative stream are both accounted for
+    assert in_flight == 1  # the extra slot is released afterwards
+    assert [v for k, v in events if k == "token"] == ["Hallo", " Welt"]
+
+
+def test_no_free_slot_plans_first_then_streams(monkeypatch):
+    events, peak, in_flight = _run(monkeypatch, capacity=1)
+    assert peak == 1
+    assert in_flight == 1
+    assert events[0] == ("decision", PlannerDecision(action="respond"))
+    assert [v for k, v in events if k == "token"] == ["Hallo", " Welt"]